@@ -28,7 +28,8 @@ class Cli:
                           "trace": self.params_to_dict(arg_list, action),
                           "clearcache": {"clear": arg_list[0]},
                           "create": {},  # "compose": self.cli_input["args"]
-                          "upgrade": {"services": arg_list}}
+                          "upgrade": {"services": arg_list},
+                          "plan": {"services": arg_list, "dry_run": True}}
         return action_mapping[action]
 
     def get_old_config(self) -> list:
@@ -150,7 +151,7 @@ class Cli:
     async def execute_request(self, request: dict):
         agent = LRAgentClient(None, True)
         try:
-            response = await agent.process(json.dumps(request))
+            response = await agent.process_request(agent.decode_request(request))
         except Exception as e:
             print("General error during request execution, reason: {}".format(e))
         else:
@@ -162,7 +163,9 @@ class Cli:
     async def run_command(self):
         has_params = ["stop", "remove", "create", "upgrade", "restart", "trace", "clearcache"]
         try:
-            if self.cli_input["action"] in has_params:
+            if self.cli_input["action"] == "plan":
+                request = {"requestId": "666", "action": "upgrade", "data": self.create_params("plan")}
+            elif self.cli_input["action"] in has_params:
                 request = {"requestId": "666", "action": self.cli_input["action"],
                            "data": self.create_params(self.cli_input["action"])}
             elif self.cli_input["action"] == "list":
@@ -187,7 +190,7 @@ class Cli:
 
 if __name__ == '__main__':
     supported_actions = ["sysinfo", "stop", "remove", "containers", "create", "upgrade", "updatecache", "list", "run",
-                         "restart", "trace", "clearcache", "delete_request"]
+                         "restart", "trace", "clearcache", "delete_request", "plan"]
     parser = argparse.ArgumentParser(prog='lr-agent-cli', usage='%(prog)s [options]',
                                      description="This code can be called to run commands of agent without wsproxy")
     parser.add_argument('--version', action='version', version='%(prog)s 0.1')
@@ -37,3 +37,38 @@ class ComposeParser:
                                    .format(parsed_compose['version'], SUPPORTED_VERSIONS))
         if 'services' not in parsed_compose:
             raise ComposeException("Missing section 'services'")
+
+    def service_dependencies(self, definition: dict) -> list:
+        # depends_on in short list or long mapping syntax
+        return list(definition.get("depends_on") or [])
+
+    def upgrade_stages(self, services: list, compose_services: dict) -> list:
+        # groups of services which can be upgraded together, each group waits for the previous ones
+        requested = [service for service in dict.fromkeys(services) if service in compose_services]
+        dependencies = {service: {dependency for dependency in self.service_dependencies(compose_services[service])
+                                  if dependency in requested and dependency != service} for service in requested}
+        # resolver switchover checks resolving so it goes before the rest, lr-agent replaces itself at the very end
+        resolver_dependencies = self.transitive_dependencies("resolver", dependencies)
+        for service in requested:
+            if service == "lr-agent":
+                dependencies[service].update(other for other in requested if other != service)
+            elif service != "resolver" and "resolver" in requested and service not in resolver_dependencies:
+                dependencies[service].add("resolver")
+        stages, done = [], set()
+        while len(done) < len(requested):
+            stage = [service for service in requested if service not in done and dependencies[service] <= done]
+            if not stage:
+                raise ComposeException("Dependency cycle between services {}".format(
+                    sorted(set(requested) - done)))
+            stages.append(stage)
+            done.update(stage)
+        return stages
+
+    def transitive_dependencies(self, service: str, dependencies: dict) -> set:
+        found, pending = set(), list(dependencies.get(service, ()))
+        while pending:
+            dependency = pending.pop()
+            if dependency not in found:
+                found.add(dependency)
+                pending.extend(dependencies.get(dependency, ()))
+        return found
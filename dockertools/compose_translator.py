@@ -1,4 +1,5 @@
 import base64
+import shlex
 import netifaces
 
 
@@ -22,7 +23,9 @@ def parse_logging(logging: dict) -> dict:
     return {"type": logging["driver"], "config": logging["options"]}
 
 
-def parse_envs(envs: dict) -> dict:
+def parse_envs(envs) -> dict:
+    if isinstance(envs, list):
+        envs = dict(env.partition("=")[::2] for env in envs)
     file_mapping = {"CLIENT_CRT_BASE64": "client.crt", "CLIENT_KEY_BASE64": "client.key"}
     for name, value in envs.items():
         if name in file_mapping and not value:
@@ -100,3 +103,128 @@ SUPPORTED_PARAMETERS = {
     # 'log_driver': None,  # special formatting together with log_opt <1
     # 'log_opt': None,  # special formatting together with log_driver <
 }
+
+
+def parse_bytes(value) -> int:
+    if isinstance(value, int):
+        return value
+    units = {"b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    value = value.strip().lower()
+    if value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def port_key(port) -> str:
+    return str(port) if "/" in str(port) else "{}/tcp".format(port)
+
+
+# docker run kwargs translated to the engine api create container body, the rest of the kwargs go to HostConfig
+CONFIG_PARAMETERS = {"image": "Image", "tty": "Tty", "stdin_open": "OpenStdin", "labels": "Labels",
+                     "hostname": "Hostname", "domainname": "Domainname", "user": "User", "working_dir": "WorkingDir",
+                     "mac_address": "MacAddress", "network_disabled": "NetworkDisabled", "stop_signal": "StopSignal"}
+HOST_CONFIG_PARAMETERS = {"network_mode": "NetworkMode", "dns": "Dns", "pid_mode": "PidMode", "tmpfs": "Tmpfs",
+                          "privileged": "Privileged", "cap_add": "CapAdd", "cpu_shares": "CpuShares",
+                          "cap_drop": "CapDrop", "auto_remove": "AutoRemove", "blkio_weight": "BlkioWeight",
+                          "cgroup_parent": "CgroupParent", "cgroupns": "CgroupnsMode", "cpu_count": "CpuCount",
+                          "cpu_percent": "CpuPercent", "cpu_period": "CpuPeriod", "cpu_quota": "CpuQuota",
+                          "cpu_rt_period": "CpuRealtimePeriod", "cpu_rt_runtime": "CpuRealtimeRuntime",
+                          "cpuset_cpus": "CpusetCpus", "cpuset_mems": "CpusetMems",
+                          "device_cgroup_rules": "DeviceCgroupRules", "dns_opt": "DnsOptions",
+                          "dns_search": "DnsSearch", "group_add": "GroupAdd", "init": "Init", "ipc_mode": "IpcMode",
+                          "isolation": "Isolation", "mem_swappiness": "MemorySwappiness", "nano_cpus": "NanoCpus",
+                          "oom_kill_disable": "OomKillDisable", "oom_score_adj": "OomScoreAdj",
+                          "pids_limit": "PidsLimit", "publish_all_ports": "PublishAllPorts",
+                          "read_only": "ReadonlyRootfs", "runtime": "Runtime", "security_opt": "SecurityOpt",
+                          "storage_opt": "StorageOpt", "sysctls": "Sysctls", "userns_mode": "UsernsMode",
+                          "uts_mode": "UTSMode", "volume_driver": "VolumeDriver", "volumes_from": "VolumesFrom"}
+# sizes given as "512m" the same way mem_limit is
+HOST_CONFIG_BYTES = {"mem_limit": "Memory", "mem_reservation": "MemoryReservation", "memswap_limit": "MemorySwap",
+                     "kernel_memory": "KernelMemory", "shm_size": "ShmSize"}
+
+
+def parse_command(command) -> list:
+    return shlex.split(command) if isinstance(command, str) else list(command)
+
+
+def parse_extra_hosts(extra_hosts) -> list:
+    if isinstance(extra_hosts, dict):
+        return ["{}:{}".format(host, address) for host, address in extra_hosts.items()]
+    return list(extra_hosts)
+
+
+def parse_devices(devices: list) -> list:
+    # host path, optional container path and cgroup permissions as in docker run --device
+    parsed = []
+    for device in devices:
+        parts = device.split(":")
+        parsed.append({"PathOnHost": parts[0], "PathInContainer": parts[1] if len(parts) > 1 else parts[0],
+                       "CgroupPermissions": parts[2] if len(parts) > 2 else "rwm"})
+    return parsed
+
+
+def parse_ulimits(ulimits) -> list:
+    # compose mapping {nofile: {soft: 1, hard: 2}} or {nproc: 1}, docker sdk list [{name: nofile, soft: 1, hard: 2}]
+    if isinstance(ulimits, dict):
+        ulimits = [dict(limit, name=name) if isinstance(limit, dict) else {"name": name, "soft": limit, "hard": limit}
+                   for name, limit in ulimits.items()]
+    return [{"Name": ulimit["name"], "Soft": ulimit.get("soft"), "Hard": ulimit.get("hard", ulimit.get("soft"))}
+            for ulimit in ulimits]
+
+
+def parse_links(links) -> list:
+    if isinstance(links, dict):
+        return ["{}:{}".format(name, alias) for name, alias in links.items()]
+    return ["{0}:{0}".format(link) if ":" not in link else link for link in links]
+
+
+def parse_healthcheck(healthcheck: dict) -> dict:
+    names = {"test": "Test", "interval": "Interval", "timeout": "Timeout", "retries": "Retries",
+             "start_period": "StartPeriod"}
+    return {names.get(name, name): value for name, value in healthcheck.items()}
+
+
+def create_container_config(kwargs: dict) -> dict:
+    config, host_config = {}, {}
+    for name, value in kwargs.items():
+        if value is None or name in ("name", "depends_on", "detach"):
+            # service ordering is handled by the upgrade, not by the container
+            continue
+        if name in CONFIG_PARAMETERS:
+            config[CONFIG_PARAMETERS[name]] = value
+        elif name in HOST_CONFIG_PARAMETERS:
+            host_config[HOST_CONFIG_PARAMETERS[name]] = value
+        elif name in HOST_CONFIG_BYTES:
+            host_config[HOST_CONFIG_BYTES[name]] = parse_bytes(value)
+        elif name == "environment":
+            config["Env"] = ["{}={}".format(env, env_value) for env, env_value in value.items()]
+        elif name == "command":
+            config["Cmd"] = parse_command(value)
+        elif name == "entrypoint":
+            config["Entrypoint"] = parse_command(value)
+        elif name == "healthcheck":
+            config["Healthcheck"] = parse_healthcheck(value)
+        elif name == "ports":
+            config["ExposedPorts"] = {port_key(port): {} for port in value}
+            host_config["PortBindings"] = {port_key(port): [{"HostPort": str(host_port)}]
+                                           for port, host_port in value.items()}
+        elif name == "volumes":
+            host_config["Binds"] = ["{}:{}:{}".format(source, bind["bind"], bind["mode"])
+                                    for source, bind in value.items()]
+        elif name == "extra_hosts":
+            host_config["ExtraHosts"] = parse_extra_hosts(value)
+        elif name == "devices":
+            host_config["Devices"] = parse_devices(value)
+        elif name == "ulimits":
+            host_config["Ulimits"] = parse_ulimits(value)
+        elif name == "links":
+            host_config["Links"] = parse_links(value)
+        elif name == "restart_policy":
+            host_config["RestartPolicy"] = value
+        elif name == "log_config":
+            host_config["LogConfig"] = {"Type": value["type"], "Config": value["config"]}
+        else:
+            # docker sdk run rejected these as well
+            raise Exception("Unsupported container parameter '{}'".format(name))
+    config["HostConfig"] = host_config
+    return config
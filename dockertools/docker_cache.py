@@ -0,0 +1,179 @@
+import asyncio
+import json
+import time
+
+from aiodocker import Docker
+from aiodocker.exceptions import DockerError
+
+# container events which change the listed state, exec_* and attach events are frequent and irrelevant
+CONTAINER_ACTIONS = ("create", "start", "restart", "stop", "die", "kill", "pause", "unpause", "rename", "update",
+                     "oom", "health_status")
+EVENT_TYPES = ["container", "image", "volume"]
+
+
+class ContainerRecord:
+    __slots__ = ("id", "name", "image", "image_id", "status", "labels")
+
+    def __init__(self, container_id: str, name: str, image: str, image_id: str, status: str, labels: dict):
+        self.id = container_id
+        self.name = name
+        self.image = image
+        self.image_id = image_id
+        self.status = status
+        self.labels = labels
+
+    @property
+    def short_id(self) -> str:
+        # same length as the short id of docker-py container model
+        return self.id[:10]
+
+    @classmethod
+    def from_summary(cls, data) -> "ContainerRecord":
+        # entry of the container list endpoint
+        return cls(data["Id"], data["Names"][0].lstrip("/"), data["Image"], data["ImageID"], data["State"],
+                   data["Labels"] or {})
+
+    @classmethod
+    def from_inspect(cls, data: dict) -> "ContainerRecord":
+        return cls(data["Id"], data["Name"].lstrip("/"), data["Config"]["Image"], data["Image"],
+                   data["State"]["Status"], data["Config"]["Labels"] or {})
+
+
+async def inspect_containers(client: Docker, summaries: list) -> list:
+    # list endpoint gives the image id once the tag moved to a newer image, inspect keeps the configured name
+    inspects = await asyncio.gather(*[client.containers.container(summary["Id"]).show() for summary in summaries],
+                                    return_exceptions=True)
+    return [ContainerRecord.from_summary(summary) if isinstance(inspect, Exception) else
+            ContainerRecord.from_inspect(inspect) for summary, inspect in zip(summaries, inspects)]
+
+
+class ImageRecord:
+    __slots__ = ("id", "tags", "digests")
+
+    def __init__(self, image_id: str, tags: list, digests: list):
+        self.id = image_id
+        self.tags = tags
+        self.digests = digests
+
+    @classmethod
+    def from_summary(cls, data: dict) -> "ImageRecord":
+        return cls(data["Id"], [tag for tag in data.get("RepoTags") or [] if tag != "<none>:<none>"],
+                   [digest for digest in data.get("RepoDigests") or [] if not digest.startswith("<none>")])
+
+
+class VolumeRecord:
+    __slots__ = ("name", "driver")
+
+    def __init__(self, name: str, driver: str):
+        self.name = name
+        self.driver = driver
+
+    @classmethod
+    def from_summary(cls, data: dict) -> "VolumeRecord":
+        return cls(data["Name"], data.get("Driver", "local"))
+
+
+class DockerCache:
+    # containers, images and volumes seeded once and kept current from the docker events stream
+    def __init__(self, logger):
+        self.logger = logger
+        self.ready = False
+        self.containers = {}
+        self.images = {}
+        self.volumes = {}
+        self.version = {}
+        self.seeds = 0
+        self.events = 0
+
+    async def run(self):
+        client = Docker()
+        try:
+            # subscribe before seeding with a replay window so no change between the two is lost
+            subscriber = client.events.subscribe(since=str(int(time.time()) - 1),
+                                                 filters=json.dumps({"type": EVENT_TYPES}))
+            await self.seed(client)
+            while True:
+                event = await subscriber.get()
+                if event is None:
+                    raise ConnectionError("Docker events stream closed")
+                await self.apply(client, event)
+        finally:
+            self.ready = False
+            await client.events.stop()
+            await client.close()
+
+    async def seed(self, client: Docker):
+        containers = await client.containers.list(all=True)
+        images = await client.images.list()
+        volumes = await client.volumes.list()
+        self.version = await client.version()
+        self.containers = {record.id: record for record in await inspect_containers(client, containers)}
+        self.images = {image["Id"]: ImageRecord.from_summary(image) for image in images}
+        self.volumes = {volume["Name"]: VolumeRecord.from_summary(volume) for volume in volumes["Volumes"] or []}
+        self.seeds += 1
+        self.ready = True
+        self.logger.info("Docker cache seeded with {} containers, {} images and {} volumes.".format(
+            len(self.containers), len(self.images), len(self.volumes)))
+
+    async def apply(self, client: Docker, event: dict):
+        self.events += 1
+        kind, action, actor = event.get("Type"), event.get("Action", ""), event.get("Actor", {})
+        if kind == "container":
+            if action == "destroy":
+                self.containers.pop(actor.get("ID"), None)
+            elif action.split(":")[0] in CONTAINER_ACTIONS:
+                await self.refresh_container(client, actor["ID"])
+        elif kind == "image":
+            # tags move between images on pull, tag and untag, the whole list is small
+            self.images = {image["Id"]: ImageRecord.from_summary(image) for image in await client.images.list()}
+        elif kind == "volume":
+            if action == "create":
+                driver = actor.get("Attributes", {}).get("driver", "local")
+                self.volumes[actor["ID"]] = VolumeRecord(actor["ID"], driver)
+            elif action == "destroy":
+                self.volumes.pop(actor.get("ID"), None)
+
+    async def refresh_container(self, client: Docker, container_id: str):
+        try:
+            self.put(ContainerRecord.from_inspect(await client.containers.container(container_id).show()))
+        except DockerError as e:
+            if e.status != 404:
+                raise
+            self.containers.pop(container_id, None)
+
+    def put(self, record: ContainerRecord):
+        self.containers[record.id] = record
+
+    def find(self, name: str) -> ContainerRecord:
+        for record in self.containers.values():
+            if record.name == name or record.id == name:
+                return record
+        return None
+
+    def renamed(self, name: str, new_name: str):
+        record = self.find(name)
+        if record is not None:
+            record.name = new_name
+
+    def removed(self, name: str):
+        record = self.find(name)
+        if record is not None:
+            del self.containers[record.id]
+
+    def status_changed(self, name: str, status: str):
+        record = self.find(name)
+        if record is not None:
+            record.status = status
+
+    def get_containers(self, stopped: bool = False) -> list:
+        return [record for record in self.containers.values() if stopped or record.status == "running"]
+
+    def get_images(self) -> list:
+        return list(self.images.values())
+
+    def get_volumes(self) -> list:
+        return list(self.volumes.values())
+
+    def stats(self) -> dict:
+        return {"ready": self.ready, "seeds": self.seeds, "events": self.events, "containers": len(self.containers),
+                "images": len(self.images), "volumes": len(self.volumes)}
@@ -1,135 +1,282 @@
-import docker
+import asyncio
+import calendar
+import os
+from urllib.parse import quote
 
-from .compose_translator import create_docker_run_kwargs
+from .compose_translator import create_container_config, create_docker_run_kwargs
+from .docker_cache import ContainerRecord, DockerCache, ImageRecord, VolumeRecord, inspect_containers
 from exception.exc import ContainerException
 from loggingtools import logger
 from datetime import datetime
 from aiodocker import Docker
 
 
+def image_reference(image_name: str) -> tuple:
+    # repository, tag and digest of an image reference, registry port is not mistaken for a tag
+    name, _, digest = image_name.partition("@")
+    repository, tag = name, ""
+    if ":" in name.rsplit("/", 1)[-1]:
+        repository, tag = name.rsplit(":", 1)
+    return repository, tag if tag or digest else "latest", digest
+
+
 class DockerConnector:
-    def __init__(self):
-        self.docker_client = docker.DockerClient(base_url='unix://var/run/docker.sock')  # hish level api
-        self.api_client = docker.APIClient(base_url='unix://var/run/docker.sock')  # low level api
+    def __init__(self, cache: DockerCache = None):
+        # single aiodocker client with a keep-alive connection pool, created on first use inside the event loop
+        self.client = None
         # keep socket connections uncaught so the exception propagates to main, and the cycle restarts
         self.logger = logger.build_logger("docker-connector", "/etc/whalebone/logs/")
+        # listing falls back to the docker api while the cache is not fed by the events stream
+        self.cache = cache if cache else DockerCache(self.logger)
+        self.timeout = float(os.environ.get("DOCKER_TIMEOUT", 30))
+        self.stop_timeout = int(os.environ.get("DOCKER_STOP_TIMEOUT", 10))
+        self.pull_timeout = float(os.environ.get("DOCKER_PULL_TIMEOUT", 600))
+        self.pull_concurrency = int(os.environ.get("IMAGE_PULL_CONCURRENCY", 3))
+        self.latency = {}
+        self.pulls = {}
+
+    def get_client(self) -> Docker:
+        if self.client is None:
+            self.client = Docker()
+        return self.client
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+    async def call(self, operation: str, awaitable, timeout: float = None):
+        # every docker api call is bounded and its latency recorded per operation
+        loop = asyncio.get_running_loop()
+        start, failed = loop.time(), True
+        try:
+            result = await asyncio.wait_for(awaitable, timeout if timeout else self.timeout)
+            failed = False
+            return result
+        except asyncio.TimeoutError:
+            raise ContainerException("Docker {} timed out after {}s".format(operation, timeout or self.timeout))
+        finally:
+            self.record(operation, loop.time() - start, failed)
+
+    def record(self, operation: str, elapsed: float, failed: bool):
+        calls = self.latency.setdefault(operation, {"calls": 0, "failures": 0, "total": 0.0, "max": 0.0})
+        calls["calls"] += 1
+        calls["failures"] += failed
+        calls["total"] += elapsed
+        calls["max"] = max(calls["max"], elapsed)
+
+    def container(self, name: str):
+        return self.get_client().containers.container(name)
 
-    def get_images(self):
+    async def get_images(self) -> list:
+        if self.cache.ready:
+            return self.cache.get_images()
         try:
-            return self.docker_client.images.list()
+            return [ImageRecord.from_summary(image) for image in
+                    await self.call("images", self.get_client().images.list())]
         except Exception as e:
             self.logger.info("Failed to get images {}.".format(e))
             return []
 
-    def get_containers(self, stopped: bool = False) -> list:
+    async def image_tags(self, image_id: str) -> list:
+        for image in await self.get_images():
+            if image.id == image_id:
+                return image.tags
+        return []
+
+    async def get_containers(self, stopped: bool = False) -> list:
+        if self.cache.ready:
+            return self.cache.get_containers(stopped)
         try:
-            return self.docker_client.containers.list(all=stopped)
+            containers = await self.call("containers", self.get_client().containers.list(all=stopped))
+            return await self.call("inspect", inspect_containers(self.get_client(), containers))
         except Exception as e:
             self.logger.info("Failed to get containers {}.".format(e))
             return []
 
-    def get_container(self, name: str):
+    async def get_volumes(self) -> list:
+        if self.cache.ready:
+            return self.cache.get_volumes()
         try:
-            return self.docker_client.containers.get(name)
-        except Exception as e:
-            self.logger.info("Failed to get container {}, {}.".format(name, e))
-            return ""
-
-    def get_volumes(self) -> list:
-        try:
-            return self.docker_client.volumes.list()
+            return [VolumeRecord.from_summary(volume) for volume in
+                    (await self.call("volumes", self.get_client().volumes.list()))["Volumes"] or []]
         except Exception as e:
             self.logger.warning("Failed to get volumes {}.".format(e))
             return []
 
-    def container_exec(self, name: str, command: list) -> str:
-        service = self.get_container(name)
-        if service != "":
-            try:
-                result = service.exec_run(command)
-            except Exception as e:
-                self.logger.info("Failed to execute command {} in {} due to {}".format(command, name, e))
-            else:
-                return result.output.decode("utf-8")
-        else:
+    async def container_exec(self, name: str, command: list) -> str:
+        try:
+            return await self.call("exec", self.exec_output(name, command))
+        except Exception as e:
+            self.logger.info("Failed to execute command {} in {} due to {}".format(command, name, e))
             return ""
 
+    async def exec_output(self, name: str, command: list) -> str:
+        execution = await self.container(name).exec(command, stdout=True, stderr=True)
+        output = []
+        async with execution.start(detach=False) as stream:
+            message = await stream.read_out()
+            while message is not None:
+                output.append(message.data)
+                message = await stream.read_out()
+        return b"".join(output).decode("utf-8")
+
     async def create_volume(self, name: str, **options):
+        body = {"Name": name, "Driver": options.get("driver", "local"), "DriverOpts": options.get("driver_opts", {}),
+                "Labels": options.get("labels", {})}
         try:
-            self.docker_client.volumes.create(name, **options)
+            await self.call("create_volume", self.get_client().volumes.create(body))
         except Exception as e:
             raise ContainerException(e)
 
-    async def start_service(self, parsed_compose: dict):
+    async def start_service(self, parsed_compose: dict, pull: bool = True):
         kwargs = create_docker_run_kwargs(parsed_compose)
-        await self.pull_image(parsed_compose['image'])
+        if pull:
+            await self.pull_image(parsed_compose['image'])
         try:
-            self.docker_client.containers.run(detach=True, **kwargs)
+            container = await self.call("create", self.get_client().containers.create(
+                create_container_config(kwargs), name=kwargs.get("name")))
+            await self.call("start", container.start())
+            self.cache.put(ContainerRecord.from_inspect(await self.call("inspect", container.show())))
         except Exception as e:
             raise ContainerException(e)
 
-    def docker_version(self) -> dict:
+    async def docker_version(self) -> dict:
+        if self.cache.ready:
+            return self.cache.version
         try:
-            return self.api_client.version()
+            return await self.call("version", self.get_client().version())
         except Exception as e:
             self.logger.info("Failed to get docker version {}.".format(e))
             return {}
 
-    def container_logs(self, name: str, timestamps: bool = False, tail: int = "all", since: str = None) -> str:
+    async def container_logs(self, name: str, timestamps: bool = False, tail: int = "all", since: str = None) -> str:
+        options = {"stdout": True, "stderr": True, "timestamps": timestamps, "tail": tail}
         if since is not None:
-            since = datetime.strptime(since, '%Y-%m-%dT%H:%M:%S')
+            options["since"] = calendar.timegm(datetime.strptime(since, '%Y-%m-%dT%H:%M:%S').timetuple())
         try:
-            return self.api_client.logs(name, timestamps=timestamps, tail=tail, since=since).decode("utf-8")
+            return "".join(await self.call("logs", self.container(name).log(**options)))
         except Exception as e:
             raise ConnectionError(e)
 
     async def restart_container(self, container_name: str):
         try:
-            self.api_client.restart(container_name)
-        except Exception as e:
-            raise ContainerException(e)
-
-    def restart_resolver(self):
-        try:
-            self.api_client.restart("resolver")
+            await self.call("restart", self.container(container_name).restart(), self.timeout + self.stop_timeout)
         except Exception as e:
             raise ContainerException(e)
+        else:
+            self.cache.status_changed(container_name, "running")
 
     async def stop_container(self, container_name: str):
         try:
-            self.api_client.stop(container_name)
+            await self.call("stop", self.container(container_name).stop(t=self.stop_timeout),
+                            self.timeout + self.stop_timeout)
         except Exception as e:
             raise ContainerException(e)
+        else:
+            self.cache.status_changed(container_name, "exited")
 
     async def rename_container(self, container_name: str, name: str):
         try:
-            self.api_client.rename(container_name, name)
+            await self.call("rename", self.container(container_name).rename(name))
         except Exception as e:
             raise ContainerException(e)
+        else:
+            # events stream confirms the change later, upgrade steps check names right away
+            self.cache.renamed(container_name, name)
 
     async def remove_container(self, container_name: str):
         try:
-            self.api_client.remove_container(container_name, force=True)
+            await self.call("remove", self.container(container_name).delete(force=True),
+                            self.timeout + self.stop_timeout)
         except Exception as e:
             raise ContainerException(e)
+        else:
+            self.cache.removed(container_name)
 
-    def inspect_config(self, container_name: str):
+    async def inspect_config(self, container_name: str) -> dict:
         try:
-            return self.api_client.inspect_container(container_name)
+            return await self.call("inspect", self.container(container_name).show())
         except Exception as e:
             raise ContainerException(e)
 
-    # async def pull_image(self, container_name: str):
-    #     try:
-    #         self.docker_client.images.pull(container_name)
-    #     except Exception as e:
-    #         self.logger.warning("Unable to pull image: {}, reason: {}".format(container_name, e))
+    async def inspect_image(self, image_name: str) -> dict:
+        try:
+            return await self.call("inspect_image", self.get_client().images.inspect(image_name))
+        except Exception as e:
+            raise ContainerException(e)
 
     async def pull_image(self, image_name: str):
-        async_client = Docker()
         try:
-            await async_client.images.pull(image_name)
+            await self.pull(image_name)
         except Exception as e:
             self.logger.warning("Unable to pull image: {}, reason: {}".format(image_name, e))
-        finally:
-            await async_client.close()
\ No newline at end of file
+
+    async def pull(self, image_name: str):
+        for message in await self.call("pull", self.get_client().images.pull(image_name), self.pull_timeout):
+            if "error" in message:
+                raise ContainerException(message["error"])
+
+    async def query_distribution(self, image_name: str) -> dict:
+        # GET /distribution/{name}/json has no public method in aiodocker (up to 0.27), the private query helper its
+        # own resources use is called only here, image name with slashes and tag is a single quoted path segment
+        return await self.get_client()._query_json("distribution/{}/json".format(quote(image_name, safe="")))
+
+    async def remote_digest(self, image_name: str) -> str:
+        # manifest digest from the registry, much cheaper than a pull which would download nothing new
+        descriptor = await self.call("distribution", self.query_distribution(image_name))
+        return descriptor["Descriptor"]["digest"]
+
+    async def image_present(self, image_name: str, images: list) -> bool:
+        repository, _, digest = image_reference(image_name)
+        if not digest:
+            try:
+                digest = await self.remote_digest(image_name)
+            except Exception as e:
+                self.logger.info("Failed to resolve digest of {}, {}".format(image_name, e))
+                return False
+        return any("{}@{}".format(repository, digest) in image.digests for image in images)
+
+    async def prepull_images(self, image_names: list) -> dict:
+        # all images are pulled before any container is touched, services are down only for the restart
+        images = await self.get_images()
+        semaphore = asyncio.Semaphore(self.pull_concurrency)
+        image_names = list(dict.fromkeys(image_names))
+        results = await asyncio.gather(*[self.prepull(image_name, images, semaphore) for image_name in image_names])
+        if self.cache.ready and any(result["status"] == "pulled" for result in results):
+            await self.refresh_images()
+        return dict(zip(image_names, results))
+
+    async def refresh_images(self):
+        # events stream confirms moved tags later, the upgrade plan compares them right away
+        try:
+            self.cache.images = {image["Id"]: ImageRecord.from_summary(image) for image in
+                                 await self.call("images", self.get_client().images.list())}
+        except Exception as e:
+            self.logger.info("Failed to refresh images {}.".format(e))
+
+    async def prepull(self, image_name: str, images: list, semaphore: asyncio.Semaphore) -> dict:
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            if await self.image_present(image_name, images):
+                result = {"status": "present"}
+            else:
+                try:
+                    await self.pull(image_name)
+                except Exception as e:
+                    # registry outage is not fatal while the tag is available locally
+                    repository, tag, _ = image_reference(image_name)
+                    cached = any("{}:{}".format(repository, tag) in image.tags for image in images)
+                    result = {"status": "cached" if cached else "failed", "error": str(e)}
+                    self.logger.warning("Unable to pull image: {}, reason: {}".format(image_name, e))
+                else:
+                    result = {"status": "pulled"}
+            result["seconds"] = round(loop.time() - start, 2)
+        self.pulls[image_name] = result
+        return result
+
+    def stats(self) -> dict:
+        return {operation: {"calls": calls["calls"], "failures": calls["failures"],
+                            "avg_ms": round(1000 * calls["total"] / calls["calls"], 1),
+                            "max_ms": round(1000 * calls["max"], 1)} for operation, calls in self.latency.items()}
@@ -0,0 +1,120 @@
+from .compose_translator import create_container_config, create_docker_run_kwargs
+from .docker_connector import DockerConnector, image_reference
+
+UNCHANGED, RESTART, RECREATE = "unchanged", "restart", "recreate"
+# host config left out of the compose has to be unset on the running container as well
+UNSET_HOST_CONFIG = ("Binds", "PortBindings", "Memory", "Privileged", "CapAdd", "Dns", "Tmpfs", "CpuShares", "PidMode")
+
+# taken from the image unless the compose sets them, an entrypoint set by the compose drops the command of the image
+IMAGE_DEFAULTS = ("Cmd", "Entrypoint", "User", "WorkingDir", "StopSignal", "Healthcheck")
+
+
+def port_bindings(bindings: dict) -> dict:
+    return {port: sorted(binding.get("HostPort", "") for binding in hosts or [])
+            for port, hosts in (bindings or {}).items()}
+
+
+def host_config_changed(name: str, desired, running) -> bool:
+    if name == "Binds":
+        return sorted(desired or []) != sorted(running or [])
+    if name == "PortBindings":
+        return port_bindings(desired) != port_bindings(running)
+    if name == "RestartPolicy":
+        running = running or {}
+        return any(running.get(key, 0 if key == "MaximumRetryCount" else "") != value
+                   for key, value in desired.items())
+    return desired != running
+
+
+def merged_env(image_env: list, env: list) -> set:
+    variables = dict(variable.partition("=")[::2] for variable in image_env or [])
+    variables.update(variable.partition("=")[::2] for variable in env or [])
+    return {"{}={}".format(name, value) for name, value in variables.items()}
+
+
+def config_changes(desired: dict, inspect: dict, image_config: dict) -> list:
+    # engine merges env, labels and exposed ports of the image into the container, the compose is merged the same way
+    changes = []
+    running = inspect.get("Config") or {}
+    if desired.get("Image") != running.get("Image"):
+        changes.append("image")
+    if merged_env(image_config.get("Env"), desired.get("Env")) != set(running.get("Env") or []):
+        changes.append("environment")
+    if dict(image_config.get("Labels") or {}, **desired.get("Labels", {})) != (running.get("Labels") or {}):
+        changes.append("labels")
+    if set(image_config.get("ExposedPorts") or {}) | set(desired.get("ExposedPorts", {})) != \
+            set(running.get("ExposedPorts") or {}):
+        changes.append("ports")
+    for name in ("Tty", "OpenStdin"):
+        if bool(desired.get(name)) != bool(running.get(name)):
+            changes.append(name)
+    for name in IMAGE_DEFAULTS:
+        default = None if name == "Cmd" and "Entrypoint" in desired else image_config.get(name)
+        if (desired.get(name, default) or None) != (running.get(name) or None):
+            changes.append(name)
+    for name in ("Hostname", "Domainname", "MacAddress"):
+        # generated by the engine when left out of the compose
+        if name in desired and desired[name] != running.get(name):
+            changes.append(name)
+    desired_host, running_host = desired.get("HostConfig", {}), inspect.get("HostConfig") or {}
+    for name, value in desired_host.items():
+        if host_config_changed(name, value, running_host.get(name)):
+            changes.append("HostConfig.{}".format(name))
+    for name in UNSET_HOST_CONFIG:
+        if name not in desired_host and running_host.get(name):
+            changes.append("HostConfig.{}".format(name))
+    if "NetworkMode" not in desired_host and running_host.get("NetworkMode", "default") not in ("default", "bridge"):
+        changes.append("HostConfig.NetworkMode")
+    return changes
+
+
+class UpgradePlanner:
+    # compares compose services with their running containers so that only the needed action is taken
+    def __init__(self, docker_connector: DockerConnector):
+        self.docker_connector = docker_connector
+
+    async def plan(self, parsed_compose: dict, services: list, config: list = None,
+                   check_registry: bool = False) -> dict:
+        images = await self.docker_connector.get_images()
+        plan = {}
+        for service in services:
+            if service in parsed_compose["services"]:
+                plan[service] = await self.plan_service(service, parsed_compose["services"][service], images,
+                                                        check_registry)
+                if service == "resolver" and config and plan[service]["action"] != RECREATE:
+                    # new kres.conf is loaded by the new container
+                    plan[service] = {"action": RECREATE, "changes": ["config"]}
+        return plan
+
+    async def plan_service(self, service: str, definition: dict, images: list, check_registry: bool) -> dict:
+        try:
+            inspect = await self.docker_connector.inspect_config(service)
+        except Exception:
+            return {"action": RECREATE, "changes": ["missing"]}
+        try:
+            image_config = (await self.docker_connector.inspect_image(inspect["Image"]))["Config"] or {}
+        except Exception:
+            # without image defaults removed settings cannot be told apart
+            return {"action": RECREATE, "changes": ["image config"]}
+        changes = config_changes(create_container_config(create_docker_run_kwargs(definition)), inspect, image_config)
+        if "image" not in changes and not await self.image_current(definition["image"], inspect["Image"], images,
+                                                                   check_registry):
+            changes.append("image")
+        if changes:
+            return {"action": RECREATE, "changes": changes}
+        if not (inspect.get("State") or {}).get("Running"):
+            return {"action": RESTART, "changes": ["state"]}
+        return {"action": UNCHANGED, "changes": []}
+
+    async def image_current(self, image_name: str, image_id: str, images: list, check_registry: bool) -> bool:
+        # the tag may point to a newly pulled image, the container still runs the old one
+        repository, tag, digest = image_reference(image_name)
+        reference = "{}@{}".format(repository, digest) if digest else "{}:{}".format(repository, tag)
+        local = [image.id for image in images if reference in (image.digests if digest else image.tags)]
+        if local and local[0] != image_id:
+            return False
+        if check_registry and not digest:
+            # dry run does not pull, the registry tells whether the tag moved
+            return await self.docker_connector.image_present(image_name, [image for image in images
+                                                                          if image.id == image_id])
+        return bool(local)
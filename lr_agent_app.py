@@ -1,13 +1,22 @@
 import asyncio
-import ssl
 import os
 import logging
 import websockets
 
 from lr_agent_client import LRAgentClient
 # from lr_agent_local import LRAgentLocalClient
-from exception.exc import InitException, PongFailedException, TaskFailedException
+from dockertools.docker_cache import DockerCache
+from dockertools.docker_connector import DockerConnector
+from exception.exc import InitException, PongFailedException
 from loggingtools.logger import build_logger
+from tasktools.scheduler import Scheduler
+from tasktools.supervisor import Supervisor
+from resolvertools.control_socket import ControlSocketPool
+from resolvertools.stats_baseline import StatsBaseline
+from sysinfo.container_stats import ContainerStats
+from sysinfo.host_sampler import HostSampler
+from sysinfo.kresman_client import KresmanClient
+from transporttools.reconnect import ReconnectManager
 
 
 def validate_settings():
@@ -21,47 +30,61 @@ def validate_settings():
     return client_cert, proxy_address
 
 
-async def connect():
+async def connect(reconnect_manager: ReconnectManager):
     client_cert, proxy_address = validate_settings()
-    ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-    ssl_context.load_cert_chain(client_cert)
-    # sslContext.load_cert_chain(WHALEBONE_LR_CLIENT_CERT)
-    logger = logging.getLogger("main")
-    alive = int(os.environ.get('KEEP_ALIVE', 10))
-    try:
-        connection = await websockets.connect(proxy_address, ssl=ssl_context, ping_interval=alive, ping_timeout=alive)
-    except Exception as ce:
-        raise InitException("Failed to connect to {} due to {}.".format(proxy_address, ce))
-    else:
-        logger.info("Connected to {}".format(proxy_address))
-        return connection
+    return await reconnect_manager.connect(client_cert, proxy_address)
 
 
-async def task_monitor():
-    if "listen" not in [task._coro.__name__ for task in asyncio.all_tasks()]:
-        logger = logging.getLogger("main")
-        logger.error("Task listen not found in running tasks.")
-        raise TaskFailedException
+def schedule_periodic_tasks(scheduler: Scheduler, remote_client: LRAgentClient):
+    interval = int(os.environ.get('PERIODIC_INTERVAL', 60))
+    task_timeout = int(os.environ.get('TASK_TIMEOUT', 300))
+    jitter = float(os.environ.get('PERIODIC_JITTER', 5))
+    periodic_tasks = (("sysinfo", remote_client.send_sys_info, "SYSINFO_INTERVAL", "skip"),
+                      ("validate_host", remote_client.validate_host, "VALIDATE_HOST_INTERVAL", "skip"),
+                      ("office365_rpz", remote_client.create_office365_rpz, "RPZ_CHECK_INTERVAL", "skip"),
+                      ("agent_status", remote_client.set_agent_status, "STATUS_INTERVAL", "cancel"))
+    for name, function, interval_env, overlap in periodic_tasks:
+        scheduler.add_job(name, function, int(os.environ.get(interval_env, interval)), task_timeout, jitter, overlap)
 
 
-async def main_task_monitor():
-    while True:
-        if "local_resolver_agent_app" not in [task._coro.__name__ for task in asyncio.all_tasks()]:
-            logger = logging.getLogger("main")
-            logger.error("Task local_resolver_agent_app not found in running tasks.")
-            raise TaskFailedException
-        await asyncio.sleep(60)
+async def supervise_agent(supervisor: Supervisor):
+    # host sampling, docker cache and stats streams keep running across reconnects, no interval or event is missed,
+    # docker api client is shared by all connections
+    host_sampler = HostSampler()
+    docker_logger = build_logger("docker-connector", "/etc/whalebone/logs/")
+    docker_cache = DockerCache(docker_logger)
+    docker_connector = DockerConnector(docker_cache)
+    container_stats = ContainerStats(docker_logger, docker_cache)
+    supervisor.start("host_sampler", host_sampler.run, "permanent")
+    supervisor.start("docker_cache", docker_cache.run, "permanent", restart_delay=10)
+    supervisor.start("container_stats", container_stats.run, "permanent", restart_delay=10)
+    supervisor.start("local_resolver_agent_app",
+                     lambda: local_resolver_agent_app(supervisor, host_sampler, docker_connector, container_stats),
+                     "permanent", restart_delay=10)
+    await supervisor.watch()
 
 
-async def local_resolver_agent_app():
+async def local_resolver_agent_app(supervisor: Supervisor, host_sampler: HostSampler,
+                                   docker_connector: DockerConnector, container_stats: ContainerStats):
     logger = logging.getLogger("main")
-    interval = int(os.environ.get('PERIODIC_INTERVAL', 60))
-    task_timeout = int(os.environ.get('TASK_TIMEOUT', 300))
+    reconnect_manager = ReconnectManager(logger)
+    control_sockets, stats_baseline = ControlSocketPool(), StatsBaseline()
+    kresman = KresmanClient(logging.getLogger("sys_info"))
+    # requests changing containers are serialized across reconnects as well
+    exclusive_lock = asyncio.Lock()
+    alive = int(os.environ.get('KEEP_ALIVE', 10))
     while True:
+        scheduler, websocket = Scheduler(logger, supervisor), None
         try:
-            websocket = await connect()
-            remote_client = LRAgentClient(websocket)
-            task = asyncio.create_task(remote_client.listen())
+            websocket = await connect(reconnect_manager)
+            remote_client = LRAgentClient(websocket, supervisor=supervisor, codec=reconnect_manager.codec,
+                                          control_sockets=control_sockets, stats_baseline=stats_baseline, kresman=kresman,
+                                          host_sampler=host_sampler, docker_connector=docker_connector,
+                                          container_stats=container_stats, exclusive_lock=exclusive_lock,
+                                          statistics={"tasks": scheduler.stats, "connection": reconnect_manager.stats,
+                                                      "supervisor": supervisor.stats})
+            supervisor.start("listen", remote_client.listen, "temporary", heartbeat_timeout=3 * alive)
+            supervisor.start("writer", remote_client.writer, "temporary")
             # try:
             #     local_client = LRAgentLocalClient(LRAgentClient(None))
             # except Exception as e:
@@ -69,31 +92,26 @@ async def local_resolver_agent_app():
             # else:
             #     local_api= await local_client.start_api()
             #     local_task = asyncio.ensure_future(local_api)
-            while True:
-                for periodic_task in (remote_client.send_sys_info, remote_client.validate_host, task_monitor,
-                                      remote_client.create_office365_rpz, remote_client.set_agent_status):
-                    await asyncio.wait_for(periodic_task(), task_timeout)
-                await asyncio.sleep(interval)
-        # except asyncio.exceptions.TimeoutError:
-        #     logger.error("Periodic task {} failed to finish in time, Retrying in 10 secs... .".format(periodic_task))
+            schedule_periodic_tasks(scheduler, remote_client)
+            scheduler.start()
+            await supervisor.join("listen")
+        except (websockets.exceptions.ConnectionClosed, PongFailedException) as ce:
+            logger.error("Connection error encountered, {}.".format(ce))
         except Exception as ge:
-            try:
-                te = task.exception()
-                if type(te) in [websockets.exceptions.ConnectionClosed, PongFailedException]:
-                    logger.error("Connection error encountered.")
-                else:
-                    logger.error('Generic error: {}'.format(te))
-            except Exception:
-                logger.error('Generic error: {}'.format(ge))
+            logger.error('Generic error: {}'.format(ge))
         finally:
+            await asyncio.gather(scheduler.stop(), supervisor.stop("listen", "writer"))
+            reconnect_manager.disconnected(websocket)
+            delay = reconnect_manager.next_delay()
             try:
-                await websocket.close()
+                if websocket is not None:
+                    await websocket.close()
                 # await local_api.close()
-                logger.error('Connection Reset. Retrying in 10 secs...')
+                logger.error('Connection Reset. Retrying in {:.1f} secs...'.format(delay))
             except Exception as ce:
                 logger.warning("Failed to cleanup due to {}.".format(ce))
             finally:
-                await asyncio.sleep(10)
+                await asyncio.sleep(delay)
 
 
 if __name__ == '__main__':
@@ -104,9 +122,7 @@ if __name__ == '__main__':
         logger = build_logger("main", "/etc/whalebone/logs/")
     try:
         loop = asyncio.get_event_loop()
-        loop.run_until_complete(local_resolver_agent_app())
-        loop.create_task(main_task_monitor())
-        loop.run_forever()
+        loop.run_until_complete(supervise_agent(Supervisor(logger)))
     except InitException as ie:
         logger.error(str(ie))
     except Exception as e:
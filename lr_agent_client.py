@@ -1,8 +1,8 @@
+import copy
 import json
 import asyncio
 import base64
 import logging
-import socket
 import zipfile
 import yaml
 import os
@@ -14,7 +14,6 @@ import aiohttp
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-from aiodocker import Docker
 from collections import deque
 from shutil import copyfile, copytree, rmtree
 from cryptography import x509
@@ -26,8 +25,19 @@ from logging.handlers import RotatingFileHandler
 
 from dockertools.docker_connector import DockerConnector
 from sysinfo.sys_info import SystemInfo
+from sysinfo.delta import SysInfoDelta
 from exception.exc import ContainerException, ComposeException, PongFailedException
+from tasktools.dispatcher import RequestDispatcher
+from transporttools.outbound_queue import OutboundQueue
+from transporttools.codec import Base64JsonCodec, JsonData, decode_data, encode_data
 from dockertools.compose_parser import ComposeParser
+from dockertools.upgrade_planner import RESTART, UNCHANGED, UpgradePlanner
+from resolvertools.control_socket import ControlSocketPool
+from resolvertools.readiness import INSTANCE_STEPS
+from resolvertools.stats_baseline import StatsBaseline
+from sysinfo.kresman_client import KresmanClient
+from sysinfo.host_sampler import HostSampler
+from sysinfo.container_stats import ContainerStats
 from loggingtools.logger import build_logger
 # from loggingtools.log_reader import LogReader
 # from resolvertools.resolver_connector import FirewallConnector
@@ -35,10 +45,21 @@ from loggingtools.logger import build_logger
 
 class LRAgentClient:
 
-    def __init__(self, websocket, cli: bool = False):
+    def __init__(self, websocket, cli: bool = False, statistics: dict = None, supervisor=None, codec=None,
+                 control_sockets: ControlSocketPool = None, stats_baseline: StatsBaseline = None,
+                 kresman: KresmanClient = None, host_sampler: HostSampler = None,
+                 docker_connector: DockerConnector = None,
+                 container_stats: ContainerStats = None, exclusive_lock: asyncio.Lock = None):
         self.websocket = websocket
-        self.dockerConnector = DockerConnector()
+        self.control_sockets = control_sockets if control_sockets else ControlSocketPool()
+        self.stats_baseline = stats_baseline if stats_baseline else StatsBaseline()
+        self.codec = codec if codec else Base64JsonCodec()
+        self.supervisor = supervisor
+        self.statistics = statistics if statistics else {}
+        self.dockerConnector = docker_connector if docker_connector else DockerConnector()
         self.compose_parser = ComposeParser()
+        self.upgrade_planner = UpgradePlanner(self.dockerConnector)
+        self.running_compose = None
         # self.firewall_connector = FirewallConnector()
         # self.log_reader = LogReader()
         self.folder = "/etc/whalebone/"
@@ -46,7 +67,18 @@ class LRAgentClient:
         self.status_log = build_logger("status", "{}logs/".format(self.folder), file_size=10000000, backup_count=2,
                                        console_output=False)
         self.sysinfo_logger = build_logger("sys_info", "{}logs/".format(self.folder))
+        self.kresman = kresman if kresman else KresmanClient(self.sysinfo_logger)
+        self.host_sampler = host_sampler if host_sampler else HostSampler()
+        self.container_stats = container_stats if container_stats else ContainerStats(self.sysinfo_logger,
+                                                                                      self.dockerConnector.cache)
         self.async_actions = ("stop", "remove", "create", "upgrade", "datacollect", "updatecache", "suicide")
+        self.exclusive_actions = ("create", "upgrade", "suicide", "clearcache", "stop", "remove", "restart")
+        self.dispatcher = RequestDispatcher(self.handle_request, self.exclusive_actions,
+                                            int(os.environ.get("MAX_CONCURRENT_REQUESTS", 10)), self.logger,
+                                            exclusive_lock)
+        self.outbound_queue = OutboundQueue()
+        # created with every connection, the first sysinfo after a reconnect is a keyframe
+        self.sysinfo_delta = SysInfoDelta()
         self.error_stash = {}
         if "RPZ_WHITELIST" in os.environ:
             self.microsoft_id = uuid.uuid4()
@@ -58,13 +90,17 @@ class LRAgentClient:
         self.alive = int(os.environ.get('KEEP_ALIVE', 10))
         # self.kresman_token = self.get_kresman_credentials()
         # self.sysinfo_connector = SystemInfo(self.dockerConnector, self.sysinfo_logger, self.kresman_token)
-        self.sysinfo_connector = SystemInfo(self.dockerConnector, self.sysinfo_logger)
+        self.sysinfo_connector = SystemInfo(self.dockerConnector, self.sysinfo_logger, self.control_sockets,
+                                            self.stats_baseline, self.kresman, self.host_sampler,
+                                            self.container_stats)
 
     async def listen(self):
         # async for request in self.websocket:
         while True:
+            if self.supervisor:
+                self.supervisor.heartbeat("listen")
             try:
-                request = await asyncio.wait_for(self.websocket.recv(), timeout=self.alive)
+                frame = await asyncio.wait_for(self.websocket.recv(), timeout=self.alive)
             except asyncio.TimeoutError:
                 try:
                     pong_waiter = await self.websocket.ping()
@@ -73,36 +109,117 @@ class LRAgentClient:
                     raise PongFailedException("Failed to receive pong")
             else:
                 try:
-                    status, parsed_request = await self.process(request)
+                    request = self.codec.decode(frame)
                 except Exception as e:
-                    status, parsed_request = {"status": "failure", "body": str(e)}, json.loads(request)
-                    self.logger.warning("Failed to get action response {}.".format(e))
-                else:
-                    try:
-                        if parsed_request["action"] in self.async_actions and parsed_request["action"] != "updatecache":
-                            self.process_response(status, parsed_request["action"])
-                    except Exception as e:
-                        self.logger.info("Error during exception persistence, {}".format(e))
-                await self.send(self.prepare_response(status, parsed_request))
-
-    async def send(self, message: dict):
+                    self.logger.info("Failed to parse request: {}, {}".format(e, frame))
+                    await self.send({"action": "request", "data": {
+                        "status": "failure", "message": "failed to parse/decode request", "body": str(e)}})
+                    continue
+                if request.get("action") == "sysinfo_ack":
+                    # confirmation of a delivered sysinfo, it is not answered
+                    self.confirm_sys_info(request)
+                elif not self.dispatcher.dispatch(request.get("action", "unknown"), request):
+                    await self.send(self.prepare_busy_response(request))
+                elif request.get("action") in self.async_actions:
+                    # acknowledged on acceptance, an exclusive request may wait for the lock for minutes
+                    await self.send_acknowledgement({"action": request["action"], "requestId": request.get("requestId")})
+
+    async def handle_request(self, request: dict):
         try:
-            message = self.encode_request(message)
+            status = await self.process_request(request)
         except Exception as e:
-            self.logger.warning(e)
+            status = {"status": "failure", "body": str(e)}
+            self.logger.warning("Failed to get action response {}.".format(e))
         else:
-            if message["action"] != "sysinfo":
-                self.logger.info("Sending: {}".format(message))
-            await self.websocket.send(json.dumps(message))
+            try:
+                if request["action"] in self.async_actions and request["action"] != "updatecache" and \
+                        not request.get("data", {}).get("dry_run"):
+                    self.process_response(status, request["action"])
+            except Exception as e:
+                self.logger.info("Error during exception persistence, {}".format(e))
+        await self.send(self.prepare_response(status, request))
+
+    def prepare_busy_response(self, request: dict) -> dict:
+        response = {"action": request.get("action", "unknown"), "data": {"action_status": {
+            "status": "failure", "message": "Agent is busy, too many requests in progress, try again later"}}}
+        if "requestId" in request:
+            response["requestId"] = request["requestId"]
+        return response
+
+    async def send(self, message: dict, priority: str = "response", wait: bool = False):
+        sent = self.outbound_queue.put(message, priority, message["action"] if priority == "telemetry" else None)
+        if wait:
+            await asyncio.wait_for(asyncio.shield(sent), timeout=self.alive)
+        return sent
+
+    async def writer(self):
+        while True:
+            entry = await self.outbound_queue.get()
+            try:
+                frame = self.codec.encode(entry.message)
+            except Exception as e:
+                self.logger.warning(e)
+                self.outbound_queue.done(entry, e)
+                continue
+            if entry.message["action"] != "sysinfo":
+                self.logger.info("Sending: {}".format(entry.message))
+            try:
+                await self.websocket.send(frame)
+            except Exception as e:
+                self.outbound_queue.done(entry, e)
+                raise
+            else:
+                self.outbound_queue.done(entry)
 
     async def send_sys_info(self):
         try:
-            sys_info = {"action": "sysinfo", "data": self.sysinfo_connector.get_system_info(self.error_stash)}
+            sys_info = {"action": "sysinfo", "data": await self.sysinfo_connector.get_system_info(self.error_stash)}
+            sys_info["data"]["agent"] = self.agent_statistics()
         except Exception as e:
             self.logger.info("Failed to get periodic system info {}.".format(e))
             sys_info = {"action": "sysinfo", "data": {"status": "failure", "body": str(e)}}
-        self.save_file("sysinfo/metrics.log", "sysinfo", sys_info["data"], "a")
-        await self.send(sys_info)
+            self.save_file("sysinfo/metrics.log", "sysinfo", sys_info["data"], "a")
+            await self.send(sys_info, "telemetry")
+            return
+        payload = JsonData(sys_info["data"])
+        self.save_file("sysinfo/metrics.log", "sysinfo", payload, "a")
+        message = self.sysinfo_delta.encode(sys_info["data"])
+        if message["data"] is sys_info["data"]:
+            message["data"] = payload
+        sent = await self.send(message, "telemetry")
+        if "sequence" in message:
+            sent.add_done_callback(lambda future: self.sys_info_sent(future, message["sequence"], sys_info["data"]))
+
+    def sys_info_sent(self, future: asyncio.Future, sequence: int, data: dict):
+        # superseded or failed snapshot never reached proxy and cannot serve as a delta base
+        if not future.cancelled() and future.exception() is None and future.result():
+            self.sysinfo_delta.sent(sequence, data)
+
+    def confirm_sys_info(self, request: dict):
+        try:
+            self.sysinfo_delta.confirm(int(request["data"]["sequence"]))
+        except (KeyError, TypeError, ValueError) as e:
+            self.logger.info("Invalid sysinfo acknowledgement {}, {}.".format(request, e))
+
+    async def sysinfo_resync(self, **_) -> dict:
+        self.sysinfo_delta.resync()
+        await self.send_sys_info()
+        return {"status": "success", "message": "Sysinfo keyframe sent"}
+
+    def agent_statistics(self) -> dict:
+        statistics = {name: provider() for name, provider in self.statistics.items()}
+        statistics["requests"] = self.dispatcher.stats()
+        statistics["outbound"] = self.outbound_queue.stats()
+        statistics["sysinfo"] = self.sysinfo_delta.stats()
+        statistics["control_sockets"] = self.control_sockets.stats()
+        statistics["stats_baseline"] = self.stats_baseline.stats()
+        statistics["kresman"] = self.kresman.stats()
+        statistics["host_sampler"] = self.host_sampler.stats()
+        statistics["docker_cache"] = self.dockerConnector.cache.stats()
+        statistics["docker_api"] = self.dockerConnector.stats()
+        statistics["image_pulls"] = self.dockerConnector.pulls
+        statistics["container_stats"] = self.container_stats.stats()
+        return statistics
 
     def prepare_response(self, status: dict, request: dict) -> dict:
         status = status if status else {"Action finished with unknown issue, no status returned"}
@@ -114,15 +231,17 @@ class LRAgentClient:
 
     async def send_acknowledgement(self, message: dict):
         message["data"] = {"status": "success", "message": "Command received"}
-        await self.send(message)
+        await self.send(message, "acknowledgement")
 
     async def validate_host(self):
-        if os.path.exists("{}etc/agent/upgrade.json".format(self.folder)):
-            await self.perform_persisted_upgrade()
-        elif not os.path.exists("{}etc/agent/docker-compose.yml".format(self.folder)):
-            await self.send({"action": "request", "data": {"message": "compose missing"}})
-        else:
-            await self.check_running_services()
+        # resumed upgrade and restarts of offline services must not interleave with container changing requests
+        async with self.dispatcher.exclusive_lock:
+            if os.path.exists("{}etc/agent/upgrade.json".format(self.folder)):
+                await self.perform_persisted_upgrade()
+            elif not os.path.exists("{}etc/agent/docker-compose.yml".format(self.folder)):
+                await self.send({"action": "request", "data": {"message": "compose missing"}})
+            else:
+                await self.check_running_services()
 
     async def perform_persisted_upgrade(self):
         with open("{}etc/agent/upgrade.json".format(self.folder), "r") as upgrade:
@@ -139,21 +258,36 @@ class LRAgentClient:
 
     async def check_running_services(self):
         try:
-            with open("{}etc/agent/docker-compose.yml".format(self.folder), "r") as compose:
-                active_services = [container.name for container in self.dockerConnector.get_containers()]
-                for service, config in self.compose_parser.create_service(compose)["services"].items():
-                    if service not in active_services:
-                        try:
-                            await self.upgrade_start_service(service, config)
-                        except Exception as e:
-                            self.logger.warning(
-                                "Service: {} is offline, automatic start failed due to: {}".format(service, e))
-                            continue
-                    if service in self.error_stash:
-                        del self.error_stash[service]
+            parsed_compose = self.load_running_compose()
+            active_services = [container.name for container in await self.dockerConnector.get_containers()]
+            offline = [service for service in parsed_compose["services"] if service not in active_services]
+            plan = await self.upgrade_plan(parsed_compose, offline, None) if offline else {}
+            for service, config in parsed_compose["services"].items():
+                if service in offline:
+                    try:
+                        if plan.get(service, {}).get("action") == RESTART:
+                            await self.dockerConnector.restart_container(service)
+                        else:
+                            await self.upgrade_start_service(service, config, pull=True)
+                    except Exception as e:
+                        self.logger.warning(
+                            "Service: {} is offline, automatic start failed due to: {}".format(service, e))
+                        continue
+                if service in self.error_stash:
+                    del self.error_stash[service]
         except Exception as se:
             self.logger.warning("Failed to check running services {}.".format(se))
 
+    def load_running_compose(self) -> dict:
+        # compose is parsed again only when the file changes
+        path = "{}etc/agent/docker-compose.yml".format(self.folder)
+        stat = os.stat(path)
+        if self.running_compose is None or self.running_compose[0] != (stat.st_mtime_ns, stat.st_size):
+            with open(path, "r") as compose:
+                self.running_compose = ((stat.st_mtime_ns, stat.st_size), self.compose_parser.create_service(compose))
+        # callers translate the compose in place, e.g. cert paths are replaced by their contents
+        return copy.deepcopy(self.running_compose[1])
+
     def enable_websocket_log(self):
         logger = logging.getLogger('websockets')
         if not any(isinstance(handler, RotatingFileHandler) for handler in logger.handlers):
@@ -165,7 +299,7 @@ class LRAgentClient:
 
     async def set_agent_status(self):
         try:
-            running_tasks = [task._coro.__name__ for task in asyncio.all_tasks()]
+            running_tasks = self.supervisor.running_tasks() if self.supervisor else []
             pong_waiter = await self.websocket.ping()
             await asyncio.wait_for(pong_waiter, timeout=self.alive)
         except Exception as e:
@@ -191,17 +325,9 @@ class LRAgentClient:
                             if not self.error_stash[service]:
                                 del self.error_stash[service]
 
-    async def process(self, request_json: str):
-        try:
-            request = self.decode_request(json.loads(request_json))
-        except Exception as e:
-            self.logger.info("Failed to parse request: {}, {}".format(e, request_json))
-            return {"action": "request",
-                    "data": {"status": "failure", "message": "failed to parse/decode request", "body": str(e)}}
+    async def process_request(self, request: dict):
         if not self.cli:
             self.logger.info("Received: {}".format(request))
-            if request["action"] in self.async_actions:
-                await self.send_acknowledgement({"action": request["action"], "requestId": request["requestId"]})
 
         method_calls = {"sysinfo": self.system_info, "create": self.create_container, "upgrade": self.upgrade_container,
                         "suicide": self.resolver_suicide, "clearcache": self.resolver_cache_clear,
@@ -213,7 +339,7 @@ class LRAgentClient:
                         # "flog": self.agent_filtered_logs, "dellogs": self.agent_delete_logs,  "saveconfig": self.write_config,
                         # "containerlogs": self.container_logs,
                         "updatecache": self.update_cache, "containers": self.list_containers, "test": self.agent_test_message,
-                         "datacollect": self.pack_files, "trace": self.trace_domain}
+                         "datacollect": self.pack_files, "trace": self.trace_domain, "resync": self.sysinfo_resync}
         # method_arguments = {"sysinfo": [response, request], "create": [response, request], "test": [response],
         #                     "upgrade": [response, request], "suicide": [response], "containers": [response],
         #                     # "restart": [response, request], "rename": [response, request],
@@ -227,24 +353,27 @@ class LRAgentClient:
         #                     # "whitelistadd": [response, request],
         #                     "datacollect": [response, request], "trace": [response, request]}
 
-        if "CONFIRMATION_REQUIRED" in os.environ and request["action"] not in ["updatecache"] and not self.cli:
+        if "CONFIRMATION_REQUIRED" in os.environ and request["action"] not in ["updatecache", "resync"] and \
+                not self.cli and not request.get("data", {}).get("dry_run"):
             self.persist_request(request)
             # response["data"] = {"message": "Request successfully persisted.", "status": "success"}
-            return {"message": "Request successfully persisted.", "status": "success"}, request
+            return {"message": "Request successfully persisted.", "status": "success"}
         else:
             try:
                 # return await method_calls[request["action"]](*method_arguments[request["action"]])
-                return await method_calls[request["action"]](**request["data"]), request
+                return await method_calls[request["action"]](**request["data"])
             except KeyError as ke:
                 self.logger.warning("Unknown action '{}'".format(ke))
-                return {"status": "failure", "message": "Action {} is not supported.".format(ke)}, request
+                return {"status": "failure", "message": "Action {} is not supported.".format(ke)}
             except TypeError as te:
                 self.logger.info("Method {}".format(te))
-                return {"status": "failure", "message": "Method {}".format(te)}, request
+                return {"status": "failure", "message": "Method {}".format(te)}
 
     async def system_info(self, **_) -> dict:
         try:
-            return self.sysinfo_connector.get_system_info(self.error_stash, self.cli)
+            sys_info = await self.sysinfo_connector.get_system_info(self.error_stash, self.cli)
+            sys_info["agent"] = self.agent_statistics()
+            return sys_info
         except Exception as e:
             self.logger.info("Failed to get sys info data {}.".format(e))
             return {}
@@ -262,6 +391,7 @@ class LRAgentClient:
                 self.logger.warning(e)
                 return {"status": "failure", "body": str(e)}
             else:
+                unavailable = await self.upgrade_prepull_images(parsed_compose, list(parsed_compose["services"]))
                 if "volumes" in parsed_compose:
                     await self.check_named_volumes(parsed_compose["volumes"])
                 if "resolver" in parsed_compose["services"]:
@@ -269,9 +399,12 @@ class LRAgentClient:
                     if result:
                         status["dump"] = result
                 for service, service_config in parsed_compose["services"].items():
+                    if service in unavailable:
+                        status[service] = unavailable[service]
+                        continue
                     status[service] = {}
                     try:
-                        await self.dockerConnector.start_service(service_config)
+                        await self.dockerConnector.start_service(service_config, pull=False)
                     except ContainerException as e:
                         status[service] = {"status": "failure", "body": str(e)}
                         self.logger.info("Failed to start service {} due to {}.".format(service, e))
@@ -279,7 +412,7 @@ class LRAgentClient:
                         status[service]["status"] = "success"
                         if service == "resolver":
                             await self.update_cache()
-                            self.prefetch_tld()
+                            await self.prefetch_tld()
         return status
 
     # async def upgrade_container(self, response: dict, request: dict) -> dict:
@@ -456,7 +589,7 @@ class LRAgentClient:
     #     return response
 
     async def upgrade_container(self, compose: str = "", config: list = None, services: list = None, uid: str = "",
-                                **_) -> dict:
+                                dry_run: bool = False, **_) -> dict:
         status, old_config = {}, None
         try:
             compose = self.upgrade_load_compose(compose)
@@ -468,11 +601,24 @@ class LRAgentClient:
             self.logger.warning("Failed to create services from parsed compose, {}".format(e))
             return {"status": "failure", "body": str(e)}
         else:
+            services = services if services else list(parsed_compose["services"])
+            if dry_run:
+                return await self.upgrade_dry_run(parsed_compose, services, config)
             if "volumes" in parsed_compose:
                 await self.check_named_volumes(parsed_compose["volumes"])
-            services = services if services else list(parsed_compose["services"])
+            unavailable = await self.upgrade_prepull_images(parsed_compose, services)
+            plan = await self.upgrade_plan(parsed_compose, services, config)
+            for service in services:
+                if plan.get(service, {}).get("action") == UNCHANGED and service not in unavailable:
+                    status[service] = {"status": "success", "action": UNCHANGED}
+            services = [service for service in services if service not in status]
             if self.upgrade_check_multi_upgrade(services, parsed_compose, uid):
                 services = ["lr-agent"]
+            try:
+                stages = self.compose_parser.upgrade_stages(services, parsed_compose["services"])
+            except ComposeException as e:
+                self.logger.warning("Failed to order services for upgrade, {}".format(e))
+                return {"status": "failure", "body": str(e)}
             if "resolver" in services:
                 try:
                     old_config = self.upgrade_load_config(config)
@@ -486,19 +632,88 @@ class LRAgentClient:
             for service in services:
                 if service not in parsed_compose["services"]:
                     status[service] = {"status": "failure", "message": "{} not present in compose".format(service)}
-                    continue
-                if service not in ["lr-agent", "resolver"]:
-                    status[service] = await self.upgrade_with_downtime(parsed_compose, service)
-                else:
-                    status[service] = await self.upgrade_without_downtime(service, parsed_compose, old_config)
+            # services without dependency between them are upgraded at the same time
+            begin = asyncio.get_running_loop().time()
+            for number, stage in enumerate(stages):
+                self.logger.info("Upgrading services {} in stage {}".format(stage, number))
+                results = await asyncio.gather(*[self.upgrade_service(service, parsed_compose, old_config, unavailable,
+                                                                      status, plan.get(service, {}))
+                                                 for service in stage])
+                for service, (result, start, end) in zip(stage, results):
+                    status[service] = result
+                    status[service]["timeline"] = {"stage": number, "start": round(start - begin, 2),
+                                                   "end": round(end - begin, 2)}
             try:
                 self.upgrade_persist_compose(status, compose)
             except Exception as de:
                 status["dump"] = de
         return status
 
+    async def upgrade_plan(self, parsed_compose: dict, services: list, config: list,
+                           check_registry: bool = False) -> dict:
+        try:
+            plan = await self.upgrade_planner.plan(parsed_compose, services, config, check_registry)
+        except Exception as e:
+            # without a plan every service is recreated
+            self.logger.warning("Failed to plan upgrade, {}".format(e))
+            return {}
+        self.logger.info("Upgrade plan: {}".format(plan))
+        return plan
+
+    async def upgrade_dry_run(self, parsed_compose: dict, services: list, config: list) -> dict:
+        status, plan = {}, await self.upgrade_plan(parsed_compose, services, config, check_registry=True)
+        try:
+            stages = self.compose_parser.upgrade_stages([service for service in services if service in plan and
+                                                         plan[service]["action"] != UNCHANGED],
+                                                        parsed_compose["services"])
+        except ComposeException as e:
+            return {"status": "failure", "body": str(e)}
+        for service in services:
+            if service not in parsed_compose["services"]:
+                status[service] = {"status": "failure", "message": "{} not present in compose".format(service),
+                                   "body": "dry run"}
+            else:
+                status[service] = {"status": "success", "dry_run": True}
+                status[service].update(plan.get(service, {"action": "recreate", "changes": ["unknown"]}))
+        for number, stage in enumerate(stages):
+            for service in stage:
+                status[service]["stage"] = number
+        return status
+
+    async def upgrade_service(self, service: str, parsed_compose: dict, old_config: list, unavailable: dict,
+                              status: dict, plan: dict) -> tuple:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        failed = [dependency for dependency in
+                  self.compose_parser.service_dependencies(parsed_compose["services"][service])
+                  if isinstance(status.get(dependency), dict) and status[dependency].get("status") == "failure"]
+        if service in unavailable:
+            result = unavailable[service]
+        elif failed:
+            result = self.upgrade_get_error_message("dependencies of {} failed to upgrade".format(service), failed)
+        else:
+            try:
+                if plan.get("action") == RESTART:
+                    result = await self.upgrade_restart_service(service)
+                elif service not in ["lr-agent", "resolver"]:
+                    result = await self.upgrade_with_downtime(parsed_compose, service)
+                else:
+                    result = await self.upgrade_without_downtime(service, parsed_compose, old_config)
+                result["action"] = plan.get("action", "recreate")
+            except Exception as e:
+                self.logger.warning("Upgrade of {} failed, {}".format(service, e))
+                result = self.upgrade_get_error_message("upgrade of {} failed".format(service), e)
+        return result, start, loop.time()
+
+    async def upgrade_restart_service(self, service: str) -> dict:
+        # container matches the compose, it is only not running
+        try:
+            await self.dockerConnector.restart_container(service)
+        except Exception as e:
+            return self.upgrade_get_error_message("failed to restart {}".format(service), e)
+        return {"status": "success"}
+
     async def upgrade_with_downtime(self, parsed_compose: dict, service: str) -> dict:
-        await self.upgrade_pull_image(parsed_compose["services"][service]['image'])
         try:
             await self.upgrade_worker_method(service, self.dockerConnector.remove_container)
         except Exception as e:
@@ -540,7 +755,7 @@ class LRAgentClient:
             raise Exception(e)
 
     async def upgrade_check_incorrect_name(self):
-        running_containers = [container.name for container in self.dockerConnector.get_containers()]
+        running_containers = [container.name for container in await self.dockerConnector.get_containers()]
         if "lr-agent-old" in running_containers and "lr-agent" not in running_containers:
             await self.dockerConnector.rename_container("lr-agent-old", "lr-agent")
 
@@ -552,20 +767,20 @@ class LRAgentClient:
 
     async def dump_resolver_logs(self):
         try:
-            self.save_file("logs/resolver_dump.logs", "text", self.dockerConnector.container_logs("resolver", tail=1000))
+            self.save_file("logs/resolver_dump.logs", "text",
+                           await self.dockerConnector.container_logs("resolver", tail=1000))
         except ConnectionError as ce:
             self.logger.warning("Failed to get logs of new unhealthy resolver, {}.".format(ce))
         except IOError as ie:
             self.logger.warning("Failed to persist logs of new unhealthy resolver, {}.".format(ie))
 
-    async def upgrade_check_binding(self, old_config: list):
-        for _ in range(10):
-            if self.sysinfo_connector.check_port() == "ok" and self.sysinfo_connector.check_port("resolver-old") == "ok":
-                return True
-            await asyncio.sleep(1)
-        await self.dump_resolver_logs()
-        self.upgrade_return_config(old_config)
-        return False
+    async def upgrade_check_readiness(self, old_config: list, sockets: dict) -> dict:
+        readiness = await self.sysinfo_connector.readiness.wait(sockets, INSTANCE_STEPS)
+        self.logger.info("New resolver readiness: {}".format(readiness))
+        if not readiness["ready"]:
+            await self.dump_resolver_logs()
+            self.upgrade_return_config(old_config)
+        return readiness
 
     async def upgrade_translation_fallback(self, service: str, old_config: list):
         await self.dump_resolver_logs()
@@ -609,21 +824,31 @@ class LRAgentClient:
             else:
                 return {"status": "success"}
 
-    async def upgrade_check_resolver_resolving(self, old_config: list, service: str) -> dict:
-        await asyncio.sleep(int(os.environ.get("UPGRADE_SLEEP", 0)))
-        if not await self.upgrade_check_binding(old_config):
-            raise ContainerException("New resolver is not healthy due to port not bound, rollback")
+    async def upgrade_check_resolver_resolving(self, old_config: list, service: str, sockets: dict,
+                                               started: float) -> dict:
+        # old resolver is stopped as soon as the new one listens, both run in parallel only until then
+        readiness = await self.upgrade_check_readiness(old_config, sockets)
+        if not readiness["ready"]:
+            raise ContainerException("New resolver is not ready after {}s, passed {}, rollback".format(
+                readiness["seconds"], list(readiness["steps"])))
         try:
             await self.upgrade_worker_method("resolver-old", self.dockerConnector.stop_container)
         except Exception as se:
             raise ContainerException("Failed to stop old resolver, {}".format(se))
         else:
-            if self.sysinfo_connector.check_resolving() == "fail":
+            switchover = {"ready": readiness["seconds"], "attempts": readiness["attempts"],
+                          "old_stopped": round(asyncio.get_running_loop().time() - started, 3)}
+            # only the new resolver answers on the shared address now
+            resolving = await self.sysinfo_connector.readiness.wait(sockets, ("dns",))
+            switchover["resolving"] = round(asyncio.get_running_loop().time() - started, 3)
+            self.logger.info("Resolver switchover done: {}, resolving {}".format(switchover, resolving))
+            if not resolving["ready"]:
                 return await self.upgrade_translation_fallback(service, old_config)
+            return {"switchover": switchover}
 
-    def upgrade_check_service_state(self, service: str) -> bool:
+    async def upgrade_check_service_state(self, service: str) -> bool:
         try:
-            return True if self.dockerConnector.inspect_config(service)["State"]["Running"] else False
+            return True if (await self.dockerConnector.inspect_config(service))["State"]["Running"] else False
         except Exception:
             return False
 
@@ -631,7 +856,7 @@ class LRAgentClient:
         return {"status": "failure", "message": message, "body": str(exception)}
 
     async def upgrade_without_downtime(self, service: str, parsed_compose: dict, old_config: list=None) -> dict:
-        if service == "resolver" and self.sysinfo_connector.check_port() == "fail":
+        if service == "resolver" and await self.sysinfo_connector.check_port() == "fail":
             return await self.upgrade_replace_unhealthy_resolver(service, parsed_compose)
         else:
             try:
@@ -639,6 +864,8 @@ class LRAgentClient:
             except Exception as or_re:
                 return self.upgrade_get_error_message("failed to rename old {}".format(service), or_re)
             else:
+                sockets = self.sysinfo_connector.readiness.sockets() if service == "resolver" else {}
+                started = asyncio.get_running_loop().time()
                 try:
                     await self.upgrade_start_service(service, parsed_compose["services"][service])
                 except Exception as se:
@@ -652,10 +879,12 @@ class LRAgentClient:
                 else:
                     try:
                         if service == "resolver":
-                            status = await self.upgrade_check_resolver_resolving(old_config, service)
-                            if status:
+                            status = await self.upgrade_check_resolver_resolving(old_config, service, sockets,
+                                                                                 started)
+                            if "status" in status:
                                 return status
-                        if self.upgrade_check_service_state(service):
+                            switchover = status["switchover"]
+                        if await self.upgrade_check_service_state(service):
                             try:
                                 await self.upgrade_worker_method("{}-old".format(service),
                                                                  self.dockerConnector.remove_container)
@@ -673,12 +902,13 @@ class LRAgentClient:
                     else:
                         if service == "resolver":
                             await self.update_cache()
-                            self.prefetch_tld()
+                            await self.prefetch_tld()
+                            return {"status": "success", "switchover": switchover}
                         return {"status": "success"}
 
     async def check_named_volumes(self, config: dict):
         try:
-            volume_names = [volume.name for volume in self.dockerConnector.get_volumes()]
+            volume_names = [volume.name for volume in await self.dockerConnector.get_volumes()]
             for volume_name, volume_attr in config.items():
                 if volume_name not in volume_names:
                     await self.dockerConnector.create_volume(volume_name, **volume_attr)
@@ -704,15 +934,19 @@ class LRAgentClient:
             except FileNotFoundError:
                 raise Exception("Compose not supplied and local compose not present")
 
-    async def upgrade_pull_image(self, name: str):
-        try:
-            await self.dockerConnector.pull_image(name)  # pulls image before removal, upgrade is instant
-        except Exception as e:
-            self.logger.info("Failed to pull image before upgrade, {}".format(e))
+    async def upgrade_prepull_images(self, parsed_compose: dict, services: list) -> dict:
+        # images are pulled before any container is touched, services with unavailable image are not upgraded
+        images = {service: parsed_compose["services"][service]["image"] for service in services
+                  if service in parsed_compose["services"]}
+        pulls = await self.dockerConnector.prepull_images(list(images.values()))
+        self.logger.info("Images prepared: {}".format(pulls))
+        return {service: self.upgrade_get_error_message("image {} is not available".format(image),
+                                                        pulls[image].get("error"))
+                for service, image in images.items() if pulls[image]["status"] == "failed"}
 
     async def upgrade_worker_method(self, service: str, action, name: str = None):
         try:
-            if service in [container.name for container in self.dockerConnector.get_containers(stopped=True)]:
+            if service in [container.name for container in await self.dockerConnector.get_containers(stopped=True)]:
                 if name:
                     await action(service, name)
                 else:
@@ -724,7 +958,7 @@ class LRAgentClient:
     async def upgrade_rename_service(self, service: str):
         try:
             if "{}-old".format(service) in [container.name for container in
-                                            self.dockerConnector.get_containers(stopped=True)]:
+                                            await self.dockerConnector.get_containers(stopped=True)]:
                 await self.dockerConnector.remove_container("{}-old".format(service))
                 await self.dockerConnector.rename_container(service, "{}-old".format(service))
             else:
@@ -733,13 +967,13 @@ class LRAgentClient:
             self.logger.warning("Failed to rename {} service, error {}".format(service, e))
             raise Exception(e)
 
-    async def upgrade_start_service(self, service: str, compose: dict):
+    async def upgrade_start_service(self, service: str, compose: dict, pull: bool = False):
         try:
-            if service not in [container.name for container in self.dockerConnector.get_containers(stopped=True)]:
-                await self.dockerConnector.start_service(compose)  # tries to start new service
+            if service not in [container.name for container in await self.dockerConnector.get_containers(stopped=True)]:
+                await self.dockerConnector.start_service(compose, pull)  # tries to start new service
             else:
                 await self.dockerConnector.remove_container(service)  # deletes orphaned service
-                await self.dockerConnector.start_service(compose)  # tries to start new service
+                await self.dockerConnector.start_service(compose, pull)  # tries to start new service
         except ContainerException as e:
             self.logger.warning("Failed to create {} service, error {}".format(service, e))
             raise Exception(e)
@@ -862,12 +1096,12 @@ class LRAgentClient:
 
     async def list_containers(self, **_) -> dict:
         data = []
-        for container in self.dockerConnector.get_containers():
+        for container in await self.dockerConnector.get_containers():
             data.append({
                 "id": container.short_id,
                 "image": {
-                    "id": container.image.id[7:19],
-                    "tags": container.image.tags
+                    "id": container.image_id[7:19],
+                    "tags": await self.dockerConnector.image_tags(container.image_id)
                 },
                 "labels": {
                     label: value for label, value in container.labels.items() if container.name == label
@@ -1068,15 +1302,13 @@ class LRAgentClient:
                     else:
                         self.logger.warning("No data present in Microsoft domains list.")
 
-    def prefetch_tld(self):
-        message = b"prefill.config({['.'] = { url = 'https://www.internic.net/domain/root.zone', interval = 86400 }})\n"
-        for tty in os.listdir("/etc/whalebone/tty/"):
-            try:
-                self.send_to_socket(message, tty)
-            except Exception:
-                self.logger.warning("Failed to send prefetch data to socket")
+    async def prefetch_tld(self):
+        message = "prefill.config({['.'] = { url = 'https://www.internic.net/domain/root.zone', interval = 86400 }})"
+        for tty, reply in (await self.control_sockets.broadcast(message)).items():
+            if isinstance(reply, Exception):
+                self.logger.warning("Failed to send prefetch data to socket {}, {}".format(tty, reply))
             else:
-                self.logger.info("Tlds successfully pre fetched.")
+                self.logger.info("Tlds successfully pre fetched on tty {}.".format(tty))
 
     def get_kresman_credentials(self) -> str:
         try:
@@ -1096,22 +1328,12 @@ class LRAgentClient:
         return ""
 
     async def update_cache(self,  **_) -> dict:
-        address = os.environ.get("KRESMAN_LISTENER", "http://127.0.0.1:8080")
         try:
-            # async with aiohttp.ClientSession() as session:
-            #     async with session.get("{}/api/general/updatenow".format(address), json={}, ssl=False) as response:
-            #         if response.ok:
-            #             return {"status": "success", "message": "Cache update successful"}
-            #         else:
-            #             return {"status": "failure", "message": "Cache update failed"}
-            msg = requests.get("{}/api/general/updatenow".format(address), json={}, verify=False,
-                               # headers={'accept': '*/*', 'Content-Type': 'application/json',
-                               #          'Authorization': 'Bearer {}'.format(self.kresman_token)}
-                               )
-        except requests.exceptions.RequestException as e:
-            return {"status": "failure", "body": str(e)}
+            updated = await self.kresman.update_now()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return {"status": "failure", "body": str(e) or e.__class__.__name__}
         else:
-            if msg.ok:
+            if updated:
                 return {"status": "success", "message": "Cache update successful"}
             else:
                 return {"status": "failure", "message": "Cache update failed"}
@@ -1122,54 +1344,36 @@ class LRAgentClient:
         except KeyError:
             address = "http://127.0.0.1:8453"
         try:
-            msg = requests.get("{}/trace/{}/{}".format(address, domain, query_type),
-                               timeout=int(os.environ.get("HTTP_TIMEOUT", 10)))
-        except requests.exceptions.RequestException as e:
-            return {"status": "failure", "body": str(e)}
+            async with aiohttp.ClientSession(
+                    timeout=aiohttp.ClientTimeout(total=int(os.environ.get("HTTP_TIMEOUT", 10)))) as session:
+                async with session.get("{}/trace/{}/{}".format(address, domain, query_type)) as msg:
+                    ok, content = msg.status < 400, await msg.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return {"status": "failure", "body": str(e) or e.__class__.__name__}
         else:
-            if msg.ok:
-                return {"status": "success", "trace": msg.content.decode("utf-8")}
+            if ok:
+                return {"status": "success", "trace": content}
             else:
-                return {"status": "failure", "message": "Trace failed",
-                                    "error": msg.content.decode("utf-8")}
+                return {"status": "failure", "message": "Trace failed", "error": content}
 
     async def resolver_cache_clear(self, clear: str = "all", **_) -> dict:
-        message = "cache.clear()\n" if clear == "all" else "cache.clear('{}', true)\n".format(clear)
-        for tty in os.listdir("/etc/whalebone/tty/"):
-            try:
-                response = self.send_to_socket(message.encode("utf-8"), tty)
-            except Exception as e:
-                self.logger.warning("Failed to clear cache on tty {}, {}.".format(tty, e))
+        message = "cache.clear()" if clear == "all" else "cache.clear('{}', true)".format(clear)
+        instances = {}
+        for tty, reply in (await self.control_sockets.broadcast(message)).items():
+            if isinstance(reply, Exception):
+                self.logger.warning("Failed to clear cache on tty {}, {}.".format(tty, reply))
+                instances[tty] = {"status": "failure", "message": "Failed to send command.", "body": str(reply)}
+            elif "count" in reply:
+                instances[tty] = {"status": "success"}
             else:
-                if isinstance(response, str) and "count" in response:
-                    return {"status": "success"}
-                else:
-                    return {"status": "failure", "message": response}
-        return {"status": "failure", "message": "Failed to send command."}
-
-    def send_to_socket(self, message: bytes, tty) -> str:
-        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        sock.settimeout(5)
-        try:
-            sock.connect("/etc/whalebone/tty/{}".format(tty))
-        except socket.timeout as te:
-            self.logger.warning("Timeout of socket {} reading, {}".format(tty, te))
-        except socket.error as msg:
-            self.logger.warning("Connection error {} to socket {}".format(msg, tty))
-        else:
-            try:
-                sock.sendall(message)
-                amount_received, amount_expected = 0, len(message)
-                while amount_received < amount_expected:
-                    data = sock.recv(65535)
-                    amount_received += len(data)
-                return data.decode("utf-8")
-            except socket.timeout as re:
-                self.logger.warning("Failed to get data from socket {}, {}".format(tty, re))
-            except Exception as e:
-                self.logger.warning("Failed to get data from {}, {}".format(tty, e))
-            finally:
-                sock.close()
+                instances[tty] = {"status": "failure", "message": reply}
+        if not instances:
+            return {"status": "failure", "message": "Failed to send command."}
+        failed = [tty for tty, result in instances.items() if result["status"] == "failure"]
+        if failed:
+            return {"status": "failure", "message": "Cache clear failed on {} of {} resolver instances".format(
+                len(failed), len(instances)), "instances": instances}
+        return {"status": "success", "instances": instances}
 
     async def resolver_suicide(self, **_):
         status = {}
@@ -1212,7 +1416,8 @@ class LRAgentClient:
             if name == "lr-agent":
                 try:
                     await self.send({"action": "suicide", "status": status,
-                                     "message": "All those moments will be lost in time, like tears in rain. Time to die."})
+                                     "message": "All those moments will be lost in time, like tears in rain. Time to die."},
+                                    wait=True)
                 except Exception as e:
                     self.logger.info("Failed to acknowledge suicide, {}.".format(e))
             await self.dockerConnector.remove_container(name)
@@ -1244,8 +1449,10 @@ class LRAgentClient:
         customer_id, resolver_id = self.create_client_ids()
         logs_zip = "/opt/agent/{}-{}-{}-wblogs.zip".format(customer_id, datetime.now().strftime("%Y-%m-%d_%H:%M:%S"),
                                                            resolver_id)
-        self.pack_logs(logs_zip, folder)
-        status = self.upload_logs(logs_zip, url)
+        # zipping and uploading take minutes on big logs, the loop keeps serving pings and other requests
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.pack_logs, logs_zip, folder)
+        status = await loop.run_in_executor(None, self.upload_logs, logs_zip, url)
         try:
             rmtree(folder)
             os.remove(logs_zip)
@@ -1255,8 +1462,9 @@ class LRAgentClient:
 
     def upload_logs(self, logs_zip: str, target_url: str) -> dict:
         try:
-            files = {'upload_file': open(logs_zip, 'rb')}
-            req = requests.post("https://transfer.whalebone.io", files=files)
+            with open(logs_zip, 'rb') as file:
+                req = requests.post("https://transfer.whalebone.io", files={'upload_file': file},
+                                    timeout=int(os.environ.get("DATACOLLECT_UPLOAD_TIMEOUT", 300)))
         except Exception as e:
             self.logger.info("Failed to send files to transfer.whalebone.io, {}".format(e))
             return {"status": "failure", "message": "Data upload failed", "body": str(e)}
@@ -1273,15 +1481,15 @@ class LRAgentClient:
             else:
                 self.logger.warning("Failed to upload file to transfer {}, {}.".format(req.status_code, req.content))
 
-    def load_container_info(self, folder: str):
+    async def load_container_info(self, folder: str):
         with open("{}etc/agent/docker-compose.yml".format(self.folder), "r") as compose:
             parsed_compose = self.compose_parser.create_service(compose)
             for service in parsed_compose["services"]:
                 try:
                     with open("{}/docker.{}.logs".format(folder, service), "w") as file:
-                        file.write(self.dockerConnector.container_logs(service, tail=1000))
+                        file.write(await self.dockerConnector.container_logs(service, tail=1000))
                     with open("{}/docker.{}.inspect".format(folder, service), "w") as file:
-                        json.dump(self.dockerConnector.inspect_config(service), file)
+                        json.dump(await self.dockerConnector.inspect_config(service), file)
                 except Exception as e:
                     self.logger.info("Service {} not found, {}".format(service, e))
 
@@ -1314,7 +1522,10 @@ class LRAgentClient:
                    "docker_stats": {"action": "docker", "command": await self.docker_stats(),
                                     "path": "{}/docker_stats".format(folder)}
                    }
-        self.load_container_info(folder)
+        await self.load_container_info(folder)
+        await asyncio.get_running_loop().run_in_executor(None, self.copy_static_files, actions)
+
+    def copy_static_files(self, actions: dict):
         for action, specification in actions.items():
             try:
                 if specification["action"] == "copy_file":
@@ -1405,8 +1616,10 @@ class LRAgentClient:
     async def docker_ps(self) -> str:
         result = []
         try:
-            for container in [container for container in self.dockerConnector.get_containers(stopped=True)]:
-                result.append("{} {} {}\n".format(container.image.tags[0], container.status, container.name))
+            for container in [container for container in await self.dockerConnector.get_containers(stopped=True)]:
+                tags = await self.dockerConnector.image_tags(container.image_id)
+                result.append("{} {} {}\n".format(tags[0] if tags else container.image, container.status,
+                                                  container.name))
         except Exception as e:
             self.logger.info("Failed to acquire docker ps info, {}".format(e))
         return "".join(result)
@@ -1467,27 +1680,28 @@ class LRAgentClient:
 
     async def get_container_statistics(self, container) -> str:
         try:
-            stats = (await container.stats(stream=False))[0]
-            name = (await container.show())["Name"][1:]
+            name = container["Names"][0][1:]
+            # managed containers are streamed continuously, one-shot stats block for a couple of seconds
+            stats = self.container_stats.latest(name)
+            if stats is None:
+                stats = (await self.dockerConnector.call("stats", container.stats(stream=False)))[0]
             return "{}:\t{}\t{}\t{}\t{}\n".format(name, self.calculate_cpu_percent(stats),
                                                          self.calculate_memory(stats),
                                                          self.calculate_network_bytes(stats),
                                                          self.calculate_blkio_bytes(stats))
         except Exception as e:
-            self.logger.warning("Failed to get data for {}, {}".format(container.name, e))
+            self.logger.warning("Failed to get data for {}, {}".format(container.id, e))
 
     async def docker_stats(self) -> str:
         results = []
-        async_docker = Docker()
         try:
-            tasks = [self.get_container_statistics(container) for container in await async_docker.containers.list()]
+            containers = await self.dockerConnector.call("containers", self.dockerConnector.get_client().containers.list())
+            tasks = [self.get_container_statistics(container) for container in containers]
             for stats in await asyncio.gather(*tasks, return_exceptions=True):
                 if isinstance(stats, str) and stats:
                     results.append(stats)
         except Exception as e:
             self.logger.warning("Failed to acquire docker stats info, {}".format(e))
-        finally:
-            await async_docker.close()
         return "".join(results)
 
     # def docker_stats(self) -> str:
@@ -1501,7 +1715,7 @@ class LRAgentClient:
     #                                                              self.calculate_network_bytes(stats),
     #                                                              self.calculate_blkio_bytes(stats)))
     #             except Exception as e:
-    #                 self.logger.warning("Failed to get data for {}, {}".format(container.name, e))
+    #                 self.logger.warning("Failed to get data for {}, {}".format(container.id, e))
     #     except Exception as e:
     #         self.logger.warning("Failed to acquire docker stats info, {}".format(e))
     #     return "".join(result)
@@ -1561,7 +1775,7 @@ class LRAgentClient:
                 elif file_type == "json":
                     json.dump(content, file)
                 elif file_type == "sysinfo":
-                    file.write("{}\n".format(json.dumps(content)))
+                    file.write("{}\n".format(content.text if isinstance(content, JsonData) else json.dumps(content)))
                 elif file_type == "config":
                     for rule in content:
                         file.write(rule + "\n")
@@ -1585,27 +1799,10 @@ class LRAgentClient:
             raise IOError(e)
 
     def decode_request(self, message: dict) -> dict:
-        if "data" in message:
-            if not isinstance(message["data"], dict):
-                '''
-                 If data field is dict, it arrived from local services and is not encoded in base64
-                 Was therefore correctly decoded in process().
-                '''
-                if not message["data"]:
-                    message["data"] = {}
-                else:
-                    decoded_string = self.decode_base64_string(message["data"])
-                    try:
-                        message["data"] = json.loads(decoded_string)
-                    except json.JSONDecodeError as je:
-                        self.logger.warning("Failed to json parse data {} due to {}.".format(decoded_string, je))
-                        # message["data"] = decoded_string
-        return message
+        return decode_data(message)
 
     def encode_request(self, message: dict) -> dict:
-        if "data" in message:
-            message["data"] = self.encode_base64_string(json.dumps(message["data"]))
-        return message
+        return encode_data(message)
 
     def decode_base64_string(self, b64_string: str) -> str:
         return base64.b64decode(b64_string.encode("utf-8")).decode("utf-8")
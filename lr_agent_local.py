@@ -53,7 +53,7 @@ class LRAgentLocalClient:
                     request = json.loads(msg)
                     self.logger.info("Received: {}".format(request))
                     request["cli"] = "true"
-                    response = await self.agent.process(json.dumps(request))
+                    response = await self.agent.process_request(self.agent.decode_request(request))
                 except json.JSONDecodeError:
                     response = {"error": "failed to json parse request"}
                 except Exception as e:
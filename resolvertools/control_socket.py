@@ -0,0 +1,109 @@
+import asyncio
+import os
+
+PROMPT = b"\n> "
+READ_LIMIT = 2 ** 24
+
+
+class ControlConnection:
+    def __init__(self, path: str):
+        self.path = path
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()
+        self.commands = 0
+        self.connects = 0
+        self.failures = 0
+
+    def is_connected(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_unix_connection(self.path, limit=READ_LIMIT)
+        self.connects += 1
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader, self.writer = None, None
+
+    async def execute(self, command: str, timeout: float) -> str:
+        # deadline covers waiting for the lock as well, hung command does not stall the queued ones forever
+        return await asyncio.wait_for(self.serialized(command), timeout)
+
+    async def serialized(self, command: str) -> str:
+        async with self.lock:
+            try:
+                return await self.exchange(command)
+            except (Exception, asyncio.CancelledError):
+                # state of the REPL is unknown after failure, late reply must not be read as answer of next command
+                self.failures += 1
+                self.close()
+                raise
+
+    async def exchange(self, command: str) -> str:
+        if self.is_connected():
+            try:
+                return await self.command(command)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # kresd instance was recycled, the idle connection is dead
+                self.close()
+        await self.open()
+        return await self.command(command)
+
+    async def command(self, command: str) -> str:
+        self.writer.write("{}\n".format(command.rstrip("\n")).encode("utf-8"))
+        await self.writer.drain()
+        reply = await self.reader.readuntil(PROMPT)
+        self.commands += 1
+        # kresd may greet a new connection with a prompt before the first reply
+        reply = reply[:-len(PROMPT)]
+        if reply.startswith(b"> "):
+            reply = reply[2:]
+        return reply.decode("utf-8")
+
+    def stats(self) -> dict:
+        return {"connected": self.is_connected(), "commands": self.commands, "connects": self.connects,
+                "failures": self.failures}
+
+
+class ControlSocketPool:
+    def __init__(self, directory: str = "/etc/whalebone/tty/"):
+        self.directory = directory
+        self.timeout = float(os.environ.get("CONTROL_SOCKET_TIMEOUT", 5))
+        self.connections = {}
+
+    def path(self, instance: str) -> str:
+        return os.path.join(self.directory, instance)
+
+    def instances(self) -> list:
+        instances = sorted(os.listdir(self.directory))
+        for instance in set(self.connections) - set(instances):
+            self.remove(instance)
+        return instances
+
+    def connection(self, instance: str) -> ControlConnection:
+        if instance not in self.connections:
+            self.connections[instance] = ControlConnection(self.path(instance))
+        return self.connections[instance]
+
+    async def execute(self, instance: str, command: str, timeout: float = None) -> str:
+        return await self.connection(instance).execute(command, timeout if timeout else self.timeout)
+
+    async def broadcast(self, command: str, timeout: float = None) -> dict:
+        instances = self.instances()
+        replies = await asyncio.gather(*[self.execute(instance, command, timeout) for instance in instances],
+                                       return_exceptions=True)
+        return dict(zip(instances, replies))
+
+    def remove(self, instance: str):
+        connection = self.connections.pop(instance, None)
+        if connection is not None:
+            connection.close()
+
+    def close(self):
+        for instance in list(self.connections):
+            self.remove(instance)
+
+    def stats(self) -> dict:
+        return {instance: connection.stats() for instance, connection in self.connections.items()}
@@ -0,0 +1,134 @@
+import asyncio
+import os
+import random
+import struct
+
+RCODE_NOERROR = 0
+TYPE_A = 1
+CLASS_IN = 1
+
+
+def build_query(query_id: int, domain: str, query_type: int = TYPE_A) -> bytes:
+    header = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+    question = b"".join(struct.pack("!B", len(label)) + label.encode("ascii") for label in domain.strip(".").split("."))
+    return header + question + b"\x00" + struct.pack("!HH", query_type, CLASS_IN)
+
+
+def parse_response(data: bytes) -> tuple:
+    if len(data) < 12:
+        raise ValueError("DNS response too short, {} bytes".format(len(data)))
+    query_id, flags, _, answers, _, _ = struct.unpack("!HHHHHH", data[:12])
+    return query_id, flags & 0x000F, answers
+
+
+class DatagramProbe(asyncio.DatagramProtocol):
+    def __init__(self, query_id: int, answer: asyncio.Future):
+        self.query_id = query_id
+        self.answer = answer
+
+    def datagram_received(self, data: bytes, addr):
+        # datagrams with foreign id are ignored, the answer may still arrive
+        if not self.answer.done() and data[:2] == struct.pack("!H", self.query_id):
+            self.answer.set_result(data)
+
+    def error_received(self, exc: Exception):
+        if not self.answer.done():
+            self.answer.set_exception(exc)
+
+
+class DnsProbe:
+    def __init__(self, addresses: list = None, port: int = 53):
+        if addresses is None:
+            addresses = os.environ.get("DNS_PROBE_ADDRESSES", os.environ.get("LOCAL_RESOLVER_ADDRESS", "127.0.0.1"))
+            addresses = [address.strip() for address in addresses.split(",") if address.strip()]
+        self.addresses = addresses
+        self.port = port
+        self.domains = [domain.strip() for domain in os.environ.get(
+            "DNS_PROBE_DOMAINS", "google.com,microsoft.com,apple.com,facebook.com").split(",") if domain.strip()]
+        self.transports = ("udp", "tcp")
+        self.timeout = float(os.environ.get("DNS_TIMEOUT", 3))
+        self.ttl = float(os.environ.get("DNS_PROBE_TTL", 30))
+        self.result = None
+        self.checked_at = None
+        self.running = None
+
+    async def check(self, max_age: float = None) -> dict:
+        max_age = self.ttl if max_age is None else max_age
+        now = asyncio.get_running_loop().time()
+        if self.result is not None and now - self.checked_at <= max_age:
+            return self.result
+        # concurrent callers share a single round of probes
+        if self.running is None or self.running.done():
+            self.running = asyncio.ensure_future(self.run())
+        return await asyncio.shield(self.running)
+
+    async def run(self) -> dict:
+        probes = [(address, domain, transport) for address in self.addresses for domain in self.domains
+                  for transport in self.transports]
+        results = await asyncio.gather(*[self.probe(*probe) for probe in probes])
+        self.result = self.summarize(results)
+        self.checked_at = asyncio.get_running_loop().time()
+        return self.result
+
+    async def probe(self, address: str, domain: str, transport: str) -> dict:
+        query_id = random.randint(0, 0xFFFF)
+        query = build_query(query_id, domain)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = {"address": address, "domain": domain, "transport": transport}
+        try:
+            exchange = self.exchange_udp if transport == "udp" else self.exchange_tcp
+            response = await asyncio.wait_for(exchange(address, query, query_id), self.timeout)
+            response_id, rcode, _ = parse_response(response)
+        except asyncio.TimeoutError:
+            result.update({"status": "fail", "error": "timeout"})
+        except Exception as e:
+            result.update({"status": "fail", "error": str(e)})
+        else:
+            result["rtt"] = round((loop.time() - start) * 1000, 2)
+            if response_id != query_id:
+                result.update({"status": "fail", "error": "id mismatch"})
+            elif rcode != RCODE_NOERROR:
+                result.update({"status": "fail", "error": "rcode {}".format(rcode)})
+            else:
+                result["status"] = "ok"
+        return result
+
+    async def exchange_udp(self, address: str, query: bytes, query_id: int) -> bytes:
+        loop = asyncio.get_running_loop()
+        answer = loop.create_future()
+        transport, _ = await loop.create_datagram_endpoint(lambda: DatagramProbe(query_id, answer),
+                                                           remote_addr=(address, self.port))
+        try:
+            transport.sendto(query)
+            return await answer
+        finally:
+            transport.close()
+
+    async def exchange_tcp(self, address: str, query: bytes, _: int) -> bytes:
+        reader, writer = await asyncio.open_connection(address, self.port)
+        try:
+            writer.write(struct.pack("!H", len(query)) + query)
+            await writer.drain()
+            length = struct.unpack("!H", await reader.readexactly(2))[0]
+            return await reader.readexactly(length)
+        finally:
+            writer.close()
+
+    def summarize(self, results: list) -> dict:
+        summary = self.aggregate(results)
+        summary["addresses"] = {}
+        for address in self.addresses:
+            summary["addresses"][address] = {
+                transport: self.aggregate([result for result in results
+                                           if result["address"] == address and result["transport"] == transport])
+                for transport in self.transports}
+        summary["failures"] = [result for result in results if result["status"] != "ok"]
+        return summary
+
+    def aggregate(self, results: list) -> dict:
+        rtts = sorted(result["rtt"] for result in results if result["status"] == "ok")
+        return {"status": "ok" if rtts else "fail",
+                "success_ratio": round(len(rtts) / len(results), 3) if results else 0.0,
+                "rtt_avg": round(sum(rtts) / len(rtts), 2) if rtts else None,
+                "rtt_max": rtts[-1] if rtts else None}
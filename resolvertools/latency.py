@@ -0,0 +1,78 @@
+import os
+from array import array
+
+# kresd answer time buckets with their upper bounds in ms, slow answers are reported at the lower bound of 1500 ms
+BUCKETS = (("answer.1ms", 1), ("answer.10ms", 10), ("answer.50ms", 50), ("answer.100ms", 100),
+           ("answer.250ms", 250), ("answer.500ms", 500), ("answer.1000ms", 1000), ("answer.1500ms", 1500),
+           ("answer.slow", 1500))
+PERCENTILES = (50, 95, 99)
+
+
+def bucket_vector(stats: dict) -> array:
+    return array("Q", (max(stats.get(name, 0), 0) for name, _ in BUCKETS))
+
+
+def percentile(vector, rank: float):
+    total = sum(vector)
+    if not total:
+        return None
+    target, cumulative, lower = total * rank / 100, 0, 0
+    for count, (_, upper) in zip(vector, BUCKETS):
+        if count and cumulative + count >= target:
+            return round(lower + (upper - lower) * (target - cumulative) / count, 1)
+        cumulative += count
+        lower = upper
+    return float(BUCKETS[-1][1])
+
+
+def percentiles(vector) -> dict:
+    return {"p{}".format(rank): percentile(vector, rank) for rank in PERCENTILES}
+
+
+class LatencyWindow:
+    # ring of the last bucket vectors stored in a single flat array
+    def __init__(self, size: int):
+        self.size = size
+        self.vectors = array("Q", bytes(8 * size * len(BUCKETS)))
+        self.position = 0
+        self.filled = 0
+
+    def add(self, vector: array):
+        start = self.position * len(BUCKETS)
+        self.vectors[start:start + len(BUCKETS)] = vector
+        self.position = (self.position + 1) % self.size
+        self.filled = min(self.filled + 1, self.size)
+
+    def total(self) -> array:
+        total = array("Q", bytes(8 * len(BUCKETS)))
+        for index in range(len(self.vectors)):
+            total[index % len(BUCKETS)] += self.vectors[index]
+        return total
+
+
+class LatencyTracker:
+    def __init__(self):
+        self.window_size = int(os.environ.get("LATENCY_WINDOW", 10))
+        self.windows = {}
+
+    def window(self, name: str) -> LatencyWindow:
+        if name not in self.windows:
+            self.windows[name] = LatencyWindow(self.window_size)
+        return self.windows[name]
+
+    def update(self, deltas: dict) -> dict:
+        for name in set(self.windows) - set(deltas) - {"host"}:
+            del self.windows[name]
+        host = array("Q", bytes(8 * len(BUCKETS)))
+        instances = {}
+        for name, stats in deltas.items():
+            vector = bucket_vector(stats)
+            self.window(name).add(vector)
+            instances[name] = percentiles(vector)
+            instances[name]["window"] = percentiles(self.window(name).total())
+            for index, count in enumerate(vector):
+                host[index] += count
+        self.window("host").add(host)
+        result = percentiles(host)
+        result.update({"window": percentiles(self.window("host").total()), "instances": instances})
+        return result
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import random
+
+from resolvertools.control_socket import ControlSocketPool
+from resolvertools.dns_probe import RCODE_NOERROR, DnsProbe, build_query, parse_response
+
+STEPS = ("control_socket", "port", "dns")
+# shared resolver address is answered by the old instance as well, dns is probed only after it was stopped
+INSTANCE_STEPS = ("control_socket", "port")
+
+
+class ResolverReadiness:
+    # probes a freshly started resolver in short steps, a step which passed once is not repeated
+    def __init__(self, control_sockets: ControlSocketPool, dns_probe: DnsProbe, check_port):
+        self.control_sockets = control_sockets
+        self.dns_probe = dns_probe
+        self.check_port = check_port
+        self.interval = float(os.environ.get("RESOLVER_READY_INTERVAL", 0.05))
+        self.timeout = float(os.environ.get("RESOLVER_READY_TIMEOUT", 10))
+        self.query_timeout = float(os.environ.get("RESOLVER_READY_QUERY_TIMEOUT", 1))
+
+    def sockets(self) -> dict:
+        # kresd in a new container may get the pid and so the socket name of an old one, inode and ctime tell them apart
+        sockets = {}
+        try:
+            instances = self.control_sockets.instances()
+        except OSError:
+            return sockets
+        for instance in instances:
+            try:
+                stat = os.stat(self.control_sockets.path(instance))
+                sockets[instance] = (stat.st_ino, stat.st_ctime_ns)
+            except OSError:
+                pass
+        return sockets
+
+    async def wait(self, before: dict, steps: tuple = STEPS) -> dict:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        checks = {"control_socket": self.control_socket_ready, "port": self.port_ready, "dns": self.dns_ready}
+        passed, attempts = {}, 0
+        while True:
+            attempts += 1
+            for step in steps:
+                if step in passed:
+                    continue
+                remaining = self.timeout - (loop.time() - start)
+                try:
+                    ready = await asyncio.wait_for(checks[step](before), max(remaining, self.interval))
+                except Exception:
+                    ready = False
+                if not ready:
+                    break
+                passed[step] = round(loop.time() - start, 3)
+            elapsed = loop.time() - start
+            if len(passed) == len(steps) or elapsed >= self.timeout:
+                return {"ready": len(passed) == len(steps), "seconds": round(elapsed, 3), "attempts": attempts,
+                        "steps": passed}
+            await asyncio.sleep(self.interval)
+
+    async def control_socket_ready(self, before: dict) -> bool:
+        if not os.path.isdir(self.control_sockets.directory):
+            # resolver without control sockets, the remaining steps decide
+            return True
+        fresh = [instance for instance, identity in self.sockets().items() if before.get(instance) != identity]
+        for instance in fresh:
+            # pooled connection of a reused name still leads to the old process
+            if before.get(instance) is not None:
+                self.control_sockets.remove(instance)
+        replies = await asyncio.gather(*[self.control_sockets.execute(instance, "worker.id", self.query_timeout)
+                                         for instance in fresh], return_exceptions=True)
+        return any(not isinstance(reply, Exception) for reply in replies)
+
+    async def port_ready(self, _: dict) -> bool:
+        return await self.check_port() == "ok"
+
+    async def dns_ready(self, _: dict) -> bool:
+        query_id = random.randint(0, 0xFFFF)
+        query = build_query(query_id, self.dns_probe.domains[0])
+        response = await asyncio.wait_for(self.dns_probe.exchange_udp(self.dns_probe.addresses[0], query, query_id),
+                                          self.query_timeout)
+        response_id, rcode, _ = parse_response(response)
+        return response_id == query_id and rcode == RCODE_NOERROR
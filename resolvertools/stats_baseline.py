@@ -0,0 +1,74 @@
+import json
+import os
+import time
+
+COUNTER_PREFIXES = ("answer", "query", "request")
+
+
+class StatsBaseline:
+    def __init__(self, path: str = "/etc/whalebone/logs/kres_stats.json"):
+        self.path = path
+        self.checkpoint_interval = int(os.environ.get("STATS_CHECKPOINT_INTERVAL", 300))
+        self.baselines = {}
+        self.initialized = False
+        self.last_checkpoint = None
+        self.resets = 0
+        self.checkpoints = 0
+
+    def load(self):
+        try:
+            with open(self.path, "r") as file:
+                checkpoint = json.load(file)
+        except (OSError, ValueError):
+            return
+        # checkpoint of older agent versions holds only host totals, those cannot be matched to instances
+        if isinstance(checkpoint.get("instances"), dict):
+            self.baselines = checkpoint["instances"]
+
+    def update(self, results: dict, instances: list) -> dict:
+        if not self.initialized:
+            self.load()
+        for instance in set(self.baselines) - set(instances):
+            del self.baselines[instance]
+        deltas = {}
+        for instance, counters in results.items():
+            previous = self.baselines.get(instance)
+            self.baselines[instance] = counters
+            if previous is None:
+                if not self.initialized:
+                    continue
+                # instance started since the last cycle, all of its counters are new
+                previous = {}
+            deltas[instance] = self.diff(previous, counters)
+        self.initialized = True
+        return deltas
+
+    def diff(self, previous: dict, counters: dict) -> dict:
+        # counters never decrease while kresd runs, any drop means the instance was restarted and counts from zero
+        restarted = any(value < previous[stat] for stat, value in counters.items()
+                        if stat in previous and stat.startswith(COUNTER_PREFIXES))
+        if restarted:
+            self.resets += 1
+        delta = {}
+        for stat, value in counters.items():
+            if not stat.startswith(COUNTER_PREFIXES):
+                delta[stat] = value
+            elif restarted or stat not in previous:
+                delta[stat] = value
+            else:
+                delta[stat] = value - previous[stat]
+        return delta
+
+    def checkpoint(self, force: bool = False):
+        now = time.monotonic()
+        if not force and self.last_checkpoint is not None and now - self.last_checkpoint < self.checkpoint_interval:
+            return
+        temporary = "{}.tmp".format(self.path)
+        with open(temporary, "w") as file:
+            json.dump({"instances": self.baselines, "timestamp": time.time()}, file)
+        os.replace(temporary, self.path)
+        self.last_checkpoint = now
+        self.checkpoints += 1
+
+    def stats(self) -> dict:
+        return {"instances": len(self.baselines), "resets": self.resets, "checkpoints": self.checkpoints}
@@ -0,0 +1,82 @@
+LITERALS = {"true": True, "false": False, "nil": None}
+PROMPT = "> "
+
+
+class StatRecord:
+    __slots__ = ("name", "value")
+
+    def __init__(self, name: str, value):
+        self.name = name
+        self.value = value
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, StatRecord) and (self.name, self.value) == (other.name, other.value)
+
+    def __repr__(self) -> str:
+        return "StatRecord({!r}, {!r})".format(self.name, self.value)
+
+    def is_number(self) -> bool:
+        return type(self.value) in (int, float)
+
+
+def parse_key(key: str) -> str:
+    if key[:1] == "[" and key[-1:] == "]":
+        key = key[1:-1]
+    if len(key) > 1 and key[0] == key[-1] and key[0] in "'\"":
+        key = key[1:-1]
+    return key
+
+
+def parse_value(value: str):
+    if value[-1:] == ",":
+        value = value[:-1].rstrip()
+    if value in LITERALS:
+        return LITERALS[value]
+    if len(value) > 1 and value[0] == value[-1] and value[0] in "'\"":
+        return value[1:-1]
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def parse_lines(lines):
+    # single pass over REPL output of stats.list(), cache.stats() or worker.stats(), both the old
+    # "[name] => value" and the table "['name'] = value," notation, nested tables are flattened by dots
+    path = []
+    for line in lines:
+        line = line.strip()
+        if line[:2] == PROMPT:
+            line = line[2:].lstrip()
+        if not line:
+            continue
+        if line[0] == "}":
+            if path:
+                path.pop()
+            continue
+        end = line.find("] ")
+        if end < 0:
+            continue
+        if line.startswith("=> ", end + 2):
+            value = line[end + 5:]
+        elif line.startswith("= ", end + 2):
+            value = line[end + 4:]
+        else:
+            continue
+        name = parse_key(line[:end + 1])
+        if value == "{":
+            path.append(name)
+            continue
+        yield StatRecord(".".join(path + [name]) if path else name, parse_value(value))
+
+
+def parse_output(output: str) -> list:
+    return list(parse_lines(output.splitlines()))
+
+
+def numeric_stats(output: str) -> dict:
+    return {record.name: record.value for record in parse_lines(output.splitlines()) if record.is_number()}
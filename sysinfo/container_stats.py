@@ -0,0 +1,153 @@
+import asyncio
+import math
+import os
+import time
+
+from aiodocker import Docker
+
+from dockertools.docker_cache import DockerCache
+from sysinfo.host_sampler import Ring, counter_rates, summarize
+
+RATES = ("network.rx_bytes", "network.tx_bytes", "blkio.read_bytes", "blkio.write_bytes")
+SERIES = ("cpu", "memory") + RATES
+
+
+def cpu_percent(stats: dict) -> float:
+    try:
+        cpu, previous = stats["cpu_stats"], stats["precpu_stats"]
+        cpu_delta = cpu["cpu_usage"]["total_usage"] - previous["cpu_usage"]["total_usage"]
+        system_delta = cpu["system_cpu_usage"] - previous["system_cpu_usage"]
+        cpu_count = cpu.get("online_cpus") or len(cpu["cpu_usage"].get("percpu_usage") or [1])
+    except KeyError:
+        # first streamed sample has no previous cpu reading
+        return math.nan
+    return 100.0 * cpu_delta / system_delta * cpu_count if system_delta > 0 and cpu_delta >= 0 else math.nan
+
+
+def memory_usage(stats: dict) -> float:
+    memory = stats.get("memory_stats", {})
+    if "usage" not in memory:
+        return math.nan
+    # page cache is not counted, cgroup v1 reports it as cache and v2 as inactive_file
+    details = memory.get("stats", {})
+    return memory["usage"] - details.get("cache", details.get("inactive_file", 0))
+
+
+def network_bytes(stats: dict) -> tuple:
+    networks = stats.get("networks")
+    if not networks:
+        # containers on host network have no own interfaces
+        return math.nan, math.nan
+    return sum(network["rx_bytes"] for network in networks.values()), \
+        sum(network["tx_bytes"] for network in networks.values())
+
+
+def blkio_bytes(stats: dict) -> tuple:
+    read, write = 0, 0
+    for entry in stats.get("blkio_stats", {}).get("io_service_bytes_recursive") or []:
+        if entry["op"].lower() == "read":
+            read += entry["value"]
+        elif entry["op"].lower() == "write":
+            write += entry["value"]
+    return read, write
+
+
+class ContainerWindow:
+    # rolling window of the latest stats samples streamed for a single container
+    def __init__(self, container_id: str, size: int):
+        self.container_id = container_id
+        self.timestamps = Ring(size)
+        self.series = {name: Ring(size) for name in SERIES}
+        self.memory_limit = 0
+        self.latest = None
+
+    def add(self, timestamp: float, stats: dict):
+        rx_bytes, tx_bytes = network_bytes(stats)
+        read_bytes, write_bytes = blkio_bytes(stats)
+        sample = {"cpu": cpu_percent(stats), "memory": memory_usage(stats), "network.rx_bytes": rx_bytes,
+                  "network.tx_bytes": tx_bytes, "blkio.read_bytes": read_bytes, "blkio.write_bytes": write_bytes}
+        self.timestamps.add(timestamp)
+        for name, ring in self.series.items():
+            ring.add(sample[name])
+        self.memory_limit = stats.get("memory_stats", {}).get("limit", self.memory_limit)
+        self.latest = stats
+
+    def report(self) -> dict:
+        timestamps = self.timestamps.ordered()
+        values = {name: ring.ordered() for name, ring in self.series.items()}
+        pairs = [(index - 1, index) for index in range(1, len(timestamps))]
+        result = {"samples": len(timestamps),
+                  "cpu": summarize([value for value in values["cpu"] if not math.isnan(value)]),
+                  "memory": summarize([value for value in values["memory"] if not math.isnan(value)])}
+        result["memory"]["limit"] = self.memory_limit
+        for name in RATES:
+            group, counter = name.split(".")
+            result.setdefault(group, {})[counter] = counter_rates(timestamps, values[name], pairs)
+        return result
+
+
+class ContainerStats:
+    # streaming stats subscriptions of the managed containers, the docker daemon pushes a sample every second
+    def __init__(self, logger, docker_cache: DockerCache = None):
+        self.logger = logger
+        self.docker_cache = docker_cache
+        self.services = [service.strip() for service in os.environ.get(
+            "CONTAINER_STATS_SERVICES", "resolver,kresman,lr-agent,logstream").split(",") if service.strip()]
+        self.size = int(os.environ.get("CONTAINER_STATS_WINDOW", 60))
+        self.refresh = float(os.environ.get("CONTAINER_STATS_REFRESH", 10))
+        self.windows = {}
+        self.streams = {}
+
+    async def run(self):
+        client = Docker()
+        try:
+            while True:
+                await self.reconcile(client)
+                await asyncio.sleep(self.refresh)
+        finally:
+            for task in self.streams.values():
+                task.cancel()
+            await asyncio.gather(*self.streams.values(), return_exceptions=True)
+            self.streams.clear()
+            await client.close()
+
+    async def managed_containers(self, client: Docker) -> dict:
+        if self.docker_cache is not None and self.docker_cache.ready:
+            return {record.name: record.id for record in self.docker_cache.get_containers()
+                    if record.name in self.services}
+        containers = {container["Names"][0].lstrip("/"): container["Id"] for container in await client.containers.list()}
+        return {name: container_id for name, container_id in containers.items() if name in self.services}
+
+    async def reconcile(self, client: Docker):
+        # streams end with their container, upgraded services get a new container id
+        running = await self.managed_containers(client)
+        for name, task in list(self.streams.items()):
+            if task.done() or running.get(name) != self.windows[name].container_id:
+                task.cancel()
+                del self.streams[name]
+        for name in set(self.windows) - set(running):
+            del self.windows[name]
+        for name, container_id in running.items():
+            if name not in self.streams:
+                if name not in self.windows or self.windows[name].container_id != container_id:
+                    self.windows[name] = ContainerWindow(container_id, self.size)
+                self.streams[name] = asyncio.ensure_future(self.follow(client, name, self.windows[name]))
+
+    async def follow(self, client: Docker, name: str, window: ContainerWindow):
+        try:
+            async for stats in client.containers.container(window.container_id).stats(stream=True):
+                window.add(time.monotonic(), stats)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.info("Stats stream of {} closed, {}.".format(name, e))
+
+    def latest(self, name: str) -> dict:
+        window = self.windows.get(name)
+        return window.latest if window is not None else None
+
+    def report(self) -> dict:
+        return {name: window.report() for name, window in self.windows.items() if window.latest is not None}
+
+    def stats(self) -> dict:
+        return {"streams": sorted(name for name, task in self.streams.items() if not task.done())}
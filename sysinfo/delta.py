@@ -0,0 +1,111 @@
+import os
+
+
+def diff(old: dict, new: dict, path: tuple = ()) -> tuple:
+    changed, removed = {}, []
+    for key, value in new.items():
+        if key not in old:
+            changed[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested_changed, nested_removed = diff(old[key], value, path + (key,))
+            if nested_changed:
+                changed[key] = nested_changed
+            removed.extend(nested_removed)
+        elif value != old[key]:
+            changed[key] = value
+    for key in old:
+        if key not in new:
+            removed.append(list(path + (key,)))
+    return changed, removed
+
+
+def patch(base: dict, changed: dict, removed: list) -> dict:
+    # reference of the proxy side, applies delta to a copy of the acknowledged snapshot
+    result = merge(base, changed)
+    for path in removed:
+        parent = result
+        for key in path[:-1]:
+            parent = parent.get(key, {})
+        parent.pop(path[-1], None)
+    return result
+
+
+def merge(base: dict, changed: dict) -> dict:
+    result = dict(base)
+    for key, value in changed.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = merge(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+
+class SysInfoDelta:
+    def __init__(self):
+        self.enabled = "SYSINFO_DELTA" in os.environ
+        self.keyframe_interval = int(os.environ.get("SYSINFO_KEYFRAME_INTERVAL", 10))
+        self.sequence = 0
+        self.acknowledged = None
+        self.acknowledged_sequence = None
+        self.since_keyframe = 0
+        # proxy confirming snapshots by action sysinfo_ack, until the first confirmation a local send counts
+        self.confirmed_by_proxy = False
+        self.unconfirmed = {}
+        self.resync_floor = 0
+        self.keyframes = 0
+        self.deltas = 0
+        self.resyncs = 0
+
+    def encode(self, data: dict) -> dict:
+        if not self.enabled:
+            return {"action": "sysinfo", "data": data}
+        self.sequence += 1
+        message = {"action": "sysinfo", "sequence": self.sequence}
+        if self.acknowledged is None or self.since_keyframe >= self.keyframe_interval:
+            message.update({"mode": "keyframe", "data": data})
+            self.since_keyframe = 1
+            self.keyframes += 1
+        else:
+            # delta against the last acknowledged snapshot, lost deltas do not break the chain
+            changed, removed = diff(self.acknowledged, data)
+            message.update({"mode": "delta", "base": self.acknowledged_sequence,
+                            "data": {"changed": changed, "removed": removed}})
+            self.since_keyframe += 1
+            self.deltas += 1
+        return message
+
+    def sent(self, sequence: int, data: dict):
+        # frame written to the websocket, it is still lost when the connection drops before proxy reads it
+        self.unconfirmed[sequence] = data
+        for old in sorted(self.unconfirmed)[:-self.keyframe_interval]:
+            del self.unconfirmed[old]
+        if not self.confirmed_by_proxy:
+            self.acknowledge(sequence, data)
+
+    def confirm(self, sequence: int):
+        # from the first confirmation on only snapshots confirmed by proxy serve as delta base
+        self.confirmed_by_proxy = True
+        data = self.unconfirmed.get(sequence)
+        self.unconfirmed = {key: value for key, value in self.unconfirmed.items() if key > sequence}
+        if data is not None and sequence > self.resync_floor:
+            self.acknowledged, self.acknowledged_sequence = data, sequence
+
+    def acknowledge(self, sequence: int, data: dict):
+        # messages sent before resync request are not known to proxy anymore
+        if sequence <= self.resync_floor:
+            return
+        if self.acknowledged_sequence is None or sequence > self.acknowledged_sequence:
+            self.acknowledged = data
+            self.acknowledged_sequence = sequence
+
+    def resync(self):
+        self.acknowledged = None
+        self.acknowledged_sequence = None
+        self.resync_floor = self.sequence
+        self.unconfirmed = {}
+        self.resyncs += 1
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "sequence": self.sequence, "acknowledged": self.acknowledged_sequence,
+                "confirmed_by_proxy": self.confirmed_by_proxy,
+                "keyframes": self.keyframes, "deltas": self.deltas, "resyncs": self.resyncs}
@@ -0,0 +1,123 @@
+import asyncio
+import math
+import os
+import time
+from array import array
+
+import psutil
+
+NETWORK_COUNTERS = {"bytes_sent": "bytes_sent", "bytes_recv": "bytes_received", "packets_sent": "packets_sent",
+                    "packets_recv": "packets_received", "errin": "err_receiving", "errout": "err_sending",
+                    "dropin": "dropped_in", "dropout": "dropped_out"}
+DISK_COUNTERS = ("read_count", "write_count", "read_bytes", "write_bytes", "busy_time")
+RATES = tuple("network.{}".format(name) for name in NETWORK_COUNTERS.values()) + \
+    tuple("disk.{}".format(name) for name in DISK_COUNTERS)
+SERIES = ("cpu.busy", "cpu.total", "memory") + RATES
+
+
+class Ring:
+    # fixed number of the latest samples, the oldest one is overwritten when full
+    def __init__(self, size: int):
+        self.size = size
+        self.values = array("d", bytes(8 * size))
+        self.position = 0
+        self.filled = 0
+
+    def add(self, value: float):
+        self.values[self.position] = value
+        self.position = (self.position + 1) % self.size
+        self.filled = min(self.filled + 1, self.size)
+
+    def ordered(self) -> list:
+        if self.filled < self.size:
+            return self.values[:self.filled].tolist()
+        return (self.values[self.position:] + self.values[:self.position]).tolist()
+
+
+def summarize(values: list) -> dict:
+    if not values:
+        return {"min": None, "avg": None, "max": None}
+    return {"min": round(min(values), 1), "avg": round(sum(values) / len(values), 1), "max": round(max(values), 1)}
+
+
+def counter_rates(timestamps: list, counter: list, pairs: list) -> dict:
+    # per-second rates between sample pairs, the average is weighted by the elapsed time
+    deltas = []
+    for previous, current in pairs:
+        delta, elapsed = counter[current] - counter[previous], timestamps[current] - timestamps[previous]
+        # nan comparison is false as well, missing counters are skipped with resets
+        if delta >= 0 and elapsed > 0:
+            deltas.append((delta, elapsed))
+    result = summarize([delta / elapsed for delta, elapsed in deltas])
+    if deltas:
+        result["avg"] = round(sum(delta for delta, _ in deltas) / sum(elapsed for _, elapsed in deltas), 1)
+    return result
+
+
+class HostSampler:
+    def __init__(self, interval: float = None, size: int = None):
+        self.interval = interval if interval else float(os.environ.get("HOST_SAMPLE_INTERVAL", 1))
+        self.size = size if size else int(os.environ.get("HOST_SAMPLE_WINDOW", 600))
+        self.timestamps = Ring(self.size)
+        self.series = {name: Ring(self.size) for name in SERIES}
+        self.reported = None
+        self.errors = 0
+
+    def read(self) -> dict:
+        # cpu usage is derived from cpu times, psutil.cpu_percent() state is shared with other callers
+        times = psutil.cpu_times()
+        total = sum(times)
+        sample = {"cpu.busy": total - times.idle - getattr(times, "iowait", 0), "cpu.total": total,
+                  "memory": psutil.virtual_memory().percent}
+        network = psutil.net_io_counters()
+        for attr, name in NETWORK_COUNTERS.items():
+            sample["network.{}".format(name)] = getattr(network, attr, math.nan) if network else math.nan
+        disk = psutil.disk_io_counters()
+        for name in DISK_COUNTERS:
+            sample["disk.{}".format(name)] = getattr(disk, name, math.nan) if disk else math.nan
+        return sample
+
+    def record(self, timestamp: float, sample: dict):
+        self.timestamps.add(timestamp)
+        for name, ring in self.series.items():
+            ring.add(sample.get(name, math.nan))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            deadline = max(deadline + self.interval, loop.time())
+            await asyncio.sleep(deadline - loop.time())
+            try:
+                sample = await loop.run_in_executor(None, self.read)
+            except Exception:
+                self.errors += 1
+            else:
+                self.record(time.monotonic(), sample)
+
+    def report(self, advance: bool = True) -> dict:
+        # samples taken since the previous report, rates are per second between consecutive samples
+        timestamps = self.timestamps.ordered()
+        selected = [index for index, timestamp in enumerate(timestamps)
+                    if self.reported is None or timestamp > self.reported]
+        if advance and timestamps:
+            self.reported = timestamps[-1]
+        result = {"samples": len(selected), "sample_interval": self.interval, "errors": self.errors}
+        if not selected:
+            return result
+        values = {name: ring.ordered() for name, ring in self.series.items()}
+        pairs = [(index - 1, index) for index in selected if index]
+        result["memory"] = summarize([values["memory"][index] for index in selected])
+        busy, total = values["cpu.busy"], values["cpu.total"]
+        cpu = [(busy[current] - busy[previous], total[current] - total[previous]) for previous, current in pairs]
+        cpu = [(used, elapsed) for used, elapsed in cpu if elapsed > 0 and used >= 0]
+        result["cpu"] = summarize([100 * used / elapsed for used, elapsed in cpu])
+        if cpu:
+            result["cpu"]["avg"] = round(100 * sum(used for used, _ in cpu) / sum(elapsed for _, elapsed in cpu), 1)
+        for name in RATES:
+            group, counter = name.split(".")
+            result.setdefault(group, {})[counter] = counter_rates(timestamps, values[name], pairs)
+        return result
+
+    def stats(self) -> dict:
+        return {"samples": self.timestamps.filled, "errors": self.errors}
@@ -0,0 +1,82 @@
+import asyncio
+import os
+
+import aiohttp
+
+ENDPOINTS = {"kresman": ("/api/general/countentities", "count"), "kresman_internal": ("/api/general/metrics", "value")}
+
+
+class KresmanClient:
+    def __init__(self, logger):
+        self.logger = logger
+        self.address = os.environ.get("KRESMAN_LISTENER", "http://127.0.0.1:8080")
+        self.timeout = int(os.environ.get("HTTP_TIMEOUT", 10))
+        self.ttl = float(os.environ.get("KRESMAN_CACHE_TTL", 30))
+        self.backoff = float(os.environ.get("KRESMAN_BACKOFF", 30))
+        self.max_backoff = float(os.environ.get("KRESMAN_MAX_BACKOFF", 600))
+        self.session = None
+        self.cache = {}
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error = None
+        self.requests = 0
+
+    def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            # kresman listens on localhost, one keep-alive connection per endpoint is enough
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False, limit=len(ENDPOINTS) + 1),
+                                                 timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def request(self, path: str):
+        self.requests += 1
+        async with self.get_session().get("{}{}".format(self.address, path)) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def get_metrics(self) -> dict:
+        now = asyncio.get_running_loop().time()
+        stale = [name for name in ENDPOINTS if name not in self.cache or now - self.cache[name][0] > self.ttl]
+        if stale and now >= self.retry_at:
+            results = await asyncio.gather(*[self.fetch(name) for name in stale], return_exceptions=True)
+            errors = [result for result in results if isinstance(result, Exception)]
+            if errors:
+                self.failed(errors[0])
+            else:
+                self.failures, self.last_error = 0, None
+        metrics = {}
+        for name in ENDPOINTS:
+            if name in self.cache and now - self.cache[name][0] <= self.ttl:
+                metrics[name] = self.cache[name][1]
+            else:
+                metrics[name] = {"error": self.last_error}
+        return metrics
+
+    async def fetch(self, name: str):
+        path, key = ENDPOINTS[name]
+        payload = await self.request(path)
+        self.cache[name] = (asyncio.get_running_loop().time(),
+                            {metric["id"]: metric[key] for metric in payload})
+
+    def failed(self, error: Exception):
+        # kresman down, retry later with growing delay instead of waiting for timeout every cycle
+        self.failures += 1
+        self.last_error = str(error) or error.__class__.__name__
+        delay = min(self.max_backoff, self.backoff * 2 ** (self.failures - 1))
+        self.retry_at = asyncio.get_running_loop().time() + delay
+        self.logger.info("Failed to get data from kresman, {}, next attempt in {:.0f}s".format(self.last_error, delay))
+
+    async def update_now(self) -> bool:
+        self.requests += 1
+        async with self.get_session().get("{}/api/general/updatenow".format(self.address), json={}) as response:
+            return response.status < 400
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "failures": self.failures, "cached": sorted(self.cache),
+                "backoff": max(0.0, round(self.retry_at - asyncio.get_running_loop().time(), 1))
+                if self.failures else 0.0}
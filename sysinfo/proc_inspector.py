@@ -0,0 +1,110 @@
+import os
+import time
+
+# socket states in /proc/net tables, TCP_LISTEN for tcp and TCP_CLOSE for bound udp sockets
+LISTEN_STATES = {"tcp": "0A", "tcp6": "0A", "udp": "07", "udp6": "07"}
+
+
+class ProcInspector:
+    def __init__(self, root: str = "/opt/host/proc"):
+        self.root = root
+        self.ttl = float(os.environ.get("PROC_CACHE_TTL", 2))
+        self.cache = {}
+        self.denied = False
+
+    def available(self) -> bool:
+        # without CAP_SYS_PTRACE, under an AppArmor profile or another uid the fd links cannot be read
+        return not self.denied and os.path.isdir(os.path.join(self.root, "1"))
+
+    def cached(self, key, loader):
+        now = time.monotonic()
+        entry = self.cache.get(key)
+        if entry is not None and now - entry[0] < self.ttl:
+            return entry[1]
+        value = loader()
+        self.cache[key] = (now, value)
+        return value
+
+    def invalidate(self):
+        self.cache.clear()
+
+    def read(self, pid, name: str) -> str:
+        with open(os.path.join(self.root, str(pid), name), "r") as file:
+            return file.read()
+
+    def pid_namespace(self, pid) -> str:
+        return os.readlink(os.path.join(self.root, str(pid), "ns", "pid"))
+
+    def processes(self, name: str) -> list:
+        return self.cached(("processes", name), lambda: self.load_processes(name))
+
+    def load_processes(self, name: str) -> list:
+        processes = []
+        for entry in os.listdir(self.root):
+            if not entry.isdigit():
+                continue
+            try:
+                if self.read(entry, "comm").strip() != name:
+                    continue
+                namespace = self.pid_namespace(entry)
+                status = self.read(entry, "status")
+            except OSError:
+                # process exited while being inspected
+                continue
+            nspid = [line.split()[1:] for line in status.splitlines() if line.startswith("NSpid:")]
+            processes.append({"pid": int(entry), "nspid": int(nspid[0][-1]) if nspid else int(entry),
+                              "namespace": namespace})
+        return processes
+
+    def container_processes(self, init_pid: int, name: str) -> list:
+        namespace = self.pid_namespace(init_pid)
+        return [process for process in self.processes(name) if process["namespace"] == namespace]
+
+    def find_process(self, init_pid: int, name: str, nspid: int) -> dict:
+        # pid as seen inside the container, kresd tty files are named by it
+        for process in self.container_processes(init_pid, name):
+            if process["nspid"] == nspid:
+                return process
+        return {}
+
+    def socket_inodes(self, pid: int) -> set:
+        inodes = set()
+        directory = os.path.join(self.root, str(pid), "fd")
+        for fd in os.listdir(directory):
+            try:
+                target = os.readlink(os.path.join(directory, fd))
+            except OSError:
+                continue
+            if target.startswith("socket:["):
+                inodes.add(target[8:-1])
+        return inodes
+
+    def listening_sockets(self, pid: int, port: int) -> set:
+        inodes = set()
+        local_port = ":{:04X}".format(port)
+        for table, state in LISTEN_STATES.items():
+            try:
+                lines = self.read(pid, os.path.join("net", table)).splitlines()[1:]
+            except OSError:
+                continue
+            for line in lines:
+                fields = line.split()
+                if len(fields) > 9 and fields[1].endswith(local_port) and fields[3] == state:
+                    inodes.add(fields[9])
+        return inodes
+
+    def is_listening(self, init_pid: int, name: str, port: int) -> bool:
+        return self.cached(("listening", init_pid, name, port), lambda: self.load_listening(init_pid, name, port))
+
+    def load_listening(self, init_pid: int, name: str, port: int) -> bool:
+        for process in self.container_processes(init_pid, name):
+            try:
+                if self.socket_inodes(process["pid"]) & self.listening_sockets(process["pid"], port):
+                    return True
+            except FileNotFoundError:
+                # process exited while being inspected
+                continue
+            except OSError:
+                self.denied = True
+                raise
+        return False
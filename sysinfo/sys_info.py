@@ -1,27 +1,48 @@
-import requests
-import json
+import asyncio
 import psutil
-import errno
 import platform
 import socket
-import re
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from dns import resolver
+from resolvertools.control_socket import ControlSocketPool
+from resolvertools.dns_probe import DnsProbe
+from resolvertools.latency import LatencyTracker
+from resolvertools.readiness import ResolverReadiness
+from resolvertools.stats_baseline import StatsBaseline
+from resolvertools.stats_parser import numeric_stats
+from sysinfo.container_stats import ContainerStats
+from sysinfo.host_sampler import HostSampler
+from sysinfo.kresman_client import KresmanClient
+from sysinfo.proc_inspector import ProcInspector
 
+# shared by every SystemInfo, a new one is built per proxy connection
+EXECUTOR = ThreadPoolExecutor(max_workers=int(os.environ.get("SYSINFO_WORKERS", 8)), thread_name_prefix="sysinfo")
 
 class SystemInfo:
 
-    def __init__(self, docker_connector, logger):
+    def __init__(self, docker_connector, logger, control_sockets: ControlSocketPool = None,
+                 stats_baseline: StatsBaseline = None, kresman: KresmanClient = None,
+                 host_sampler: HostSampler = None, container_stats: ContainerStats = None):
         self.docker_connector = docker_connector
         self.logger = logger
+        self.control_sockets = control_sockets if control_sockets else ControlSocketPool()
+        self.stats_baseline = stats_baseline if stats_baseline else StatsBaseline()
+        self.kresman = kresman if kresman else KresmanClient(logger)
+        self.host_sampler = host_sampler if host_sampler else HostSampler()
+        self.container_stats = container_stats if container_stats else ContainerStats(logger)
+        self.latency = LatencyTracker()
+        self.dns_probe = DnsProbe()
+        self.proc_inspector = ProcInspector()
+        self.container_pids = {}
+        self.readiness = ResolverReadiness(self.control_sockets, self.dns_probe, self.check_port_now)
         # self.kresman_token = token
-        self.kresman_timeout = int(os.environ.get("HTTP_TIMEOUT", 10))
         self.net_mapping = {"bytes_sent": "bytes_sent", "bytes_received": "bytes_received", "packets_sent": "packets_sent",
                             "packets_recv": "packets_received", "errin": "err_receiving", "errout": "err_sending",
                             "dropin": "dropped_in", "dropout": "dropped_out"}
         self.disk_mapping = ("read_count", "write_count", "read_bytes", "write_bytes", "read_time", "write_time",
                              "busy_time")
+        self.executor = EXECUTOR
 
     def get_interfaces(self) -> list:
         interfaces = []
@@ -58,83 +79,75 @@ class SystemInfo:
         except Exception:
             return "Unknown"
 
-    def get_images(self) -> dict:
+    async def get_images(self) -> dict:
         containers = {}
-        for container in self.docker_connector.get_containers():
-            try:
-                containers[container.name] = container.attrs["Config"]["Image"]
-            except KeyError:
-                pass
+        for container in await self.docker_connector.get_containers():
+            containers[container.name] = container.image
         return containers
 
     def to_gigabytes(self, stat: int) -> int:
         return round(stat / (1024 ** 3), 1)
 
-    def check_resolving(self) -> str:
-        domains = ("google.com", "microsoft.com", "apple.com", "facebook.com")
-        res = resolver.Resolver()
-        res.nameservers = ["127.0.0.1"]
-        res.timeout = int(os.environ.get("DNS_TIMEOUT", 3))
-        res.lifetime = int(os.environ.get("DNS_LIFETIME", 3))
-        for domain in domains:
-            try:
-                res.resolve(domain)
-                return "ok"
-            except Exception:
-                pass
-        return "fail"
+    async def get_kresman_metrics(self) -> dict:
+        try:
+            return await self.kresman.get_metrics()
+        except Exception as e:
+            self.logger.warning("Failed to collect kresman info, {}.".format(e))
+            return {"kresman": {"error": str(e)}, "kresman_internal": {"error": str(e)}}
+
+    async def check_resolving(self, max_age: float = None) -> str:
+        return (await self.probe_resolving(max_age))["status"]
+
+    async def probe_resolving(self, max_age: float = None) -> dict:
+        try:
+            return await self.dns_probe.check(max_age)
+        except Exception as e:
+            self.logger.warning("Failed to probe resolver, {}.".format(e))
+            return {"status": "fail", "error": str(e)}
 
-    def check_port(self, service: str = "resolver") -> str:
+    async def check_port(self, service: str = "resolver") -> str:
+        if self.proc_inspector.available():
+            try:
+                if self.proc_inspector.is_listening(await self.container_pid(service), "kresd", 53):
+                    return "ok"
+            except Exception as e:
+                if not self.proc_inspector.available():
+                    self.logger.warning("Failed to read sockets in proc, port is checked by docker exec, {}.".format(e))
+            if self.proc_inspector.available():
+                return "fail"
         try:
-            if "kresd" in self.docker_connector.container_exec(service,
-                                                               ["sh", "-c", "netstat -tupan | grep kresd | grep 53"]):
+            if "kresd" in await self.docker_connector.container_exec(
+                    service, ["sh", "-c", "netstat -tupan | grep kresd | grep 53"]):
                 return "ok"
         except Exception:
             pass
         return "fail"
 
-    def result_manipulation(self, mode: str, results: dict = None):
-        with open("/etc/whalebone/logs/kres_stats.json", mode) as file:
-            if mode == "w":
-                json.dump(results, file)
-            else:
-                return json.load(file)
+    async def check_port_now(self, service: str = "resolver") -> str:
+        # readiness polls faster than the proc cache expires
+        self.proc_inspector.invalidate()
+        return await self.check_port(service)
 
-    def get_kresman_metrics(self) -> dict:
-        address = os.environ.get("KRESMAN_LISTENER", "http://127.0.0.1:8080")
-        try:
-            msg = requests.get("{}/api/general/countentities".format(address), timeout=self.kresman_timeout,
-                               # headers={'accept': '*/*', 'Content-Type': 'application/json',
-                               #          'Authorization': 'Bearer {}'.format(self.kresman_token)}
-                               verify=False)
-        except requests.exceptions.RequestException as e:
-            self.logger.info("Failed to get data from kresman, {}".format(e))
-            return {"error": str(e)}
-        else:
-            try:
-                return {metric["id"]: metric["count"] for metric in msg.json()}
-            except Exception as e:
-                return {"error": str(e)}
+    async def container_pid(self, service: str) -> int:
+        # host pid of container init, upgrade moves the name to a new container while the old one still runs
+        cache = self.docker_connector.cache
+        record = cache.find(service) if cache.ready else None
+        container_id, pid = self.container_pids.get(service, (None, None))
+        if record is None or record.id != container_id or \
+                not os.path.isdir(os.path.join(self.proc_inspector.root, str(pid))):
+            inspect = await self.docker_connector.inspect_config(service)
+            container_id, pid = inspect["Id"], inspect["State"]["Pid"]
+            self.container_pids[service] = (container_id, pid)
+        return pid
 
-    def get_kresman_internal(self) -> dict:
-        address = os.environ.get("KRESMAN_LISTENER", "http://127.0.0.1:8080")
-        try:
-            msg = requests.get("{}/api/general/metrics".format(address), timeout=self.kresman_timeout,
-                               # headers={'accept': '*/*', 'Content-Type': 'application/json',
-                               #          'Authorization': 'Bearer {}'.format(self.kresman_token)}
-                               verify=False)
-        except requests.exceptions.RequestException as e:
-            self.logger.info("Failed to get data from kresman, {}".format(e))
-            return {"error": str(e)}
-        else:
+    async def check_resolver_process(self, pid: str) -> bool:
+        if self.proc_inspector.available():
             try:
-                return {metric["id"]: metric["value"] for metric in msg.json()}
-            except Exception as e:
-                return {"error": str(e)}
-
-    def check_resolver_process(self, pid: str) -> str:
-        return self.docker_connector.container_exec("resolver",
-                                                    ["sh", "-c", "ps -A | grep kresd | grep {}".format(pid)])
+                return bool(self.proc_inspector.find_process(await self.container_pid("resolver"), "kresd", int(pid)))
+            except Exception:
+                return False
+        return bool(await self.docker_connector.container_exec(
+            "resolver", ["sh", "-c", "ps -A | grep kresd | grep {}".format(pid)]))
 
     def delete_orphaned_tty(self, tty: str):
         try:
@@ -144,160 +157,158 @@ class SystemInfo:
         else:
             self.logger.info("Successfully deleted orphaned tty {}".format(tty))
 
-    def resurrect_resolver(self, pid: str) -> bool:
-        if self.check_resolver_process(pid) != "":
+    async def resurrect_resolver(self, pid: str) -> bool:
+        if await self.check_resolver_process(pid):
             try:
-                returned_text = self.docker_connector.container_exec("resolver", ["sh", "-c", "kill -9 {}".format(pid)])
+                returned_text = await self.docker_connector.container_exec("resolver",
+                                                                           ["sh", "-c", "kill -9 {}".format(pid)])
             except Exception as e:
                 self.logger.warning("Failed to kill tty {}, {}".format(pid, e))
             else:
                 self.logger.info("Recovery: kill sent with response: {}".format(returned_text))
-            if self.check_resolver_process(pid) != "":
+            self.proc_inspector.invalidate()
+            if await self.check_resolver_process(pid):
                 self.logger.info("Recovery: pid found in ps")
-                if "resolver-old" not in [container.name for container in self.docker_connector.get_containers()]:
+                running = [container.name for container in await self.docker_connector.get_containers()]
+                if "resolver-old" not in running:
                     try:
-                        self.docker_connector.restart_resolver()
+                        await self.docker_connector.restart_container("resolver")
                     except Exception as e:
                         self.logger.warning("Failed to restart resolver, {}".format(e))
                     else:
                         self.logger.info("Recovery: resolver restart command sent")
                         return True
 
-    def get_resolver_stats(self, tty: str) -> str:
-        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        sock.settimeout(5)
-        try:
-            sock.connect(tty)
-        except socket.timeout as te:
-            self.logger.warning("Timeout of socket {} reading, {}".format(tty, te))
-        except socket.error as msg:
-            self.logger.warning("Connection error {} to socket {}".format(msg, tty))
-            if msg.errno == errno.ECONNREFUSED and self.check_resolver_process(tty.split("/")[-1]) == "":
-                self.delete_orphaned_tty(tty)
+    async def get_resolver_stats(self, tty: str, reply) -> str:
+        if not isinstance(reply, Exception):
+            return reply
+        if isinstance(reply, asyncio.TimeoutError):
+            self.logger.warning("Timeout of socket {} reading".format(tty))
+        elif isinstance(reply, ConnectionRefusedError):
+            self.logger.warning("Connection error {} to socket {}".format(reply, tty))
+            if not await self.collect("resolver process", self.check_resolver_process, True, tty):
+                self.control_sockets.remove(tty)
+                self.delete_orphaned_tty(self.control_sockets.path(tty))
                 return "cleanup"
         else:
-            try:
-                message = b"stats.list()\n"
-                sock.sendall(message)
-                amount_received, amount_expected = 0, len(message)
-                while amount_received < amount_expected:
-                    data = sock.recv(65535)
-                    amount_received += len(data)
-                return data.decode("utf-8")
-            except socket.timeout as re:
-                self.logger.warning("Failed to get data from socket {}, {}".format(tty, re))
-            except Exception as e:
-                self.logger.warning("Failed to get data from {}, {}".format(tty, e))
-            finally:
-                sock.close()
+            self.logger.warning("Failed to get data from {}, {}".format(tty, reply))
         return ""
 
     def parse_stats_output(self, stats: str) -> dict:
-        result = {}
-        for line in stats.split("\n"):
-            split_line = re.findall(r"[\w']+", line)
-            if len(split_line) == 3:
-                result["{}.{}".format(split_line[0].replace("'", ""), split_line[1].replace("'", ""))] = int(
-                    split_line[2])
-        return result
-
-    def result_diff(self, results: dict, cli_request: bool) -> dict:
+        return numeric_stats(stats)
+
+    def result_diff(self, results: dict, instances: list, cli_request: bool) -> dict:
         try:
             if results:
-                # if "requestId" in request and request["requestId"] == "666":
-                #     return results
                 if cli_request:
-                    return results
+                    return {"resolver": self.aggregate_stats(results)}
+                deltas = self.stats_baseline.update(results, instances)
                 try:
-                    previous = self.result_manipulation("r")
-                except FileNotFoundError:
-                    return {}
-                else:
-                    pattern = re.compile(r"answer.*|query.*|request.*")
-                    stats = {}
-                    for stat, value in results.items():
-                        if stat in previous:
-                            if pattern.match(stat):
-                                diff = value - previous[stat]
-                                if diff >= 0:
-                                    stats[stat] = diff
-                            else:
-                                stats[stat] = value
-                    return stats
-                finally:
-                    self.result_manipulation("w", results)
+                    self.stats_baseline.checkpoint()
+                except Exception as e:
+                    self.logger.warning("Failed to checkpoint resolver stats baseline {}".format(e))
+                return {"resolver": self.aggregate_stats(deltas), "resolver_latency": self.latency.update(deltas)}
         except Exception as e:
             self.logger.warning("Failed to create resolver diff {}".format(e))
-        return {"error": "no data"}
+        return {"resolver": {"error": "no data"}}
 
-    def process_stats_output(self, cli_request: bool) -> dict:
+    def aggregate_stats(self, results: dict) -> dict:
         stats_results = {}
-        for tty in os.listdir("/etc/whalebone/tty/"):
+        for parsed_stats in results.values():
+            for stat_name, count in parsed_stats.items():
+                stats_results[stat_name] = stats_results.get(stat_name, 0) + count
+        return stats_results
+
+    async def process_stats_output(self, cli_request: bool) -> dict:
+        replies = await self.control_sockets.broadcast("stats.list()")
+        outputs = await asyncio.gather(*[self.get_resolver_stats(tty, reply) for tty, reply in replies.items()])
+        stats_results, instances = {}, {}
+        for tty, stats in zip(replies, outputs):
+            if stats == "cleanup":
+                instances[tty] = "cleanup"
+                continue
+            instances[tty] = "ok" if stats else "failure"
             try:
-                stats = self.get_resolver_stats("/etc/whalebone/tty/{}".format(tty))
-                if stats == "cleanup":
-                    continue
-                if stats:
-                    parsed_stats = self.parse_stats_output(stats)
-                    if parsed_stats:
-                        for stat_name, count in parsed_stats.items():
-                            try:
-                                stats_results[stat_name] += count
-                            except KeyError:
-                                stats_results[stat_name] = count
-                else:
-                    if self.resurrect_resolver(tty):
-                        break
+                parsed_stats = self.parse_stats_output(stats)
             except Exception as e:
                 self.logger.warning("Failed to get data from kres instance {}, {}".format(tty, e))
-        return self.result_diff(stats_results, cli_request)
+            else:
+                if parsed_stats:
+                    stats_results[tty] = parsed_stats
+        # resolver restart recovers all instances at once, further attempts are pointless
+        for tty in [tty for tty, state in instances.items() if state == "failure"]:
+            if await self.collect("resolver recovery", self.resurrect_resolver, False, tty):
+                instances[tty] = "recovery"
+                break
+        alive = [tty for tty, state in instances.items() if state != "cleanup"]
+        resolver_info = self.result_diff(stats_results, alive, cli_request)
+        resolver_info["resolver_instances"] = instances
+        return resolver_info
 
-    def get_info_static(self, error_stash: dict) -> dict:
-        if error_stash is None:
-            error_stash = {}
+    def get_cpu_info(self) -> dict:
+        return {'count': psutil.cpu_count(), 'usage': psutil.cpu_percent()}
+
+    def get_memory_info(self) -> dict:
         mem = psutil.virtual_memory()
-        swap = psutil.swap_memory()
+        return {'total': self.to_gigabytes(mem.total), 'available': self.to_gigabytes(mem.available),
+                'usage': mem.percent}
+
+    def get_hdd_info(self) -> dict:
         du = psutil.disk_usage('/')
-        return {
-            'hostname': platform.node(),
-            'system': platform.system(),
-            'platform': self.get_platform(),
-            'cpu': {
-                'count': psutil.cpu_count(),
-                'usage': psutil.cpu_percent()
-            },
-            'memory': {
-                'total': self.to_gigabytes(mem.total),
-                'available': self.to_gigabytes(mem.available),
-                'usage': mem.percent,
-            },
-            'hdd': {
-                'total': self.to_gigabytes(du.total),
-                'free': self.to_gigabytes(du.free),
-                'usage': du.percent,
-            },
-            "swap": {
-                'total': self.to_gigabytes(swap.total),
-                'free': self.to_gigabytes(swap.free),
-                'usage': swap.percent,
-            },
-            "network_info": self.get_network_info(),
-            "disk_iops": self.get_disk_info(),
-            "docker": self.docker_connector.docker_version(),
-            "check": {"resolve": self.check_resolving(), "port": self.check_port()},
-            "containers": {container.name: container.status for container in self.docker_connector.get_containers()},
-            "images": self.get_images(),
-            "kresman": self.get_kresman_metrics(),
-            "kresman_internal": self.get_kresman_internal(),
-            "error_messages": error_stash,
-            "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ"),
-            'interfaces': self.get_interfaces()
-        }
-
-    def get_system_info(self, error_stash: dict = None, cli_request: bool = False):
-        static_info = self.get_info_static(error_stash)
-        resolver_data = self.process_stats_output(cli_request)
-        if "error" in resolver_data:
+        return {'total': self.to_gigabytes(du.total), 'free': self.to_gigabytes(du.free), 'usage': du.percent}
+
+    def get_swap_info(self) -> dict:
+        swap = psutil.swap_memory()
+        return {'total': self.to_gigabytes(swap.total), 'free': self.to_gigabytes(swap.free), 'usage': swap.percent}
+
+    async def get_container_states(self) -> dict:
+        return {container.name: container.status for container in await self.docker_connector.get_containers()}
+
+    async def collect(self, name: str, collector, default=None, *args):
+        try:
+            # docker and probe collectors are coroutines, blocking psutil and file reads go to the executor
+            if asyncio.iscoroutinefunction(collector):
+                return await collector(*args)
+            return await asyncio.get_running_loop().run_in_executor(self.executor, collector, *args)
+        except Exception as e:
+            self.logger.warning("Failed to collect {} info, {}.".format(name, e))
+            return {} if default is None else default
+
+    async def get_info_static(self, error_stash: dict, cli_request: bool = False) -> dict:
+        if error_stash is None:
+            error_stash = {}
+        collectors = {'platform': (self.get_platform, "Unknown"), 'cpu': (self.get_cpu_info, None),
+                      'memory': (self.get_memory_info, None), 'hdd': (self.get_hdd_info, None),
+                      'swap': (self.get_swap_info, None), "network_info": (self.get_network_info, None),
+                      "disk_iops": (self.get_disk_info, None), "docker": (self.docker_connector.docker_version, None),
+                      "port": (self.check_port, "fail"),
+                      "containers": (self.get_container_states, None), "images": (self.get_images, None),
+                      'interfaces': (self.get_interfaces, [])}
+        dns_probe, kresman, *results = await asyncio.gather(self.probe_resolving(), self.get_kresman_metrics(), *[
+            self.collect(name, collector, default) for name, (collector, default) in collectors.items()])
+        info = dict(zip(collectors, results), **kresman)
+        # cli requests peek at the samples without consuming them from the next periodic report
+        info["host_metrics"] = self.host_sampler.report(not cli_request)
+        info["container_stats"] = self.container_stats.report()
+        if info["cpu"] and info["host_metrics"].get("cpu", {}).get("avg") is not None:
+            info["cpu"]["usage"] = info["host_metrics"]["cpu"]["avg"]
+        info.update({'hostname': platform.node(), 'system': platform.system(), "dns_probe": dns_probe,
+                     "check": {"resolve": dns_probe["status"], "port": info.pop("port")},
+                     "error_messages": error_stash, "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")})
+        return info
+
+    async def collect_resolver_stats(self, cli_request: bool) -> dict:
+        try:
+            return await self.process_stats_output(cli_request)
+        except Exception as e:
+            self.logger.warning("Failed to collect resolver info, {}.".format(e))
+            return {"resolver": {"error": "no data"}, "resolver_instances": {}}
+
+    async def get_system_info(self, error_stash: dict = None, cli_request: bool = False):
+        static_info, resolver_info = await asyncio.gather(
+            self.get_info_static(error_stash, cli_request),
+            self.collect_resolver_stats(cli_request))
+        if "error" in resolver_info["resolver"]:
             static_info["check"]["resolve"] = "recovery"
-        static_info["resolver"] = resolver_data
+        static_info.update(resolver_info)
         return static_info
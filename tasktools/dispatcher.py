@@ -0,0 +1,74 @@
+import asyncio
+
+
+class ActionStatistics:
+    def __init__(self):
+        self.requests = 0
+        self.rejected = 0
+        self.failures = 0
+        self.last_wait = None
+        self.max_wait = 0.0
+        self.total_wait = 0.0
+
+    def record_wait(self, wait: float):
+        self.requests += 1
+        self.last_wait = wait
+        self.max_wait = max(self.max_wait, wait)
+        self.total_wait += wait
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "rejected": self.rejected, "failures": self.failures,
+                "last_wait": round(self.last_wait, 3) if self.last_wait is not None else None,
+                "max_wait": round(self.max_wait, 3),
+                "avg_wait": round(self.total_wait / self.requests, 3) if self.requests else None}
+
+
+class RequestDispatcher:
+    def __init__(self, handler, exclusive_actions: tuple, max_in_flight: int, logger,
+                 exclusive_lock: asyncio.Lock = None):
+        self.handler = handler
+        self.exclusive_actions = exclusive_actions
+        self.max_in_flight = max_in_flight
+        self.logger = logger
+        # shared by all connections, handlers of a closed connection may still be running
+        self.exclusive_lock = exclusive_lock if exclusive_lock else asyncio.Lock()
+        self.in_flight = set()
+        self.actions = {}
+
+    def action_statistics(self, action: str) -> ActionStatistics:
+        try:
+            return self.actions[action]
+        except KeyError:
+            self.actions[action] = ActionStatistics()
+            return self.actions[action]
+
+    def dispatch(self, action: str, *args) -> bool:
+        if len(self.in_flight) >= self.max_in_flight:
+            self.action_statistics(action).rejected += 1
+            self.logger.warning("Request {} rejected, {} requests already in flight.".format(action,
+                                                                                            len(self.in_flight)))
+            return False
+        task = asyncio.create_task(self.run(action, asyncio.get_running_loop().time(), *args))
+        self.in_flight.add(task)
+        task.add_done_callback(self.in_flight.discard)
+        return True
+
+    async def run(self, action: str, received: float, *args):
+        if action in self.exclusive_actions:
+            async with self.exclusive_lock:
+                await self.execute(action, received, *args)
+        else:
+            await self.execute(action, received, *args)
+
+    async def execute(self, action: str, received: float, *args):
+        statistics = self.action_statistics(action)
+        statistics.record_wait(asyncio.get_running_loop().time() - received)
+        try:
+            await self.handler(*args)
+        except Exception as e:
+            statistics.failures += 1
+            self.logger.warning("Failed to handle request {}, {}.".format(action, e))
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self.in_flight), "exclusive_locked": self.exclusive_lock.locked(),
+                "actions": {action: statistics.stats() for action, statistics in self.actions.items()}}
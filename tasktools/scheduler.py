@@ -0,0 +1,144 @@
+import asyncio
+import random
+
+OVERLAP_POLICIES = ("skip", "queue", "cancel")
+
+
+class PeriodicJob:
+    def __init__(self, name: str, function, interval: float, deadline: float = None, jitter: float = 0,
+                 overlap: str = "skip"):
+        if overlap not in OVERLAP_POLICIES:
+            raise ValueError("Overlap policy '{}' not supported. Supported policies: {}".format(overlap,
+                                                                                              OVERLAP_POLICIES))
+        self.name = name
+        self.function = function
+        self.interval = interval
+        self.deadline = deadline
+        self.jitter = jitter
+        self.overlap = overlap
+        self.execution = None
+        self.queued = False
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.cancelled = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+
+    def is_running(self) -> bool:
+        return self.execution is not None and not self.execution.done()
+
+    def stats(self) -> dict:
+        return {"interval": self.interval, "deadline": self.deadline, "overlap": self.overlap,
+                "running": self.is_running(), "runs": self.runs, "failures": self.failures,
+                "timeouts": self.timeouts, "overruns": self.overruns, "skipped": self.skipped,
+                "cancelled": self.cancelled,
+                "last_latency": round(self.last_latency, 3) if self.last_latency is not None else None,
+                "max_latency": round(self.max_latency, 3)}
+
+
+class Scheduler:
+    def __init__(self, logger, supervisor=None):
+        self.logger = logger
+        self.supervisor = supervisor
+        self.jobs = {}
+        self.tickers = {}
+        self.started = False
+
+    def add_job(self, name: str, function, interval: float, deadline: float = None, jitter: float = 0,
+                overlap: str = "skip") -> PeriodicJob:
+        if name in self.jobs:
+            raise ValueError("Job {} is already scheduled".format(name))
+        job = PeriodicJob(name, function, interval, deadline, jitter, overlap)
+        self.jobs[name] = job
+        if self.started:
+            self.start_ticker(job)
+        return job
+
+    def ticker_name(self, job: PeriodicJob) -> str:
+        return "periodic_{}".format(job.name)
+
+    def start_ticker(self, job: PeriodicJob):
+        if self.supervisor is not None:
+            self.supervisor.start(self.ticker_name(job), lambda: self.tick(job), "permanent",
+                                  heartbeat_timeout=2 * job.interval + job.jitter + 10)
+        else:
+            self.tickers[job.name] = asyncio.create_task(self.tick(job))
+
+    def start(self):
+        self.started = True
+        for job in self.jobs.values():
+            self.start_ticker(job)
+
+    async def stop(self):
+        if self.supervisor is not None:
+            await self.supervisor.stop(*[self.ticker_name(job) for job in self.jobs.values()])
+        tasks = list(self.tickers.values())
+        tasks.extend(job.execution for job in self.jobs.values() if job.is_running())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tickers, self.started = {}, False
+
+    def stats(self) -> dict:
+        return {name: job.stats() for name, job in self.jobs.items()}
+
+    async def tick(self, job: PeriodicJob):
+        loop = asyncio.get_running_loop()
+        next_run = loop.time()
+        while True:
+            if self.supervisor is not None:
+                self.supervisor.heartbeat(self.ticker_name(job))
+            delay = next_run - loop.time() + (random.uniform(0, job.jitter) if job.jitter else 0)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.trigger(job)
+            next_run += job.interval
+            if next_run < loop.time():
+                # do not burst missed ticks after the loop was blocked, realign to the current time
+                next_run = loop.time() + job.interval
+
+    def trigger(self, job: PeriodicJob):
+        if job.is_running():
+            job.overruns += 1
+            if job.overlap == "skip":
+                job.skipped += 1
+                self.logger.warning("Periodic task {} is still running, skipping this run.".format(job.name))
+                return
+            elif job.overlap == "queue":
+                job.queued = True
+                self.logger.info("Periodic task {} is still running, next run queued.".format(job.name))
+                return
+            else:
+                job.cancelled += 1
+                job.execution.cancel()
+                self.logger.warning("Periodic task {} is still running, cancelling it.".format(job.name))
+        job.execution = asyncio.create_task(self.execute(job))
+
+    async def execute(self, job: PeriodicJob):
+        while True:
+            await self.run_once(job)
+            if not job.queued:
+                break
+            job.queued = False
+
+    async def run_once(self, job: PeriodicJob):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            await asyncio.wait_for(job.function(), job.deadline)
+        except asyncio.TimeoutError:
+            job.failures += 1
+            job.timeouts += 1
+            self.logger.error("Periodic task {} failed to finish in {} secs.".format(job.name, job.deadline))
+        except Exception as e:
+            job.failures += 1
+            self.logger.error("Periodic task {} failed due to {}.".format(job.name, e))
+        self.record_run(job, loop.time() - start)
+
+    def record_run(self, job: PeriodicJob, latency: float):
+        job.runs += 1
+        job.last_latency = latency
+        job.max_latency = max(job.max_latency, latency)
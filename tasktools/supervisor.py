@@ -0,0 +1,136 @@
+import asyncio
+
+from exception.exc import TaskFailedException
+
+RESTART_STRATEGIES = ("permanent", "transient", "temporary")
+
+
+class SupervisedTask:
+    def __init__(self, name: str, factory, strategy: str, heartbeat_timeout: float = None,
+                 restart_delay: float = 1):
+        if strategy not in RESTART_STRATEGIES:
+            raise ValueError("Restart strategy '{}' not supported. Supported strategies: {}".format(
+                strategy, RESTART_STRATEGIES))
+        self.name = name
+        self.factory = factory
+        self.strategy = strategy
+        self.heartbeat_timeout = heartbeat_timeout
+        self.restart_delay = restart_delay
+        self.task = None
+        self.stopping = False
+        self.stale = False
+        self.starts = 0
+        self.restarts = 0
+        self.last_heartbeat = None
+        self.last_error = None
+
+    def is_running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def heartbeat_age(self, now: float) -> float:
+        return now - self.last_heartbeat if self.last_heartbeat is not None else None
+
+    def stats(self, now: float) -> dict:
+        age = self.heartbeat_age(now)
+        return {"strategy": self.strategy, "running": self.is_running(), "starts": self.starts,
+                "restarts": self.restarts, "heartbeat_age": round(age, 3) if age is not None else None,
+                "last_error": self.last_error}
+
+
+class Supervisor:
+    def __init__(self, logger, check_interval: float = 1):
+        self.logger = logger
+        self.check_interval = check_interval
+        self.children = {}
+
+    def start(self, name: str, factory, strategy: str = "permanent", heartbeat_timeout: float = None,
+              restart_delay: float = 1):
+        child = self.children.get(name)
+        if child is not None and child.is_running():
+            raise ValueError("Task {} is already supervised and running".format(name))
+        new_child = SupervisedTask(name, factory, strategy, heartbeat_timeout, restart_delay)
+        if child is not None:
+            new_child.starts, new_child.restarts = child.starts, child.restarts
+        self.children[name] = new_child
+        self.spawn(new_child)
+        return new_child.task
+
+    def spawn(self, child: SupervisedTask):
+        if child.stopping or self.children.get(child.name) is not child:
+            return
+        child.stale = False
+        child.starts += 1
+        child.last_heartbeat = asyncio.get_running_loop().time()
+        child.task = asyncio.create_task(child.factory())
+        child.task.add_done_callback(lambda task: self.child_finished(child, task))
+
+    def child_finished(self, child: SupervisedTask, task: asyncio.Task):
+        if child.stopping:
+            return
+        if task.cancelled():
+            failed = True
+            child.last_error = "heartbeat lost" if child.stale else "cancelled"
+        else:
+            failed = task.exception() is not None
+            if failed:
+                child.last_error = str(task.exception())
+        if child.strategy == "permanent" or (child.strategy == "transient" and failed):
+            child.restarts += 1
+            self.logger.error("Task {} finished ({}), restarting in {} secs.".format(
+                child.name, child.last_error if failed else "no error", child.restart_delay))
+            asyncio.get_running_loop().call_later(child.restart_delay, self.spawn, child)
+        elif failed:
+            self.logger.error("Task {} failed: {}.".format(child.name, child.last_error))
+
+    def heartbeat(self, name: str):
+        try:
+            self.children[name].last_heartbeat = asyncio.get_running_loop().time()
+        except KeyError:
+            pass
+
+    def is_alive(self, name: str) -> bool:
+        child = self.children.get(name)
+        if child is None or not child.is_running():
+            return False
+        if child.heartbeat_timeout is None:
+            return True
+        return child.heartbeat_age(asyncio.get_running_loop().time()) <= child.heartbeat_timeout
+
+    def running_tasks(self) -> list:
+        return [name for name in self.children if self.is_alive(name)]
+
+    async def join(self, name: str):
+        child = self.children[name]
+        await asyncio.wait([child.task])
+        if child.task.cancelled():
+            raise TaskFailedException("Task {} was cancelled, {}".format(name, child.last_error))
+        return child.task.result()
+
+    async def stop(self, *names: str):
+        tasks = []
+        for name in names:
+            child = self.children.pop(name, None)
+            if child is not None and child.is_running():
+                child.stopping = True
+                child.task.cancel()
+                tasks.append(child.task)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def check_heartbeats(self):
+        now = asyncio.get_running_loop().time()
+        for child in list(self.children.values()):
+            if child.is_running() and child.heartbeat_timeout is not None and \
+                    child.heartbeat_age(now) > child.heartbeat_timeout:
+                self.logger.error("Task {} missed heartbeat for {:.1f} secs, cancelling it.".format(
+                    child.name, child.heartbeat_age(now)))
+                child.stale = True
+                child.task.cancel()
+
+    async def watch(self):
+        while True:
+            self.check_heartbeats()
+            await asyncio.sleep(self.check_interval)
+
+    def stats(self) -> dict:
+        now = asyncio.get_running_loop().time()
+        return {name: child.stats(now) for name, child in self.children.items()}
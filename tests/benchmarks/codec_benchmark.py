@@ -0,0 +1,38 @@
+import time
+
+from tests.benchmarks.messages import sample_sysinfo, sample_upgrade_request, sample_upgrade_response
+from transporttools.codec import CODECS, JsonData
+
+# run from repository root: python -m tests.benchmarks.codec_benchmark
+ROUNDS = 2000
+
+
+def throughput(function, frames: list) -> float:
+    start = time.perf_counter()
+    for index in range(ROUNDS):
+        function(frames[index % len(frames)])
+    return ROUNDS / (time.perf_counter() - start)
+
+
+def run():
+    recorded = {"sysinfo": [sample_sysinfo(seed) for seed in range(10)], "upgrade request": [sample_upgrade_request()],
+                "upgrade response": [sample_upgrade_response()]}
+    print("{:<18} {:<8} {:>10} {:>14} {:>14}".format("message", "codec", "bytes", "encode msg/s", "decode msg/s"))
+    for name, messages in recorded.items():
+        for codec_name, codec_class in CODECS.items():
+            codec = codec_class()
+            frames = [codec.encode(message) for message in messages]
+            encode = throughput(codec.encode, messages)
+            decode = throughput(codec.decode, frames)
+            size = sum(len(frame) for frame in frames) / len(frames)
+            print("{:<18} {:<8} {:>10.0f} {:>14.0f} {:>14.0f}".format(name, codec_name, size, encode, decode))
+    # sysinfo also written to metrics log, JSON text is shared when serialized once
+    messages = recorded["sysinfo"]
+    twice = throughput(lambda message: (JsonData(message["data"]).text, CODECS["base64"]().encode(message)), messages)
+    once = throughput(lambda message: CODECS["base64"]().encode(dict(message, data=JsonData(message["data"]))),
+                      messages)
+    print("sysinfo metrics log + base64 frame: {:.0f} msg/s serialized twice, {:.0f} msg/s once".format(twice, once))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,133 @@
+import json
+import random
+import uuid
+
+RESOLVER_STATS = ("answer.total", "answer.noerror", "answer.nodata", "answer.nxdomain", "answer.servfail",
+                  "answer.cached", "answer.1ms", "answer.10ms", "answer.50ms", "answer.100ms", "answer.250ms",
+                  "answer.500ms", "answer.1000ms", "answer.1500ms", "answer.slow", "answer.aa", "answer.tc",
+                  "answer.rd", "answer.ra", "answer.ad", "answer.cd", "answer.edns0", "answer.do",
+                  "query.edns", "query.dnssec", "request.total", "request.udp", "request.tcp", "request.dot",
+                  "request.doh", "request.internal", "request.xdp", "const.rsp_size", "worker.concurrent",
+                  "worker.dropped", "worker.timeout", "worker.udp", "worker.tcp", "worker.ipv4", "worker.ipv6")
+
+
+def sample_sysinfo(seed: int = 1) -> dict:
+    generator = random.Random(seed)
+    containers = ("resolver", "kresman", "lr-agent", "logstream", "passivedns", "resolver-old")
+    return {
+        "action": "sysinfo",
+        "data": {
+            "hostname": "resolver-{}.customer.example".format(seed), "system": "Linux",
+            "platform": "Ubuntu 20.04.6 LTS",
+            "cpu": {"count": 16, "usage": round(generator.uniform(0, 100), 1)},
+            "memory": {"total": 31.3, "available": round(generator.uniform(1, 30), 1), "usage": 41.2},
+            "hdd": {"total": 195.8, "free": 120.4, "usage": 38.5},
+            "swap": {"total": 2.0, "free": 2.0, "usage": 0.0},
+            "network_info": {name: generator.randint(0, 10 ** 12) for name in (
+                "bytes_sent", "bytes_received", "packets_sent", "packets_received", "err_receiving", "err_sending",
+                "dropped_in", "dropped_out")},
+            "disk_iops": {name: generator.randint(0, 10 ** 9) for name in (
+                "read_count", "write_count", "read_bytes", "write_bytes", "read_time", "write_time", "busy_time")},
+            "docker": {"Platform": {"Name": "Docker Engine - Community"}, "Version": "24.0.7",
+                       "ApiVersion": "1.43", "MinAPIVersion": "1.12", "GitCommit": "311b9ff",
+                       "GoVersion": "go1.20.10", "Os": "linux", "Arch": "amd64",
+                       "KernelVersion": "5.4.0-169-generic", "BuildTime": "2023-10-26T09:07:41.000000000+00:00",
+                       "Components": [{"Name": name, "Version": "1.6.26", "Details": {"GitCommit": "3dd1e886e5"}}
+                                      for name in ("Engine", "containerd", "runc", "docker-init")]},
+            "check": {"resolve": "ok", "port": "ok"},
+            "containers": {name: "running" for name in containers},
+            "images": {name: "harbor.whalebone.io/whalebone/{}:2.{}.{}".format(name, seed, 4) for name in containers},
+            "kresman": {name: generator.randint(0, 5000) for name in (
+                "policies", "domains", "ip_ranges", "whitelists", "blacklists", "custom_lists", "users")},
+            "kresman_internal": {"metric_{}".format(index): generator.random() for index in range(24)},
+            "error_messages": {},
+            "timestamp": "2026-10-17T12:00:00Z",
+            "interfaces": [{"name": name, "addresses": ["10.0.{}.{}".format(index, seed), "fe80::{}:1".format(index)]}
+                           for index, name in enumerate(("lo", "eth0", "eth1", "docker0", "br-4f2a8c"))],
+            "resolver": {name: generator.randint(0, 10 ** 6) for name in RESOLVER_STATS},
+        }
+    }
+
+
+def sysinfo_snapshots(count: int, seed: int = 1) -> list:
+    # consecutive minutes of one agent, usage varies and counters grow, no two snapshots are equal
+    generator = random.Random(seed)
+    snapshot = sample_sysinfo(seed)
+    snapshots = []
+    for minute in range(count):
+        data = snapshot["data"]
+        data["cpu"]["usage"] = round(generator.uniform(0, 100), 1)
+        data["memory"]["available"] = round(generator.uniform(1, 30), 1)
+        for group in ("network_info", "disk_iops", "resolver"):
+            for name in data[group]:
+                data[group][name] += generator.randint(0, 10 ** 4)
+        for name in data["kresman"]:
+            data["kresman"][name] += generator.randint(-5, 5)
+        data["kresman_internal"] = {name: generator.random() for name in data["kresman_internal"]}
+        data["timestamp"] = "2026-10-17T{:02d}:{:02d}:00Z".format(minute // 60 % 24, minute % 60)
+        snapshots.append(json.loads(json.dumps(snapshot)))
+    return snapshots
+
+
+def upgrade_responses(count: int, seed: int = 1) -> list:
+    generator = random.Random(seed)
+    responses = []
+    for _ in range(count):
+        response = sample_upgrade_response()
+        response["data"]["uid"] = str(uuid.UUID(int=generator.getrandbits(128), version=4))
+        response["requestId"] = "{:x}".format(generator.getrandbits(48))
+        responses.append(response)
+    return responses
+
+
+def sample_upgrade_response() -> dict:
+    return {
+        "action": "upgrade",
+        "data": {
+            "action_status": {
+                "resolver": {"status": "success"},
+                "kresman": {"status": "success"},
+                "logstream": {"status": "failure", "message": "failed to start new logstream",
+                              "body": "500 Server Error: Internal Server Error (\"driver failed programming "
+                                      "external connectivity on endpoint logstream: Bind for 0.0.0.0:5044 "
+                                      "failed: port is already allocated\")"},
+            },
+            "uid": "6c1a2ef4-1f9d-4c4e-9d54-2b8b0f3e7c11"
+        }
+    }
+
+
+def sample_upgrade_request() -> dict:
+    compose = "\n".join("  {0}:\n    image: harbor.whalebone.io/whalebone/{0}:2.8.{1}\n    net: host\n"
+                        "    restart: always\n    environment:\n      LOG_LEVEL: info\n".format(name, index)
+                        for index, name in enumerate(("resolver", "kresman", "logstream", "lr-agent")))
+    return {"requestId": "1f3c", "action": "upgrade",
+            "data": {"compose": "version: '3'\nservices:\n" + compose, "services": ["resolver", "kresman"],
+                     "config": ["modules = { 'policy', 'stats', 'predict' }"] * 40, "uid": "6c1a2ef4"}}
+
+
+def stats_list_output(entries: int = 10000, table: bool = True, seed: int = 1) -> str:
+    # stats.list() reply of kresd, table notation of recent versions or the older "[name] => value" one
+    generator = random.Random(seed)
+    names = list(RESOLVER_STATS) + ["upstream.{}-{}.rtt".format(index % 250, index) for index in
+                                    range(entries - len(RESOLVER_STATS))]
+    if table:
+        lines = ["{"] + ["    ['{}'] = {},".format(name, generator.randint(0, 10 ** 9)) for name in names] + ["}"]
+    else:
+        lines = ["[{}] => {}".format(name, generator.randint(0, 10 ** 9)) for name in names]
+    return "\n".join(lines)
+
+
+def worker_stats_output() -> str:
+    return "\n".join(["{"] + ["    ['{}'] = {},".format(name, value) for name, value in (
+        ("concurrent", 1), ("csw", 5231), ("dropped", 0), ("err_http", 0), ("err_tcp", 0), ("err_tls", 0),
+        ("err_udp", 0), ("ipv4", 8121), ("ipv6", 12), ("pagefaults", 0), ("queries", 8133), ("rss", 37625856),
+        ("swaps", 0), ("systime", 0.398), ("tcp", 21), ("timeout", 3), ("udp", 8112), ("usertime", 1.217))] + ["}"])
+
+
+def cache_stats_output() -> str:
+    return "\n".join(["{"] + ["    ['{}'] = {},".format(name, value) for name, value in (
+        ("clear", 0), ("close", 0), ("commit", 4532), ("count", 10240), ("count_entries", 20117),
+        ("match", 0), ("match_miss", 0), ("open", 0), ("read", 98231), ("read_leq", 4011),
+        ("read_leq_miss", 3422), ("read_miss", 12001), ("remove", 0), ("remove_miss", 0),
+        ("usage_percent", 3.2109375), ("write", 9044))] + ["}"])
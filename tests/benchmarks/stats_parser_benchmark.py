@@ -0,0 +1,43 @@
+import re
+import time
+
+from resolvertools.stats_parser import numeric_stats, parse_output
+from tests.benchmarks.messages import cache_stats_output, stats_list_output, worker_stats_output
+
+# run from repository root: python -m tests.benchmarks.stats_parser_benchmark
+ROUNDS = 20
+
+
+def legacy_parse(stats: str) -> dict:
+    # parser used before, drops names which do not split into exactly three word tokens
+    result = {}
+    for line in stats.split("\n"):
+        split_line = re.findall(r"[\w']+", line)
+        if len(split_line) == 3:
+            result["{}.{}".format(split_line[0].replace("'", ""), split_line[1].replace("'", ""))] = int(
+                split_line[2])
+    return result
+
+
+def measure(parser, output: str) -> tuple:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        result = parser(output)
+    return len(result), (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def run():
+    outputs = {"stats.list() table": stats_list_output(table=True),
+               "stats.list() arrows": stats_list_output(table=False),
+               "worker.stats() x500": "\n".join([worker_stats_output()] * 500),
+               "cache.stats() x500": "\n".join([cache_stats_output()] * 500)}
+    print("{:<22} {:<14} {:>8} {:>10}".format("output", "parser", "entries", "ms/parse"))
+    for name, output in outputs.items():
+        for label, parser in (("legacy regex", legacy_parse), ("numeric_stats", numeric_stats),
+                              ("typed records", parse_output)):
+            entries, elapsed = measure(parser, output)
+            print("{:<22} {:<14} {:>8} {:>10.2f}".format(name, label, entries, elapsed))
+
+
+if __name__ == '__main__':
+    run()
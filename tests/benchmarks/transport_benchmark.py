@@ -0,0 +1,48 @@
+import time
+import zlib
+
+from tests.benchmarks.messages import sysinfo_snapshots, upgrade_responses
+from transporttools.codec import CODECS
+
+# run from repository root: python -m tests.benchmarks.transport_benchmark
+# every message is sent once, repeated messages would let the deflate context shrink them to a few bytes
+ROUNDS = 2000
+
+
+class PerMessageDeflate:
+    # mimics websockets permessage-deflate with context takeover (client default)
+    def __init__(self):
+        self.compressor = zlib.compressobj(wbits=-15)
+
+    def compress(self, frame) -> bytes:
+        if isinstance(frame, str):
+            frame = frame.encode("utf-8")
+        data = self.compressor.compress(frame) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        return data[:-4] if data.endswith(b"\x00\x00\xff\xff") else data
+
+
+def measure(codec, messages: list, deflate: bool) -> tuple:
+    compressor = PerMessageDeflate() if deflate else None
+    size = 0
+    start = time.process_time()
+    for message in messages:
+        frame = codec.encode(message)
+        if compressor:
+            frame = compressor.compress(frame)
+        size += len(frame)
+    elapsed = time.process_time() - start
+    return size / len(messages), elapsed / len(messages) * 10 ** 6
+
+
+def run():
+    payloads = {"sysinfo": sysinfo_snapshots(ROUNDS), "upgrade": upgrade_responses(ROUNDS)}
+    print("{:<10} {:<34} {:>12} {:>14}".format("message", "transport", "bytes/msg", "cpu us/msg"))
+    for name, messages in payloads.items():
+        for codec_name, codec_class in CODECS.items():
+            for deflate in (False, True):
+                label = "{} + permessage-deflate".format(codec_name) if deflate else codec_name
+                size, cpu = measure(codec_class(), messages, deflate)
+                print("{:<10} {:<34} {:>12.0f} {:>14.1f}".format(name, label, size, cpu))
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,42 @@
+import unittest
+
+from dockertools.compose_parser import ComposeParser
+from exception.exc import ComposeException
+
+
+class UpgradeStagesTest(unittest.TestCase):
+    def setUp(self):
+        self.parser = ComposeParser()
+
+    def test_independent_services_share_stage(self):
+        services = {"kresman": {}, "logstream": {}, "passivedns": {"depends_on": ["logstream"]}}
+        self.assertEqual(self.parser.upgrade_stages(["kresman", "logstream", "passivedns"], services),
+                         [["kresman", "logstream"], ["passivedns"]])
+
+    def test_long_depends_on_syntax(self):
+        services = {"kresman": {"depends_on": {"logstream": {"condition": "service_started"}}}, "logstream": {}}
+        self.assertEqual(self.parser.upgrade_stages(["kresman", "logstream"], services),
+                         [["logstream"], ["kresman"]])
+
+    def test_resolver_first_and_agent_last(self):
+        services = {"resolver": {}, "kresman": {}, "logstream": {}, "lr-agent": {}}
+        self.assertEqual(self.parser.upgrade_stages(["lr-agent", "kresman", "resolver", "logstream"], services),
+                         [["resolver"], ["kresman", "logstream"], ["lr-agent"]])
+
+    def test_resolver_dependency_goes_before_resolver(self):
+        services = {"resolver": {"depends_on": ["kresman"]}, "kresman": {}, "logstream": {}}
+        self.assertEqual(self.parser.upgrade_stages(["resolver", "kresman", "logstream"], services),
+                         [["kresman"], ["resolver"], ["logstream"]])
+
+    def test_dependencies_outside_request_ignored(self):
+        services = {"resolver": {}, "kresman": {"depends_on": ["resolver"]}, "missing": {}}
+        self.assertEqual(self.parser.upgrade_stages(["kresman", "unknown"], services), [["kresman"]])
+
+    def test_cycle(self):
+        services = {"kresman": {"depends_on": ["logstream"]}, "logstream": {"depends_on": ["kresman"]}}
+        with self.assertRaises(ComposeException):
+            self.parser.upgrade_stages(["kresman", "logstream"], services)
+
+
+if __name__ == '__main__':
+    unittest.main()
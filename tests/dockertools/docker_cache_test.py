@@ -0,0 +1,137 @@
+import asyncio
+import json
+import logging
+import unittest
+
+from aiodocker.exceptions import DockerError
+
+from dockertools.docker_cache import ContainerRecord, DockerCache
+
+
+def container(container_id: str, name: str, state: str = "running") -> dict:
+    return {"Id": container_id, "Names": ["/{}".format(name)], "Image": "whalebone/{}:1".format(name),
+            "ImageID": "sha256:{}".format(container_id), "State": state, "Labels": None}
+
+
+class FakeCollection:
+    def __init__(self, items):
+        self.items = items
+        self.calls = 0
+
+    async def list(self, **kwargs):
+        self.calls += 1
+        if "filters" in kwargs:
+            ids = json.loads(kwargs["filters"])["id"]
+            return [item for item in self.items if item["Id"] in ids]
+        return list(self.items)
+
+
+class FakeContainer:
+    def __init__(self, containers: "FakeContainers", container_id: str):
+        self.containers = containers
+        self.id = container_id
+
+    async def show(self) -> dict:
+        self.containers.inspects += 1
+        for item in self.containers.items:
+            if item["Id"] == self.id:
+                return {"Id": item["Id"], "Name": item["Names"][0], "Image": item["ImageID"],
+                        "Config": {"Image": item.get("Configured", item["Image"]), "Labels": item["Labels"]},
+                        "State": {"Status": item["State"]}}
+        raise DockerError(404, {"message": "No such container: {}".format(self.id)})
+
+
+class FakeContainers(FakeCollection):
+    def __init__(self, items):
+        super().__init__(items)
+        self.inspects = 0
+
+    def container(self, container_id: str) -> FakeContainer:
+        return FakeContainer(self, container_id)
+
+
+class FakeVolumes:
+    async def list(self):
+        return {"Volumes": [{"Name": "data", "Driver": "local"}]}
+
+
+class FakeDocker:
+    # answers like the docker api with the listing shape of containers, images and volumes
+    def __init__(self):
+        self.containers = FakeContainers([container("a1", "resolver"), container("b2", "lr-agent", "exited")])
+        self.images = FakeCollection([{"Id": "sha256:a1", "RepoTags": ["whalebone/resolver:1"]},
+                                      {"Id": "sha256:c3", "RepoTags": None}])
+        self.volumes = FakeVolumes()
+
+    async def version(self) -> dict:
+        return {"Version": "20.10"}
+
+
+class DockerCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeDocker()
+        self.cache = DockerCache(logging.getLogger("docker-cache-test"))
+        asyncio.run(self.cache.seed(self.client))
+
+    def event(self, kind: str, action: str, actor_id: str, **attributes):
+        asyncio.run(self.cache.apply(self.client, {"Type": kind, "Action": action,
+                                                   "Actor": {"ID": actor_id, "Attributes": attributes}}))
+
+    def test_seed(self):
+        self.assertTrue(self.cache.ready)
+        self.assertEqual([record.name for record in self.cache.get_containers()], ["resolver"])
+        self.assertEqual(len(self.cache.get_containers(stopped=True)), 2)
+        self.assertEqual(self.cache.images["sha256:c3"].tags, [])
+        self.assertEqual([volume.name for volume in self.cache.get_volumes()], ["data"])
+        self.assertEqual(self.cache.version, {"Version": "20.10"})
+
+    def test_records_are_slotted(self):
+        with self.assertRaises(AttributeError):
+            self.cache.find("resolver").extra = 1
+
+    def test_container_events(self):
+        self.client.containers.items.append(container("d4", "resolver-old"))
+        self.event("container", "start", "d4")
+        self.assertEqual(self.cache.find("resolver-old").id, "d4")
+        self.client.containers.items[0]["State"] = "exited"
+        self.event("container", "health_status: unhealthy", "a1")
+        self.assertEqual(self.cache.find("resolver").status, "exited")
+        self.event("container", "destroy", "d4")
+        self.assertIsNone(self.cache.find("resolver-old"))
+        inspects = self.client.containers.inspects
+        self.event("container", "exec_start: kresd", "a1")
+        self.assertEqual(self.client.containers.inspects, inspects)
+
+    def test_image_and_volume_events(self):
+        self.client.images.items.append({"Id": "sha256:e5", "RepoTags": ["whalebone/resolver:2"]})
+        self.event("image", "pull", "whalebone/resolver:2")
+        self.assertEqual(self.cache.images["sha256:e5"].tags, ["whalebone/resolver:2"])
+        self.event("volume", "create", "logs", driver="local")
+        self.event("volume", "destroy", "data")
+        self.assertEqual([volume.name for volume in self.cache.get_volumes()], ["logs"])
+
+    def test_configured_image_after_tag_moved(self):
+        # list endpoint reports the id of the old image once the tag points to a newly pulled one
+        self.client.containers.items.append(dict(container("d4", "kresman"), Image="sha256:d4",
+                                                 Configured="whalebone/kresman:1"))
+        asyncio.run(self.cache.seed(self.client))
+        self.assertEqual(self.cache.find("kresman").image, "whalebone/kresman:1")
+        self.client.containers.items[-1]["State"] = "exited"
+        self.event("container", "die", "d4")
+        self.assertEqual((self.cache.find("kresman").image, self.cache.find("kresman").status),
+                         ("whalebone/kresman:1", "exited"))
+
+    def test_write_through(self):
+        self.cache.renamed("resolver", "resolver-old")
+        self.assertIsNone(self.cache.find("resolver"))
+        self.cache.put(ContainerRecord.from_inspect({"Id": "f6", "Name": "/resolver", "Image": "sha256:e5",
+                                                     "Config": {"Image": "whalebone/resolver:2", "Labels": {}},
+                                                     "State": {"Status": "created"}}))
+        self.cache.status_changed("resolver", "running")
+        self.cache.removed("resolver-old")
+        self.assertEqual([(record.name, record.image) for record in self.cache.get_containers()],
+                         [("resolver", "whalebone/resolver:2")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,167 @@
+import asyncio
+import logging
 import unittest
+from unittest import mock
+from urllib.parse import unquote
 
-from dockertools.compose_tools import *
+from dockertools.compose_translator import create_container_config, create_docker_run_kwargs
+from dockertools.docker_cache import ImageRecord
+from dockertools.docker_connector import DockerConnector, image_reference
+from exception.exc import ContainerException
+
+
+class FakeContainer:
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.renamed = None
+
+    async def rename(self, name: str):
+        await asyncio.sleep(self.delay)
+        self.renamed = name
+
+
+class FakeContainers:
+    def __init__(self, container: FakeContainer):
+        self.instance = container
+
+    def container(self, name: str) -> FakeContainer:
+        return self.instance
+
+
+class FakeImages:
+    def __init__(self, delay: float, failing: list):
+        self.delay = delay
+        self.failing = failing
+        self.pulling = 0
+        self.most = 0
+        self.pulled = []
+
+    async def pull(self, name: str) -> list:
+        self.pulling += 1
+        self.most = max(self.most, self.pulling)
+        await asyncio.sleep(self.delay)
+        self.pulling -= 1
+        if name in self.failing:
+            return [{"error": "manifest unknown"}]
+        self.pulled.append(name)
+        return [{"status": "Downloaded newer image for {}".format(name)}]
+
+
+class FakeDocker:
+    def __init__(self, delay: float = 0, failing: list = None, digests: dict = None):
+        self.containers = FakeContainers(FakeContainer(delay))
+        self.images = FakeImages(delay, failing or [])
+        self.digests = digests or {}
+        self.queries = []
+
+    async def _query_json(self, path: str) -> dict:
+        self.queries.append(path)
+        name = unquote(path[len("distribution/"):-len("/json")])
+        if name not in self.digests:
+            raise ConnectionError("registry unreachable")
+        return {"Descriptor": {"digest": self.digests[name]}}
 
 
 class DockerConnectorTest(unittest.TestCase):
-    # TODO
-    pass
\ No newline at end of file
+    def setUp(self):
+        with mock.patch("loggingtools.logger.build_logger", return_value=logging.getLogger("connector-test")):
+            self.connector = DockerConnector()
+
+    def test_container_config(self):
+        config = create_container_config(create_docker_run_kwargs({
+            "image": "whalebone/resolver:1", "name": "resolver", "net": "host", "ports": ["53:53/udp", "8080:80"],
+            "volumes": ["/etc/whalebone:/etc/whalebone", "/var/log:/var/log:ro"], "environment": {"A": "1"},
+            "restart": "always", "mem_limit": "512m", "logging": {"driver": "json-file", "options": {"max-size": "1m"}}}))
+        self.assertEqual(config["Image"], "whalebone/resolver:1")
+        self.assertEqual(config["Env"], ["A=1"])
+        self.assertEqual(config["ExposedPorts"], {"53/udp": {}, "80/tcp": {}})
+        host_config = config["HostConfig"]
+        self.assertEqual(host_config["NetworkMode"], "host")
+        self.assertEqual(host_config["PortBindings"]["53/udp"], [{"HostPort": "53"}])
+        self.assertEqual(host_config["Binds"], ["/etc/whalebone:/etc/whalebone:rw", "/var/log:/var/log:ro"])
+        self.assertEqual(host_config["Memory"], 512 * 1024 ** 2)
+        self.assertEqual(host_config["RestartPolicy"], {"Name": "always"})
+        self.assertEqual(host_config["LogConfig"], {"Type": "json-file", "Config": {"max-size": "1m"}})
+        with self.assertRaises(Exception):
+            create_container_config({"unknown": True})
+
+    def test_docker_sdk_parameters(self):
+        # composes written for docker sdk run keep working
+        config = create_container_config(create_docker_run_kwargs({
+            "image": "whalebone/passivedns:1", "name": "passivedns", "hostname": "pdns", "user": "1000",
+            "command": "run --verbose", "entrypoint": ["/init"], "environment": ["A=1", "B=x=y"],
+            "cap_drop": ["NET_RAW"], "extra_hosts": {"proxy": "10.0.0.1"}, "devices": ["/dev/net/tun"],
+            "ulimits": {"nofile": {"soft": 1024, "hard": 4096}, "nproc": 512}, "shm_size": "64m"}))
+        self.assertEqual((config["Hostname"], config["User"]), ("pdns", "1000"))
+        self.assertEqual((config["Cmd"], config["Entrypoint"]), (["run", "--verbose"], ["/init"]))
+        self.assertEqual(config["Env"], ["A=1", "B=x=y"])
+        host_config = config["HostConfig"]
+        self.assertEqual(host_config["CapDrop"], ["NET_RAW"])
+        self.assertEqual(host_config["ExtraHosts"], ["proxy:10.0.0.1"])
+        self.assertEqual(host_config["Devices"], [{"PathOnHost": "/dev/net/tun", "PathInContainer": "/dev/net/tun",
+                                                   "CgroupPermissions": "rwm"}])
+        self.assertEqual(host_config["Ulimits"], [{"Name": "nofile", "Soft": 1024, "Hard": 4096},
+                                                  {"Name": "nproc", "Soft": 512, "Hard": 512}])
+        self.assertEqual(host_config["ShmSize"], 64 * 1024 ** 2)
+
+    def test_call_latency_recorded(self):
+        async def run():
+            self.connector.client = FakeDocker()
+            await self.connector.rename_container("resolver", "resolver-old")
+            self.assertEqual(self.connector.client.containers.instance.renamed, "resolver-old")
+        asyncio.run(run())
+        stats = self.connector.stats()["rename"]
+        self.assertEqual((stats["calls"], stats["failures"]), (1, 0))
+
+    def test_call_timeout(self):
+        async def run():
+            self.connector.client, self.connector.timeout = FakeDocker(delay=1), 0.05
+            with self.assertRaises(ContainerException):
+                await self.connector.rename_container("resolver", "resolver-old")
+        asyncio.run(run())
+        self.assertEqual(self.connector.stats()["rename"]["failures"], 1)
+
+    def test_image_reference(self):
+        self.assertEqual(image_reference("whalebone/resolver"), ("whalebone/resolver", "latest", ""))
+        self.assertEqual(image_reference("registry:5000/whalebone/agent"),
+                         ("registry:5000/whalebone/agent", "latest", ""))
+        self.assertEqual(image_reference("registry:5000/agent:1.2"), ("registry:5000/agent", "1.2", ""))
+        self.assertEqual(image_reference("agent@sha256:ab"), ("agent", "", "sha256:ab"))
+
+    def test_prepull_images(self):
+        self.connector.pull_concurrency = 2
+        self.connector.cache.ready = True
+        self.connector.cache.images = {
+            "a": ImageRecord("a", ["whalebone/resolver:1"], ["whalebone/resolver@sha256:1"]),
+            "b": ImageRecord("b", ["whalebone/kresman:1"], ["whalebone/kresman@sha256:1"])}
+        names = ["whalebone/resolver:1", "whalebone/resolver:1", "whalebone/kresman:1", "whalebone/agent:2",
+                 "whalebone/logstream:2", "whalebone/passivedns:2", "whalebone/missing:1"]
+        client = FakeDocker(delay=0.05, failing=["whalebone/kresman:1", "whalebone/missing:1"],
+                            digests={"whalebone/resolver:1": "sha256:1", "whalebone/kresman:1": "sha256:2"})
+
+        async def run():
+            self.connector.client = client
+            return await self.connector.prepull_images(names)
+        results = asyncio.run(run())
+        self.assertEqual({name: result["status"] for name, result in results.items()}, {
+            "whalebone/resolver:1": "present", "whalebone/kresman:1": "cached", "whalebone/agent:2": "pulled",
+            "whalebone/logstream:2": "pulled", "whalebone/passivedns:2": "pulled", "whalebone/missing:1": "failed"})
+        self.assertEqual(results["whalebone/missing:1"]["error"], "manifest unknown")
+        self.assertEqual(client.images.most, 2)
+        self.assertNotIn("whalebone/resolver:1", client.images.pulled)
+        self.assertEqual(self.connector.pulls, results)
+
+    def test_remote_digest_quoted(self):
+        image = "harbor.whalebone.io/whalebone/resolver:1"
+        client = FakeDocker(digests={image: "sha256:1"})
+
+        async def run():
+            self.connector.client = client
+            return await self.connector.remote_digest(image)
+        self.assertEqual(asyncio.run(run()), "sha256:1")
+        self.assertEqual(client.queries, ["distribution/harbor.whalebone.io%2Fwhalebone%2Fresolver%3A1/json"])
+        self.assertEqual(self.connector.stats()["distribution"]["calls"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+
+from dockertools.compose_translator import create_container_config, create_docker_run_kwargs
+from dockertools.docker_cache import ImageRecord
+from dockertools.upgrade_planner import UpgradePlanner, config_changes
+from exception.exc import ContainerException
+
+SERVICE = {"image": "whalebone/kresman:2", "name": "kresman", "net": "host", "restart": "always",
+           "environment": {"A": "1"}, "volumes": ["/etc/whalebone:/etc/whalebone"], "labels": {"version": "2"}}
+IMAGE_CONFIG = {"Env": ["PATH=/usr/bin", "A=0"], "Labels": {"maintainer": "whalebone"},
+                "ExposedPorts": {"8080/tcp": {}}}
+
+
+def running_inspect(definition: dict, image_id: str = "sha256:new", running: bool = True) -> dict:
+    # engine merges image defaults into what the container was created with
+    config = create_container_config(create_docker_run_kwargs(dict(definition)))
+    host_config = dict({"Memory": 0, "Privileged": False, "CapAdd": None}, **config.pop("HostConfig"))
+    host_config["RestartPolicy"] = dict(host_config["RestartPolicy"], MaximumRetryCount=0)
+    config["Env"] = config["Env"] + ["PATH=/usr/bin"]
+    config["Labels"] = dict(config["Labels"], maintainer="whalebone")
+    config["ExposedPorts"] = dict(config.get("ExposedPorts", {}), **IMAGE_CONFIG["ExposedPorts"])
+    return {"Image": image_id, "Config": config, "HostConfig": host_config, "State": {"Running": running}}
+
+
+class FakeConnector:
+    def __init__(self, containers: dict, remote: bool = True):
+        self.containers = containers
+        self.remote = remote
+        self.images = [ImageRecord("sha256:new", ["whalebone/kresman:2"], ["whalebone/kresman@sha256:2"]),
+                       ImageRecord("sha256:old", ["whalebone/logstream:1"], [])]
+
+    async def get_images(self) -> list:
+        return self.images
+
+    async def inspect_config(self, name: str) -> dict:
+        if name not in self.containers:
+            raise ContainerException("No such container: {}".format(name))
+        return self.containers[name]
+
+    async def inspect_image(self, image_name: str) -> dict:
+        return {"Id": image_name, "Config": IMAGE_CONFIG}
+
+    async def image_present(self, image_name: str, images: list) -> bool:
+        return self.remote
+
+
+class UpgradePlannerTest(unittest.TestCase):
+    def plan(self, containers: dict, services: dict, config: list = None, remote: bool = True,
+             check_registry: bool = False) -> dict:
+        planner = UpgradePlanner(FakeConnector(containers, remote))
+        return asyncio.run(planner.plan({"services": services}, list(services), config, check_registry))
+
+    def test_unchanged_and_restart(self):
+        plan = self.plan({"kresman": running_inspect(SERVICE)}, {"kresman": dict(SERVICE)})
+        self.assertEqual(plan["kresman"], {"action": "unchanged", "changes": []})
+        plan = self.plan({"kresman": running_inspect(SERVICE, running=False)}, {"kresman": dict(SERVICE)})
+        self.assertEqual(plan["kresman"]["action"], "restart")
+
+    def test_recreate(self):
+        changed = dict(SERVICE, environment={"A": "2"}, volumes=["/etc/whalebone:/etc/whalebone:ro"])
+        plan = self.plan({"kresman": running_inspect(SERVICE)}, {"kresman": changed, "resolver": dict(SERVICE)})
+        self.assertEqual(plan["kresman"], {"action": "recreate", "changes": ["environment", "HostConfig.Binds"]})
+        self.assertEqual(plan["resolver"], {"action": "recreate", "changes": ["missing"]})
+
+    def test_moved_tag(self):
+        plan = self.plan({"kresman": running_inspect(SERVICE, image_id="sha256:old")}, {"kresman": dict(SERVICE)})
+        self.assertEqual(plan["kresman"], {"action": "recreate", "changes": ["image"]})
+
+    def test_registry_checked_in_dry_run(self):
+        services = {"kresman": dict(SERVICE)}
+        containers = {"kresman": running_inspect(SERVICE)}
+        self.assertEqual(self.plan(containers, services, remote=False, check_registry=True)["kresman"]["action"],
+                         "recreate")
+        self.assertEqual(self.plan(containers, services, remote=True, check_registry=True)["kresman"]["action"],
+                         "unchanged")
+
+    def test_resolver_config(self):
+        resolver = dict(SERVICE, name="resolver")
+        plan = self.plan({"resolver": running_inspect(resolver)}, {"resolver": resolver}, config=["-- new"])
+        self.assertEqual(plan["resolver"], {"action": "recreate", "changes": ["config"]})
+
+    def test_removed_settings(self):
+        desired = create_container_config(create_docker_run_kwargs(dict(SERVICE)))
+        inspect = running_inspect(dict(SERVICE, mem_limit="1g", ports=["8080:80"]))
+        self.assertEqual(config_changes(desired, inspect, IMAGE_CONFIG),
+                         ["ports", "HostConfig.PortBindings", "HostConfig.Memory"])
+
+    def test_removed_environment(self):
+        running = running_inspect(dict(SERVICE, environment={"A": "1", "DEBUG": "1"}))
+        plan = self.plan({"kresman": running}, {"kresman": dict(SERVICE)})
+        self.assertEqual(plan["kresman"], {"action": "recreate", "changes": ["environment"]})
+
+    def test_removed_label(self):
+        running = running_inspect(dict(SERVICE, labels={"version": "2", "stale": "1"}))
+        plan = self.plan({"kresman": running}, {"kresman": dict(SERVICE)})
+        self.assertEqual(plan["kresman"], {"action": "recreate", "changes": ["labels"]})
+
+    def test_command(self):
+        service = dict(SERVICE, command="serve --port 8080")
+        plan = self.plan({"kresman": running_inspect(service)}, {"kresman": dict(service)})
+        self.assertEqual(plan["kresman"]["action"], "unchanged")
+        plan = self.plan({"kresman": running_inspect(service)}, {"kresman": dict(service, command="serve")})
+        self.assertEqual(plan["kresman"], {"action": "recreate", "changes": ["Cmd"]})
+        plan = self.plan({"kresman": running_inspect(service)}, {"kresman": dict(SERVICE)})
+        self.assertEqual(plan["kresman"], {"action": "recreate", "changes": ["Cmd"]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from aiohttp import web
+
+from dockertools.docker_cache import ContainerRecord, ImageRecord
+from dockertools.compose_translator import create_docker_run_kwargs
+from dockertools.docker_connector import DockerConnector
+from exception.exc import ContainerException
+from lr_agent_client import LRAgentClient
+
+
+def build_connector() -> DockerConnector:
+    with mock.patch("loggingtools.logger.build_logger", return_value=logging.getLogger("client-test")):
+        return DockerConnector()
+
+
+def build_client(connector, **kwargs) -> LRAgentClient:
+    with mock.patch("lr_agent_client.build_logger", return_value=logging.getLogger("client-test")), \
+            mock.patch.object(LRAgentClient, "enable_websocket_log"):
+        return LRAgentClient(None, docker_connector=connector, **kwargs)
+
+
+class ListContainersTest(unittest.TestCase):
+    def test_cache_records(self):
+        connector = build_connector()
+        connector.cache.ready = True
+        connector.cache.put(ContainerRecord("a1b2c3d4e5f6a7b8", "resolver", "whalebone/resolver:1",
+                                            "sha256:0123456789abcdef", "running", {"resolver": "1.2", "other": "x"}))
+        connector.cache.put(ContainerRecord("f6e5d4c3b2a1", "kresman", "whalebone/kresman:1", "sha256:fedcba",
+                                            "exited", {}))
+        connector.cache.images = {"sha256:0123456789abcdef": ImageRecord("sha256:0123456789abcdef",
+                                                                         ["whalebone/resolver:1"], [])}
+        client = build_client(connector)
+        self.assertEqual(asyncio.run(client.list_containers()), [{
+            "id": "a1b2c3d4e5", "image": {"id": "0123456789ab", "tags": ["whalebone/resolver:1"]},
+            "labels": {"resolver": "1.2"}, "name": "resolver", "status": "running"}])
+
+
+class ExclusiveLockTest(unittest.TestCase):
+    def test_validate_host_waits_for_request_of_old_connection(self):
+        async def run():
+            lock = asyncio.Lock()
+            old = build_client(build_connector(), exclusive_lock=lock)
+            new = build_client(build_connector(), exclusive_lock=lock)
+            self.assertIn("restart", new.exclusive_actions)
+            events = []
+
+            async def upgrade(request: dict):
+                events.append("upgrade start")
+                await asyncio.sleep(0.1)
+                events.append("upgrade end")
+
+            async def check_running_services():
+                events.append("validate")
+            old.dispatcher.handler = upgrade
+            new.check_running_services = check_running_services
+            with tempfile.TemporaryDirectory() as folder:
+                os.makedirs(os.path.join(folder, "etc", "agent"))
+                open(os.path.join(folder, "etc", "agent", "docker-compose.yml"), "w").close()
+                new.folder = "{}/".format(folder)
+                old.dispatcher.dispatch("upgrade", {"action": "upgrade"})
+                await asyncio.sleep(0)
+                await new.validate_host()
+            self.assertEqual(events, ["upgrade start", "upgrade end", "validate"])
+        asyncio.run(run())
+
+    def test_acknowledged_while_waiting_for_lock(self):
+        async def run():
+            lock = asyncio.Lock()
+            frames = asyncio.Queue()
+            client = build_client(build_connector(), exclusive_lock=lock)
+            client.websocket = mock.Mock(recv=frames.get)
+            handled = []
+
+            async def handle_request(request: dict):
+                handled.append(request["action"])
+            client.dispatcher.handler = handle_request
+            await lock.acquire()
+            listening = asyncio.ensure_future(client.listen())
+            await frames.put(client.codec.encode({"requestId": "1", "action": "upgrade", "data": {}}))
+            entry = await asyncio.wait_for(client.outbound_queue.get(), 1)
+            self.assertEqual((entry.message["action"], entry.message["requestId"], entry.message["data"]["message"]),
+                             ("upgrade", "1", "Command received"))
+            self.assertEqual(handled, [])
+            lock.release()
+            await asyncio.sleep(0.01)
+            self.assertEqual(handled, ["upgrade"])
+            listening.cancel()
+        asyncio.run(run())
+
+
+class SysInfoAckTest(unittest.TestCase):
+    def test_confirmation_not_dispatched(self):
+        async def run():
+            frames = asyncio.Queue()
+            client = build_client(build_connector())
+            client.websocket = mock.Mock(recv=frames.get)
+            client.sysinfo_delta.sent(1, {"cpu": 1})
+            listening = asyncio.ensure_future(client.listen())
+            await frames.put(client.codec.encode({"action": "sysinfo_ack", "data": {"sequence": 1}}))
+            await asyncio.sleep(0.01)
+            listening.cancel()
+            self.assertTrue(client.sysinfo_delta.confirmed_by_proxy)
+            self.assertEqual(client.dispatcher.stats()["actions"], {})
+            self.assertEqual(sum(client.outbound_queue.stats()["depth"].values()), 0)
+        asyncio.run(run())
+
+
+class RunningComposeTest(unittest.TestCase):
+    COMPOSE = "\n".join(("version: '3'", "services:", "  lr-agent:", "    image: whalebone/agent:2",
+                         "    environment:", "      CLIENT_CRT_BASE64: ''"))
+
+    def test_cached_compose_not_modified_by_callers(self):
+        client = build_client(build_connector())
+        with tempfile.TemporaryDirectory() as folder:
+            client.folder = "{}/".format(folder)
+            os.makedirs("{}/etc/agent".format(folder))
+            with open("{}/etc/agent/docker-compose.yml".format(folder), "w") as compose:
+                compose.write(self.COMPOSE)
+            with mock.patch("dockertools.compose_translator.read_file", return_value="Y2VydA=="):
+                kwargs = create_docker_run_kwargs(client.load_running_compose()["services"]["lr-agent"])
+            self.assertEqual(kwargs["environment"]["CLIENT_CRT_BASE64"], "Y2VydA==")
+            # the cert contents are filled in on the copy, the cached compose keeps the empty value
+            self.assertEqual(client.load_running_compose()["services"]["lr-agent"]["environment"],
+                             {"CLIENT_CRT_BASE64": ""})
+            self.assertIsNot(client.load_running_compose(), client.load_running_compose())
+
+
+class StagedUpgradeTest(unittest.TestCase):
+    COMPOSE = "\n".join(("version: '3'", "services:", "  kresman:", "    image: whalebone/kresman:2",
+                         "  logstream:", "    image: whalebone/logstream:2",
+                         "  passivedns:", "    image: whalebone/passivedns:2", "    depends_on:", "      - logstream"))
+
+    def test_independent_services_upgraded_together(self):
+        async def run():
+            connector = build_connector()
+            running = []
+
+            async def start_service(compose: dict, pull: bool = True):
+                running.append(compose["name"])
+                started.append(list(running))
+                await asyncio.sleep(0.1)
+                running.remove(compose["name"])
+                if compose["name"] == "logstream":
+                    raise ContainerException("port 5044 is already allocated")
+
+            async def inspect_config(name: str):
+                raise ContainerException("No such container: {}".format(name))
+            connector.start_service = start_service
+            connector.inspect_config = inspect_config
+            connector.get_containers = mock.AsyncMock(return_value=[])
+            connector.get_images = mock.AsyncMock(return_value=[])
+            connector.prepull_images = mock.AsyncMock(side_effect=lambda images: {
+                image: {"status": "present"} for image in images})
+            client = build_client(connector)
+            with tempfile.TemporaryDirectory() as folder:
+                client.folder = "{}/".format(folder)
+                return await client.upgrade_container(self.COMPOSE)
+        started = []
+        status = asyncio.run(run())
+        self.assertEqual(started, [["kresman"], ["kresman", "logstream"]])
+        # kresman and logstream share the first stage, passivedns waits for logstream and is skipped
+        self.assertEqual(status["kresman"]["status"], "success")
+        self.assertEqual(status["kresman"]["timeline"]["stage"], 0)
+        self.assertEqual(status["logstream"]["timeline"]["stage"], 0)
+        self.assertLess(status["logstream"]["timeline"]["start"], status["kresman"]["timeline"]["end"])
+        self.assertLess(status["kresman"]["timeline"]["end"], 0.2)
+        self.assertEqual(status["logstream"], dict(status["logstream"], status="failure",
+                                                   message="failed to start new logstream"))
+        self.assertEqual(status["passivedns"]["timeline"]["stage"], 1)
+        self.assertEqual({key: status["passivedns"][key] for key in ("status", "message", "body")},
+                         {"status": "failure", "message": "dependencies of passivedns failed to upgrade",
+                          "body": "['logstream']"})
+
+
+class BlockingRequestsTest(unittest.TestCase):
+    def test_datacollect_keeps_loop_running(self):
+        async def run():
+            client = build_client(build_connector())
+            ticks = []
+
+            async def gather_static_files(folder: str):
+                pass
+
+            async def ticker():
+                while True:
+                    ticks.append(time.monotonic())
+                    await asyncio.sleep(0.01)
+            client.gather_static_files = gather_static_files
+            client.pack_logs = lambda logs_zip, folder: time.sleep(0.1)
+            client.upload_logs = lambda logs_zip, url: time.sleep(0.1) or {"status": "success"}
+            with tempfile.TemporaryDirectory() as folder:
+                client.folder = "{}/".format(folder)
+                task = asyncio.ensure_future(ticker())
+                self.assertEqual(await client.pack_files("http://127.0.0.1/hook"), {"status": "success"})
+                task.cancel()
+            self.assertGreater(len(ticks), 10)
+        asyncio.run(run())
+
+    def test_trace(self):
+        async def trace(request):
+            if request.match_info["domain"] == "fail.io":
+                return web.Response(status=500, text="no answer")
+            return web.Response(text="{} {}".format(request.match_info["domain"], request.match_info["type"]))
+
+        async def run():
+            app = web.Application()
+            app.router.add_get("/trace/{domain}/{type}", trace)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            client = build_client(build_connector())
+            with mock.patch.dict(os.environ, {"TRACE_LISTENER": "http://127.0.0.1:{}".format(port)}):
+                self.assertEqual(await client.trace_domain("whalebone.io", "A"),
+                                 {"status": "success", "trace": "whalebone.io A"})
+                self.assertEqual(await client.trace_domain("fail.io", "A"),
+                                 {"status": "failure", "message": "Trace failed", "error": "no answer"})
+            with mock.patch.dict(os.environ, {"TRACE_LISTENER": "http://127.0.0.1:1"}):
+                self.assertEqual((await client.trace_domain("whalebone.io", "A"))["status"], "failure")
+            await runner.cleanup()
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from resolvertools.control_socket import ControlSocketPool
+
+
+class FakeKresd:
+    # answers REPL commands the way kresd control socket does, reply followed by prompt
+    def __init__(self, path: str, greeting: bool = False, delay: float = 0):
+        self.path = path
+        self.greeting = greeting
+        self.delay = delay
+        self.server = None
+        self.connections = 0
+        self.writers = []
+
+    async def start(self):
+        self.server = await asyncio.start_unix_server(self.handle, self.path)
+
+    async def stop(self):
+        # recycled kresd process takes its open connections down with it
+        for writer in self.writers:
+            writer.close()
+        self.server.close()
+        await self.server.wait_closed()
+        os.remove(self.path)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self.writers.append(writer)
+        if self.greeting:
+            writer.write(b"> ")
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode("utf-8").strip()
+            await asyncio.sleep(self.delay)
+            if command == "stats.list()":
+                reply = "\n".join("[answer.{}ms] => {}".format(index, index) for index in range(10000))
+            else:
+                reply = "{} done".format(command)
+            writer.write("{}\n> ".format(reply).encode("utf-8"))
+            await writer.drain()
+        writer.close()
+
+
+class ControlSocketTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.pool = ControlSocketPool(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_large_reply_framed_by_prompt(self):
+        async def run():
+            kresd = FakeKresd(self.pool.path("1"), greeting=True)
+            await kresd.start()
+            stats = await self.pool.execute("1", "stats.list()")
+            self.assertGreater(len(stats), 65535)
+            self.assertTrue(stats.endswith("[answer.9999ms] => 9999"))
+            self.assertEqual(await self.pool.execute("1", "cache.clear()"), "cache.clear() done")
+            self.assertEqual(kresd.connections, 1)
+            self.pool.close()
+            await kresd.stop()
+        asyncio.run(run())
+
+    def test_commands_do_not_interleave(self):
+        async def run():
+            kresd = FakeKresd(self.pool.path("1"), delay=0.01)
+            await kresd.start()
+            replies = await asyncio.gather(*[self.pool.execute("1", "command{}".format(index))
+                                             for index in range(5)])
+            self.assertEqual(replies, ["command{} done".format(index) for index in range(5)])
+            self.pool.close()
+            await kresd.stop()
+        asyncio.run(run())
+
+    def test_reconnect_after_recycle(self):
+        async def run():
+            kresd = FakeKresd(self.pool.path("1"))
+            await kresd.start()
+            await self.pool.execute("1", "first")
+            await kresd.stop()
+            kresd = FakeKresd(self.pool.path("1"))
+            await kresd.start()
+            self.assertEqual(await self.pool.execute("1", "second"), "second done")
+            self.assertEqual(self.pool.stats()["1"]["connects"], 2)
+            self.pool.close()
+            await kresd.stop()
+        asyncio.run(run())
+
+    def test_timeout_drops_connection(self):
+        async def run():
+            kresd = FakeKresd(self.pool.path("1"), delay=0.2)
+            await kresd.start()
+            with self.assertRaises(asyncio.TimeoutError):
+                await self.pool.execute("1", "slow", timeout=0.05)
+            self.assertFalse(self.pool.stats()["1"]["connected"])
+            self.assertEqual(await self.pool.execute("1", "next", timeout=1), "next done")
+            self.pool.close()
+            await kresd.stop()
+        asyncio.run(run())
+
+    def test_broadcast_with_hung_instance(self):
+        async def run():
+            instances = [FakeKresd(self.pool.path(str(index)), delay=0.01) for index in range(8)]
+            instances.append(FakeKresd(self.pool.path("hung"), delay=10))
+            for kresd in instances:
+                await kresd.start()
+            start = asyncio.get_running_loop().time()
+            replies = await self.pool.broadcast("cache.clear()", timeout=0.2)
+            self.assertLess(asyncio.get_running_loop().time() - start, 0.5)
+            self.assertIsInstance(replies.pop("hung"), asyncio.TimeoutError)
+            self.assertEqual(replies, {str(index): "cache.clear() done" for index in range(8)})
+            self.pool.close()
+            for kresd in instances:
+                await kresd.stop()
+        asyncio.run(run())
+
+    def test_vanished_instance_removed(self):
+        async def run():
+            kresd = FakeKresd(self.pool.path("1"))
+            await kresd.start()
+            await self.pool.execute("1", "first")
+            await kresd.stop()
+            self.assertEqual(self.pool.instances(), [])
+            self.assertEqual(self.pool.stats(), {})
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
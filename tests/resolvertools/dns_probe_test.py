@@ -0,0 +1,73 @@
+import asyncio
+import os
+import unittest
+from unittest import mock
+
+from resolvertools.dns_probe import DnsProbe, build_query, parse_response
+from tests.resolvertools.stub_dns import StubDnsServer
+
+
+class DnsProbeTest(unittest.TestCase):
+    def setUp(self):
+        self.environment = mock.patch.dict(os.environ, {"DNS_TIMEOUT": "0.2", "DNS_PROBE_DOMAINS": "a.test,b.test"})
+        self.environment.start()
+
+    def tearDown(self):
+        self.environment.stop()
+
+    async def probe(self, server: StubDnsServer) -> tuple:
+        await server.start()
+        probe = DnsProbe([server.host], server.port)
+        try:
+            return probe, await probe.check()
+        finally:
+            await server.stop()
+
+    def test_query_format(self):
+        query = build_query(0x1234, "www.example.com.")
+        self.assertEqual(parse_response(query), (0x1234, 0, 0))
+        self.assertIn(b"\x03www\x07example\x03com\x00", query)
+
+    def test_healthy_resolver(self):
+        async def run():
+            server = StubDnsServer()
+            _, result = await self.probe(server)
+            self.assertEqual(result["status"], "ok")
+            self.assertEqual(result["success_ratio"], 1.0)
+            self.assertEqual(result["addresses"]["127.0.0.1"]["tcp"]["status"], "ok")
+            self.assertIsNotNone(result["rtt_max"])
+            self.assertEqual(server.queries, 4)
+        asyncio.run(run())
+
+    def test_servfail(self):
+        async def run():
+            _, result = await self.probe(StubDnsServer(rcode=2))
+            self.assertEqual(result["status"], "fail")
+            self.assertEqual(result["failures"][0]["error"], "rcode 2")
+        asyncio.run(run())
+
+    def test_probes_run_concurrently(self):
+        async def run():
+            start = asyncio.get_running_loop().time()
+            _, result = await self.probe(StubDnsServer(silent=True))
+            self.assertLess(asyncio.get_running_loop().time() - start, 0.4)
+            self.assertEqual(result["success_ratio"], 0.0)
+            self.assertEqual({failure["error"] for failure in result["failures"]}, {"timeout"})
+        asyncio.run(run())
+
+    def test_result_cached(self):
+        async def run():
+            server = StubDnsServer()
+            await server.start()
+            probe = DnsProbe([server.host], server.port)
+            first, second = await asyncio.gather(probe.check(), probe.check())
+            self.assertIs(first, second)
+            self.assertIs(await probe.check(), first)
+            self.assertIsNot(await probe.check(max_age=0), first)
+            self.assertEqual(server.queries, 8)
+            await server.stop()
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import os
+import unittest
+from unittest import mock
+
+from resolvertools.latency import LatencyTracker, bucket_vector, percentile
+
+
+class LatencyTest(unittest.TestCase):
+    def test_percentile_interpolated_in_bucket(self):
+        vector = bucket_vector({"answer.1ms": 50, "answer.10ms": 40, "answer.50ms": 10})
+        self.assertEqual(percentile(vector, 50), 1.0)
+        self.assertEqual(percentile(vector, 95), 30.0)
+        self.assertEqual(percentile(vector, 99), 46.0)
+
+    def test_slow_answers(self):
+        self.assertEqual(percentile(bucket_vector({"answer.1ms": 1, "answer.slow": 99}), 99), 1500.0)
+
+    def test_no_answers(self):
+        self.assertIsNone(percentile(bucket_vector({"answer.total": 0}), 50))
+
+    def test_host_and_window(self):
+        with mock.patch.dict(os.environ, {"LATENCY_WINDOW": "2"}):
+            tracker = LatencyTracker()
+        tracker.update({"1": {"answer.1ms": 100}, "2": {"answer.1ms": 100}})
+        tracker.update({"1": {"answer.1500ms": 100}, "2": {"answer.1ms": 100}})
+        result = tracker.update({"1": {"answer.1500ms": 100}})
+        self.assertEqual(result["p50"], 1250.0)
+        self.assertEqual(result["instances"]["1"]["window"]["p50"], 1250.0)
+        self.assertEqual(result["window"]["p50"], 1125.0)
+        self.assertNotIn("2", tracker.windows)
+
+
+if __name__ == '__main__':
+    unittest.main()
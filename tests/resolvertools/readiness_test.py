@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from resolvertools.control_socket import ControlSocketPool
+from resolvertools.dns_probe import DnsProbe
+from resolvertools.readiness import INSTANCE_STEPS, ResolverReadiness
+from sysinfo.proc_inspector import ProcInspector
+from sysinfo.sys_info import SystemInfo
+from tests.resolvertools.control_socket_test import FakeKresd
+from tests.resolvertools.stub_dns import StubDnsServer
+from tests.sysinfo.sys_info_test import FakeConnector, build_proc, listen
+
+
+class ResolverReadinessTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.environment = mock.patch.dict(os.environ, {"RESOLVER_READY_INTERVAL": "0.01",
+                                                        "RESOLVER_READY_TIMEOUT": "1",
+                                                        "RESOLVER_READY_QUERY_TIMEOUT": "0.1"})
+        self.environment.start()
+        self.pool = ControlSocketPool(self.directory.name)
+        self.port = "fail"
+
+    def tearDown(self):
+        self.environment.stop()
+        self.directory.cleanup()
+
+    async def check_port(self) -> str:
+        return self.port
+
+    def readiness(self, server: StubDnsServer) -> ResolverReadiness:
+        return ResolverReadiness(self.pool, DnsProbe([server.host], server.port), self.check_port)
+
+    def test_ready_when_new_instance_answers(self):
+        async def run():
+            server, old = StubDnsServer(), FakeKresd(self.pool.path("1"))
+            await server.start()
+            await old.start()
+            readiness = self.readiness(server)
+            before = readiness.sockets()
+            # old kresd is connected to, the new one reuses its socket name
+            await self.pool.execute("1", "worker.id")
+            waiting = asyncio.ensure_future(readiness.wait(before))
+            await asyncio.sleep(0.05)
+            self.assertFalse(waiting.done())
+            await old.stop()
+            new = FakeKresd(self.pool.path("1"))
+            await new.start()
+            self.port = "ok"
+            result = await waiting
+            self.assertTrue(result["ready"])
+            self.assertEqual(list(result["steps"]), ["control_socket", "port", "dns"])
+            self.assertLess(result["seconds"], 0.5)
+            self.assertGreater(result["attempts"], 1)
+            self.assertEqual(new.connections, 1)
+            self.pool.close()
+            await new.stop()
+            await server.stop()
+        asyncio.run(run())
+
+    def test_not_ready_when_resolving_fails(self):
+        async def run():
+            server = StubDnsServer(rcode=2)
+            await server.start()
+            readiness = self.readiness(server)
+            before = readiness.sockets()
+            kresd = FakeKresd(self.pool.path("7"))
+            await kresd.start()
+            self.port = "ok"
+            result = await readiness.wait(before)
+            self.assertFalse(result["ready"])
+            self.assertEqual(list(result["steps"]), ["control_socket", "port"])
+            self.assertGreaterEqual(result["seconds"], 1)
+            self.pool.close()
+            await kresd.stop()
+            await server.stop()
+        asyncio.run(run())
+
+    def test_without_control_sockets(self):
+        async def run():
+            server = StubDnsServer()
+            await server.start()
+            self.pool.directory = os.path.join(self.directory.name, "missing")
+            readiness = self.readiness(server)
+            self.port = "ok"
+            result = await readiness.wait(readiness.sockets())
+            self.assertTrue(result["ready"])
+            self.assertEqual(result["attempts"], 1)
+            await server.stop()
+        asyncio.run(run())
+
+    def test_port_of_new_container(self):
+        async def run():
+            server = StubDnsServer()
+            await server.start()
+            connector = FakeConnector()
+            connector.cache.ready = True
+            connector.add("resolver", "old", 1000)
+            sysinfo = SystemInfo(connector, logging.getLogger("readiness-test"))
+            sysinfo.proc_inspector = ProcInspector(proc)
+            self.pool.directory = os.path.join(self.directory.name, "missing")
+            readiness = sysinfo.readiness
+            readiness.dns_probe = DnsProbe([server.host], server.port)
+            readiness.control_sockets = self.pool
+            self.assertEqual(await sysinfo.check_port(), "ok")
+            # upgrade renames the listening resolver and starts a new one under its name
+            connector.rename("resolver", "resolver-old")
+            connector.add("resolver", "new", 2000)
+            result = await readiness.wait(readiness.sockets())
+            self.assertFalse(result["ready"])
+            self.assertNotIn("port", result["steps"])
+            listen(proc, 2010)
+            self.assertTrue((await readiness.wait(readiness.sockets()))["ready"])
+            await server.stop()
+        proc = os.path.join(self.directory.name, "proc")
+        build_proc(proc)
+        asyncio.run(run())
+
+    def test_dns_probed_after_old_instance_stopped(self):
+        async def run():
+            # shared address answered by the old resolver, the instance steps do not depend on it
+            server = StubDnsServer(rcode=2)
+            await server.start()
+            self.pool.directory = os.path.join(self.directory.name, "missing")
+            readiness = self.readiness(server)
+            self.port = "ok"
+            result = await readiness.wait(readiness.sockets(), INSTANCE_STEPS)
+            self.assertTrue(result["ready"])
+            self.assertEqual(list(result["steps"]), ["control_socket", "port"])
+            self.assertEqual(server.queries, 0)
+            await server.stop()
+            self.assertFalse((await readiness.wait({}, ("dns",)))["ready"])
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
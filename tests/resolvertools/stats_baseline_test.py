@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+import unittest
+
+from resolvertools.stats_baseline import StatsBaseline
+
+
+class StatsBaselineTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "kres_stats.json")
+        self.baseline = StatsBaseline(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_first_cycle_without_checkpoint(self):
+        self.assertEqual(self.baseline.update({"1": {"answer.total": 10}}, ["1"]), {})
+        self.assertEqual(self.baseline.update({"1": {"answer.total": 15, "worker.concurrent": 3}}, ["1"]),
+                         {"1": {"answer.total": 5, "worker.concurrent": 3}})
+
+    def test_deltas_per_instance(self):
+        self.baseline.update({"1": {"answer.total": 10}, "2": {"answer.total": 100}}, ["1", "2"])
+        self.assertEqual(self.baseline.update({"1": {"answer.total": 12}, "2": {"answer.total": 103}}, ["1", "2"]),
+                         {"1": {"answer.total": 2}, "2": {"answer.total": 3}})
+
+    def test_restart_detected(self):
+        self.baseline.update({"1": {"answer.total": 1000, "answer.noerror": 900}}, ["1"])
+        self.assertEqual(self.baseline.update({"1": {"answer.total": 7, "answer.noerror": 900}}, ["1"]),
+                         {"1": {"answer.total": 7, "answer.noerror": 900}})
+        self.assertEqual(self.baseline.stats()["resets"], 1)
+
+    def test_new_and_vanished_instance(self):
+        self.baseline.update({"1": {"answer.total": 10}}, ["1"])
+        self.assertEqual(self.baseline.update({"2": {"answer.total": 4}}, ["2"]), {"2": {"answer.total": 4}})
+        self.assertNotIn("1", self.baseline.baselines)
+
+    def test_checkpoint_restores_baselines(self):
+        self.baseline.update({"1": {"answer.total": 10}}, ["1"])
+        self.baseline.checkpoint()
+        self.assertFalse(os.path.exists("{}.tmp".format(self.path)))
+        restarted = StatsBaseline(self.path)
+        self.assertEqual(restarted.update({"1": {"answer.total": 25}}, ["1"]), {"1": {"answer.total": 15}})
+
+    def test_checkpoint_interval(self):
+        self.baseline.checkpoint()
+        self.baseline.checkpoint()
+        self.assertEqual(self.baseline.stats()["checkpoints"], 1)
+        self.baseline.checkpoint(force=True)
+        self.assertEqual(self.baseline.stats()["checkpoints"], 2)
+
+    def test_legacy_checkpoint_ignored(self):
+        with open(self.path, "w") as file:
+            json.dump({"answer.total": 10}, file)
+        self.assertEqual(self.baseline.update({"1": {"answer.total": 25}}, ["1"]), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
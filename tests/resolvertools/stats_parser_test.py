@@ -0,0 +1,39 @@
+import unittest
+
+from resolvertools.stats_parser import StatRecord, numeric_stats, parse_output
+from tests.benchmarks.messages import cache_stats_output, stats_list_output, worker_stats_output
+
+
+class StatsParserTest(unittest.TestCase):
+    def test_arrow_notation(self):
+        output = "[answer.total] => 15\n[answer.1ms] => 3\n[upstream.ns-1.example.rtt] => 12\n> "
+        self.assertEqual(numeric_stats(output), {"answer.total": 15, "answer.1ms": 3, "upstream.ns-1.example.rtt": 12})
+
+    def test_table_notation(self):
+        output = "{\n    ['answer.total'] = 15,\n    ['request.doh'] = 0,\n}\n> "
+        self.assertEqual(parse_output(output), [StatRecord("answer.total", 15), StatRecord("request.doh", 0)])
+
+    def test_typed_values(self):
+        output = "> {\n    ['rss'] = 37625856,\n    ['usertime'] = 1.217,\n    ['enabled'] = true,\n" \
+                 "    ['name'] = 'kresd',\n    ['missing'] = nil,\n}"
+        self.assertEqual({record.name: record.value for record in parse_output(output)},
+                         {"rss": 37625856, "usertime": 1.217, "enabled": True, "name": "kresd", "missing": None})
+        self.assertEqual(numeric_stats(output), {"rss": 37625856, "usertime": 1.217})
+
+    def test_nested_tables(self):
+        output = "{\n    ['tcp'] = {\n        ['ipv4'] = 4,\n    },\n    ['udp'] = 7,\n}"
+        self.assertEqual(numeric_stats(output), {"tcp.ipv4": 4, "udp": 7})
+
+    def test_recorded_outputs(self):
+        self.assertEqual(len(numeric_stats(stats_list_output(entries=500))), 500)
+        self.assertEqual(numeric_stats(stats_list_output(entries=500, table=False)),
+                         numeric_stats(stats_list_output(entries=500)))
+        self.assertEqual(numeric_stats(worker_stats_output())["systime"], 0.398)
+        self.assertEqual(numeric_stats(cache_stats_output())["count_entries"], 20117)
+
+    def test_garbage_ignored(self):
+        self.assertEqual(parse_output("error: attempt to call a nil value\n\n}"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import asyncio
+import struct
+
+from resolvertools.dns_probe import parse_response
+
+
+class StubDnsProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        asyncio.ensure_future(self.respond(data, addr))
+
+    async def respond(self, data: bytes, addr):
+        response = await self.server.answer(data)
+        if response is not None:
+            self.transport.sendto(response, addr)
+
+
+class StubDnsServer:
+    # answers every A query with 192.0.2.1 over UDP and TCP, behaviour is adjustable for failure tests
+    def __init__(self, host: str = "127.0.0.1", rcode: int = 0, delay: float = 0, silent: bool = False):
+        self.host = host
+        self.rcode = rcode
+        self.delay = delay
+        self.silent = silent
+        self.port = None
+        self.queries = 0
+        self.udp = None
+        self.tcp = None
+
+    async def start(self):
+        self.tcp = await asyncio.start_server(self.handle_tcp, self.host, 0)
+        self.port = self.tcp.sockets[0].getsockname()[1]
+        self.udp, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: StubDnsProtocol(self), local_addr=(self.host, self.port))
+
+    async def stop(self):
+        self.udp.close()
+        self.tcp.close()
+        await self.tcp.wait_closed()
+
+    async def answer(self, query: bytes):
+        self.queries += 1
+        await asyncio.sleep(self.delay)
+        if self.silent:
+            return None
+        query_id = parse_response(query)[0]
+        answers = 0 if self.rcode else 1
+        header = struct.pack("!HHHHHH", query_id, 0x8180 | self.rcode, 1, answers, 0, 0)
+        record = struct.pack("!HHHIH", 0xC00C, 1, 1, 60, 4) + bytes((192, 0, 2, 1)) if answers else b""
+        return header + query[12:] + record
+
+    async def handle_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            length = struct.unpack("!H", await reader.readexactly(2))[0]
+            response = await self.answer(await reader.readexactly(length))
+            if response is None:
+                # silent server keeps the connection open until the client gives up
+                await reader.read()
+            else:
+                writer.write(struct.pack("!H", len(response)) + response)
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import math
+import unittest
+
+from sysinfo.container_stats import ContainerStats, ContainerWindow, blkio_bytes, cpu_percent, memory_usage
+
+
+def docker_stats(cpu: int, system: int, previous_cpu: int, previous_system: int, rx_bytes: int = 0,
+                 read_bytes: int = 0) -> dict:
+    return {"cpu_stats": {"cpu_usage": {"total_usage": cpu}, "system_cpu_usage": system, "online_cpus": 2},
+            "precpu_stats": {"cpu_usage": {"total_usage": previous_cpu}, "system_cpu_usage": previous_system},
+            "memory_stats": {"usage": 300, "limit": 1000, "stats": {"cache": 100}},
+            "networks": {"eth0": {"rx_bytes": rx_bytes, "tx_bytes": 0}},
+            "blkio_stats": {"io_service_bytes_recursive": [{"op": "Read", "value": read_bytes},
+                                                           {"op": "Write", "value": 0}]}}
+
+
+class FakeContainer:
+    def __init__(self, samples: list):
+        self.samples = samples
+
+    async def stats(self, stream: bool = True):
+        for sample in self.samples:
+            yield sample
+            await asyncio.sleep(0)
+
+
+class FakeContainers:
+    def __init__(self):
+        self.running = {"resolver": "a1", "other": "b2"}
+        self.followed = []
+
+    async def list(self):
+        return [{"Id": container_id, "Names": ["/{}".format(name)]} for name, container_id in self.running.items()]
+
+    def container(self, container_id: str) -> FakeContainer:
+        self.followed.append(container_id)
+        return FakeContainer([docker_stats(100, 1000, 0, 0), docker_stats(200, 2000, 100, 1000)])
+
+
+class FakeDocker:
+    def __init__(self):
+        self.containers = FakeContainers()
+
+
+class ContainerStatsTest(unittest.TestCase):
+    def test_parsing(self):
+        self.assertEqual(cpu_percent(docker_stats(150, 2000, 100, 1000)), 10.0)
+        self.assertTrue(math.isnan(cpu_percent({"cpu_stats": {}, "precpu_stats": {}})))
+        self.assertEqual(memory_usage(docker_stats(0, 0, 0, 0)), 200)
+        self.assertEqual(blkio_bytes(docker_stats(0, 0, 0, 0, read_bytes=512)), (512, 0))
+        self.assertEqual(blkio_bytes({"blkio_stats": {"io_service_bytes_recursive": None}}), (0, 0))
+
+    def test_window_rates(self):
+        window = ContainerWindow("a1", 3)
+        for timestamp in range(4):
+            window.add(timestamp, docker_stats(100 * timestamp, 1000 * timestamp, 100 * (timestamp - 1),
+                                               1000 * (timestamp - 1), rx_bytes=1000 * timestamp))
+        report = window.report()
+        self.assertEqual(report["samples"], 3)
+        self.assertEqual(report["cpu"], {"min": 20.0, "avg": 20.0, "max": 20.0})
+        self.assertEqual(report["memory"]["limit"], 1000)
+        self.assertEqual(report["network"]["rx_bytes"]["avg"], 1000.0)
+        self.assertEqual(report["network"]["tx_bytes"]["avg"], 0.0)
+
+    def test_streams_follow_managed_containers(self):
+        async def run():
+            client = FakeDocker()
+            stats = ContainerStats(logging.getLogger("container-stats-test"))
+            await stats.reconcile(client)
+            await asyncio.gather(*stats.streams.values())
+            self.assertEqual(client.containers.followed, ["a1"])
+            self.assertEqual(stats.report()["resolver"]["samples"], 2)
+            self.assertEqual(stats.latest("resolver")["cpu_stats"]["cpu_usage"]["total_usage"], 200)
+            # upgraded resolver runs in a new container, its window starts over
+            client.containers.running["resolver"] = "c3"
+            await stats.reconcile(client)
+            self.assertEqual(stats.windows["resolver"].container_id, "c3")
+            await asyncio.gather(*stats.streams.values())
+            client.containers.running.clear()
+            await stats.reconcile(client)
+            self.assertEqual(stats.report(), {})
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import unittest
+from unittest import mock
+
+from sysinfo.delta import SysInfoDelta, diff, patch
+from tests.benchmarks.messages import sample_sysinfo
+
+
+class DeltaTest(unittest.TestCase):
+    def setUp(self):
+        with mock.patch.dict(os.environ, {"SYSINFO_DELTA": "true", "SYSINFO_KEYFRAME_INTERVAL": "3"}):
+            self.delta = SysInfoDelta()
+
+    def test_diff_and_patch(self):
+        old = {"hostname": "a", "cpu": {"count": 4, "usage": 10}, "containers": {"resolver": "running", "old": "up"}}
+        new = {"hostname": "a", "cpu": {"count": 4, "usage": 12}, "containers": {"resolver": "running"}, "swap": 1}
+        changed, removed = diff(old, new)
+        self.assertEqual(changed, {"cpu": {"usage": 12}, "swap": 1})
+        self.assertEqual(removed, [["containers", "old"]])
+        self.assertEqual(patch(old, changed, removed), new)
+
+    def test_disabled(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            delta = SysInfoDelta()
+        self.assertEqual(delta.encode({"cpu": 1}), {"action": "sysinfo", "data": {"cpu": 1}})
+
+    def test_keyframe_until_acknowledged(self):
+        first = self.delta.encode(sample_sysinfo(1)["data"])
+        second = self.delta.encode(sample_sysinfo(2)["data"])
+        self.assertEqual((first["mode"], second["mode"]), ("keyframe", "keyframe"))
+        self.assertEqual((first["sequence"], second["sequence"]), (1, 2))
+
+    def test_delta_against_acknowledged(self):
+        snapshots = [sample_sysinfo(seed)["data"] for seed in range(4)]
+        self.delta.acknowledge(self.delta.encode(snapshots[0])["sequence"], snapshots[0])
+        lost = self.delta.encode(snapshots[1])
+        message = self.delta.encode(snapshots[2])
+        self.assertEqual((lost["base"], message["base"]), (1, 1))
+        self.assertNotIn("docker", message["data"]["changed"])
+        self.assertEqual(patch(snapshots[0], **message["data"]), snapshots[2])
+        self.assertEqual(self.delta.encode(snapshots[3])["mode"], "keyframe")
+
+    def test_resync(self):
+        data = sample_sysinfo()["data"]
+        self.delta.acknowledge(self.delta.encode(data)["sequence"], data)
+        in_flight = self.delta.encode(data)["sequence"]
+        self.delta.resync()
+        self.delta.acknowledge(in_flight, data)
+        self.assertEqual(self.delta.encode(data)["mode"], "keyframe")
+        self.assertEqual(self.delta.stats()["resyncs"], 1)
+
+    def test_local_send_until_confirmed(self):
+        snapshots = [sample_sysinfo(seed)["data"] for seed in range(4)]
+        self.delta.keyframe_interval = 10
+        for snapshot in snapshots[:2]:
+            self.delta.sent(self.delta.encode(snapshot)["sequence"], snapshot)
+        self.assertEqual(self.delta.encode(snapshots[2])["base"], 2)
+        # proxy confirms, the base only written to the websocket is replaced by the confirmed one
+        self.delta.confirm(1)
+        message = self.delta.encode(snapshots[3])
+        self.assertEqual((message["mode"], message["base"]), ("delta", 1))
+        self.delta.sent(message["sequence"], snapshots[3])
+        self.assertEqual(self.delta.acknowledged_sequence, 1)
+        self.delta.confirm(message["sequence"])
+        self.assertEqual(self.delta.acknowledged_sequence, 4)
+        self.assertEqual(self.delta.stats()["confirmed_by_proxy"], True)
+
+    def test_confirmation_before_resync_ignored(self):
+        data = sample_sysinfo()["data"]
+        self.delta.confirm(0)
+        sequence = self.delta.encode(data)["sequence"]
+        self.delta.sent(sequence, data)
+        self.delta.resync()
+        self.delta.confirm(sequence)
+        self.assertEqual(self.delta.encode(data)["mode"], "keyframe")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import asyncio
+import math
+import unittest
+
+from sysinfo.host_sampler import HostSampler, Ring
+
+
+def sample(busy: float, total: float, memory: float, sent: float) -> dict:
+    return {"cpu.busy": busy, "cpu.total": total, "memory": memory, "network.bytes_sent": sent}
+
+
+class RingTest(unittest.TestCase):
+    def test_overwrites_oldest(self):
+        ring = Ring(3)
+        for value in range(5):
+            ring.add(value)
+        self.assertEqual(ring.ordered(), [2.0, 3.0, 4.0])
+        self.assertEqual(Ring(3).ordered(), [])
+
+
+class HostSamplerTest(unittest.TestCase):
+    def setUp(self):
+        self.sampler = HostSampler(interval=1, size=5)
+
+    def test_report_interval(self):
+        # cpu spike to 90 % between second 1 and 2 is visible next to the 50 % average
+        for timestamp, values in enumerate([(0, 0, 40, 0), (10, 100, 50, 1000), (100, 200, 60, 1000),
+                                            (100, 300, 50, 5000)]):
+            self.sampler.record(timestamp, sample(*values))
+        report = self.sampler.report()
+        self.assertEqual(report["samples"], 4)
+        self.assertEqual(report["cpu"], {"min": 0.0, "avg": 33.3, "max": 90.0})
+        self.assertEqual(report["memory"], {"min": 40.0, "avg": 50.0, "max": 60.0})
+        self.assertEqual(report["network"]["bytes_sent"], {"min": 0.0, "avg": 1666.7, "max": 4000.0})
+        self.assertEqual(report["disk"]["read_bytes"], {"min": None, "avg": None, "max": None})
+
+    def test_reports_do_not_overlap(self):
+        self.sampler.record(0, sample(0, 0, 40, 0))
+        self.sampler.record(1, sample(50, 100, 40, 100))
+        self.assertEqual(self.sampler.report(advance=False)["samples"], 2)
+        self.assertEqual(self.sampler.report()["samples"], 2)
+        self.assertEqual(self.sampler.report(), {"samples": 0, "sample_interval": 1, "errors": 0})
+        # rate of the first new sample is computed against the last reported one
+        self.sampler.record(2, sample(60, 200, 40, 300))
+        report = self.sampler.report()
+        self.assertEqual(report["samples"], 1)
+        self.assertEqual(report["cpu"]["avg"], 10.0)
+        self.assertEqual(report["network"]["bytes_sent"]["avg"], 200.0)
+
+    def test_counter_reset_skipped(self):
+        for timestamp, sent in enumerate([1000, 2000, 10, 110, math.nan]):
+            self.sampler.record(timestamp, sample(0, timestamp, 0, sent))
+        self.assertEqual(self.sampler.report()["network"]["bytes_sent"], {"min": 100.0, "avg": 550.0, "max": 1000.0})
+
+    def test_run_samples_host(self):
+        async def run():
+            sampler = HostSampler(interval=0.01, size=50)
+            task = asyncio.ensure_future(sampler.run())
+            await asyncio.sleep(0.1)
+            task.cancel()
+            report = sampler.report()
+            self.assertGreater(report["samples"], 3)
+            self.assertIsNotNone(report["memory"]["avg"])
+            self.assertEqual(sampler.errors, 0)
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import os
+import unittest
+from unittest import mock
+
+from aiohttp import web
+
+from sysinfo.kresman_client import KresmanClient
+
+
+class FakeKresman:
+    def __init__(self, delay: float = 0, status: int = 200):
+        self.delay = delay
+        self.status = status
+        self.requests = []
+        self.runner = None
+        self.port = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/api/general/countentities", self.handle)
+        app.router.add_get("/api/general/metrics", self.handle)
+        app.router.add_get("/api/general/updatenow", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests.append(request.path)
+        await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return web.Response(status=self.status)
+        if request.path.endswith("countentities"):
+            return web.json_response([{"id": "domains", "count": 10}])
+        return web.json_response([{"id": "cache_size", "value": 42}])
+
+
+class KresmanClientTest(unittest.TestCase):
+    def setUp(self):
+        self.environment = mock.patch.dict(os.environ, {"HTTP_TIMEOUT": "1", "KRESMAN_BACKOFF": "30"})
+        self.environment.start()
+
+    def tearDown(self):
+        self.environment.stop()
+
+    def run_with(self, server: FakeKresman, test):
+        async def run():
+            await server.start()
+            with mock.patch.dict(os.environ, {"KRESMAN_LISTENER": "http://127.0.0.1:{}".format(server.port)}):
+                client = KresmanClient(logging.getLogger("kresman-test"))
+            try:
+                await test(client)
+            finally:
+                await client.close()
+                await server.stop()
+        asyncio.run(run())
+
+    def test_metrics_fetched_concurrently(self):
+        server = FakeKresman(delay=0.2)
+
+        async def test(client: KresmanClient):
+            start = asyncio.get_running_loop().time()
+            metrics = await client.get_metrics()
+            self.assertLess(asyncio.get_running_loop().time() - start, 0.35)
+            self.assertEqual(metrics, {"kresman": {"domains": 10}, "kresman_internal": {"cache_size": 42}})
+        self.run_with(server, test)
+
+    def test_metrics_cached(self):
+        server = FakeKresman()
+
+        async def test(client: KresmanClient):
+            first = await client.get_metrics()
+            self.assertEqual(await client.get_metrics(), first)
+            self.assertEqual(len(server.requests), 2)
+            client.ttl = 0
+            await asyncio.sleep(0.01)
+            await client.get_metrics()
+            self.assertEqual(len(server.requests), 4)
+        self.run_with(server, test)
+
+    def test_backoff_after_failure(self):
+        server = FakeKresman(status=503)
+
+        async def test(client: KresmanClient):
+            metrics = await client.get_metrics()
+            self.assertIn("503", metrics["kresman"]["error"])
+            self.assertEqual(client.failures, 1)
+            self.assertGreater(client.stats()["backoff"], 0)
+            # kresman is not contacted again until the backoff expires
+            self.assertEqual(await client.get_metrics(), metrics)
+            self.assertEqual(len(server.requests), 2)
+            server.status, client.retry_at = 200, 0.0
+            self.assertEqual((await client.get_metrics())["kresman"], {"domains": 10})
+            self.assertEqual(client.failures, 0)
+        self.run_with(server, test)
+
+    def test_update_now(self):
+        server = FakeKresman()
+
+        async def test(client: KresmanClient):
+            self.assertTrue(await client.update_now())
+            server.status = 500
+            self.assertFalse(await client.update_now())
+        self.run_with(server, test)
+
+
+if __name__ == '__main__':
+    unittest.main()
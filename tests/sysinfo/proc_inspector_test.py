@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sysinfo.proc_inspector import ProcInspector
+
+TCP_HEADER = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+
+
+class ProcInspectorTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        self.inspector = ProcInspector(self.root)
+        self.add_process(1, "systemd", "4026531836", [1], [])
+        self.add_process(900, "containerd-shim", "4026531836", [900], [])
+        # resolver container with init 1000, resolver-old with init 2000, both kresd on host network
+        self.add_process(1000, "tini", "4026532001", [1000, 1], [])
+        self.add_process(1010, "kresd", "4026532001", [1010, 7], ["111", "112"])
+        self.add_process(2000, "tini", "4026532002", [2000, 1], [])
+        self.add_process(2010, "kresd", "4026532002", [2010, 7], ["221"])
+        self.add_table(1010, "tcp", [("0100007F:0035", "0A", "111"), ("00000000:1F90", "0A", "112")])
+        self.add_table(1010, "udp", [])
+        self.add_table(2010, "tcp", [("0100007F:0035", "0A", "999")])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def add_process(self, pid: int, name: str, namespace: str, nspid: list, sockets: list):
+        directory = os.path.join(self.root, str(pid))
+        os.makedirs(os.path.join(directory, "fd"))
+        os.makedirs(os.path.join(directory, "ns"))
+        os.makedirs(os.path.join(directory, "net"))
+        with open(os.path.join(directory, "comm"), "w") as file:
+            file.write("{}\n".format(name))
+        with open(os.path.join(directory, "status"), "w") as file:
+            file.write("Name:\t{}\nNSpid:\t{}\n".format(name, "\t".join(str(pid) for pid in nspid)))
+        os.symlink("pid:[{}]".format(namespace), os.path.join(directory, "ns", "pid"))
+        os.symlink("/dev/null", os.path.join(directory, "fd", "0"))
+        for index, inode in enumerate(sockets):
+            os.symlink("socket:[{}]".format(inode), os.path.join(directory, "fd", str(index + 3)))
+
+    def add_table(self, pid: int, table: str, sockets: list):
+        with open(os.path.join(self.root, str(pid), "net", table), "w") as file:
+            file.write(TCP_HEADER)
+            for index, (local, state, inode) in enumerate(sockets):
+                file.write("   {}: {} 00000000:0000 {} 00000000:00000000 00:00000000 00000000   0 0 {} 1 0\n".format(
+                    index, local, state, inode))
+
+    def test_available(self):
+        self.assertTrue(self.inspector.available())
+        self.assertFalse(ProcInspector(os.path.join(self.root, "missing")).available())
+
+    def test_processes(self):
+        self.assertEqual(sorted(process["pid"] for process in self.inspector.processes("kresd")), [1010, 2010])
+        self.assertEqual(self.inspector.find_process(1000, "kresd", 7)["pid"], 1010)
+        self.assertEqual(self.inspector.find_process(1000, "kresd", 8), {})
+
+    def test_listening_socket_owned_by_container(self):
+        self.assertTrue(self.inspector.is_listening(1000, "kresd", 53))
+        self.assertFalse(self.inspector.is_listening(1000, "kresd", 443))
+        # port 53 is bound on host network, but not by a socket of resolver-old
+        self.assertFalse(self.inspector.is_listening(2000, "kresd", 53))
+
+    def test_cache(self):
+        self.assertEqual(len(self.inspector.processes("kresd")), 2)
+        self.add_process(1020, "kresd", "4026532001", [1020, 8], [])
+        self.assertEqual(len(self.inspector.processes("kresd")), 2)
+        self.inspector.invalidate()
+        self.assertEqual(len(self.inspector.processes("kresd")), 3)
+
+    def test_fd_not_readable(self):
+        with mock.patch("sysinfo.proc_inspector.os.listdir", side_effect=[os.listdir(self.root),
+                                                                          PermissionError("ptrace denied")]):
+            with self.assertRaises(PermissionError):
+                self.inspector.is_listening(1000, "kresd", 53)
+        self.assertFalse(self.inspector.available())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from dockertools.docker_cache import ContainerRecord, DockerCache
+from sysinfo.proc_inspector import ProcInspector
+from sysinfo.sys_info import SystemInfo
+
+TCP_HEADER = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+
+
+class FakeConnector:
+    # containers by name as (id, init pid), renamed and recreated the way the upgrade does it
+    def __init__(self):
+        self.cache = DockerCache(logging.getLogger("sysinfo-test"))
+        self.containers = {}
+        self.inspects = 0
+        self.execs = 0
+
+    def add(self, name: str, container_id: str, pid: int):
+        self.containers[name] = (container_id, pid)
+        self.cache.put(ContainerRecord(container_id, name, "whalebone/resolver:1", "sha256:1", "running", {}))
+
+    def rename(self, name: str, new_name: str):
+        self.containers[new_name] = self.containers.pop(name)
+        self.cache.renamed(name, new_name)
+
+    async def container_exec(self, name: str, command: list) -> str:
+        self.execs += 1
+        return "tcp 0 0 127.0.0.1:53 0.0.0.0:* LISTEN 7/kresd"
+
+    async def inspect_config(self, name: str) -> dict:
+        self.inspects += 1
+        container_id, pid = self.containers[name]
+        return {"Id": container_id, "State": {"Pid": pid}}
+
+
+def blocking(value, seconds: float = 0.2):
+    def collector():
+        time.sleep(seconds)
+        return value
+    return collector
+
+
+def waiting(value, seconds: float = 0.2):
+    async def collector(*_):
+        await asyncio.sleep(seconds)
+        return value
+    return collector
+
+
+def failing():
+    raise OSError("collector failed")
+
+
+async def unavailable(*_):
+    raise ConnectionError("docker is not running")
+
+
+def build_proc(root: str):
+    # host pid 1, resolver container with init 1000 and kresd 1010, second container with init 2000 and kresd 2010
+    for pid, name, namespace in ((1, "systemd", "1"), (1000, "tini", "2"), (1010, "kresd", "2"),
+                                 (2000, "tini", "3"), (2010, "kresd", "3")):
+        directory = os.path.join(root, str(pid))
+        for subdirectory in ("fd", "ns", "net"):
+            os.makedirs(os.path.join(directory, subdirectory))
+        with open(os.path.join(directory, "comm"), "w") as file:
+            file.write("{}\n".format(name))
+        with open(os.path.join(directory, "status"), "w") as file:
+            file.write("Name:\t{}\nNSpid:\t{}\t7\n".format(name, pid))
+        os.symlink("pid:[{}]".format(namespace), os.path.join(directory, "ns", "pid"))
+        os.symlink("socket:[{}]".format(pid), os.path.join(directory, "fd", "3"))
+    listen(root, 1010)
+
+
+def listen(root: str, pid: int):
+    with open(os.path.join(root, str(pid), "net", "tcp"), "w") as file:
+        file.write(TCP_HEADER)
+        file.write("   0: 0100007F:0035 00000000:0000 0A 00000000:00000000 00:00000000 00000000   0 0 {} 1 0\n".format(
+            pid))
+
+
+class ContainerPidTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        build_proc(self.directory.name)
+        self.connector = FakeConnector()
+        self.sysinfo = SystemInfo(self.connector, logging.getLogger("sysinfo-test"))
+        self.sysinfo.proc_inspector = ProcInspector(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_name_moved_to_new_container(self):
+        async def run():
+            self.connector.cache.ready = True
+            self.connector.add("resolver", "old", 1000)
+            self.assertEqual(await self.sysinfo.check_port(), "ok")
+            self.assertEqual(await self.sysinfo.container_pid("resolver"), 1000)
+            self.assertEqual(self.connector.inspects, 1)
+            # old resolver keeps running and listening while the new one starts
+            self.connector.rename("resolver", "resolver-old")
+            self.connector.add("resolver", "new", 2000)
+            self.assertEqual(await self.sysinfo.check_port(), "fail")
+            self.assertEqual(await self.sysinfo.check_port("resolver-old"), "ok")
+            listen(self.directory.name, 2010)
+            self.sysinfo.proc_inspector.invalidate()
+            self.assertEqual(await self.sysinfo.check_port(), "ok")
+            self.assertEqual(await self.sysinfo.container_pid("resolver"), 2000)
+        asyncio.run(run())
+
+    def test_inspected_without_cache(self):
+        async def run():
+            self.connector.add("resolver", "old", 1000)
+            await self.sysinfo.container_pid("resolver")
+            await self.sysinfo.container_pid("resolver")
+            self.assertEqual(self.connector.inspects, 2)
+        asyncio.run(run())
+
+    def test_fd_not_readable(self):
+        async def run():
+            self.connector.add("resolver", "old", 1000)
+            listdir = os.listdir
+
+            def denied(path: str) -> list:
+                if path.endswith("fd"):
+                    raise PermissionError("ptrace denied")
+                return listdir(path)
+            with mock.patch("sysinfo.proc_inspector.os.listdir", side_effect=denied):
+                self.assertEqual(await self.sysinfo.check_port(), "ok")
+            self.assertEqual(await self.sysinfo.check_port(), "ok")
+            self.assertEqual(self.connector.execs, 2)
+        asyncio.run(run())
+
+
+class CollectTest(unittest.TestCase):
+    def setUp(self):
+        self.connector = FakeConnector()
+        self.connector.docker_version = waiting({"Version": "24.0.7"})
+        self.sysinfo = SystemInfo(self.connector, logging.getLogger("sysinfo-test"))
+        # every collector takes 0.2s, blocking ones in the executor and docker and probe ones on the loop
+        for name, value in (("get_platform", "Ubuntu"), ("get_cpu_info", {"count": 4, "usage": 5.0}),
+                            ("get_memory_info", {"usage": 10}), ("get_hdd_info", {"usage": 20}),
+                            ("get_swap_info", {"usage": 0}), ("get_network_info", {"bytes_sent": 1}),
+                            ("get_disk_info", {"read_count": 1}), ("get_interfaces", [{"name": "lo"}])):
+            setattr(self.sysinfo, name, blocking(value))
+        for name, value in (("check_port", "ok"), ("get_container_states", {"resolver": "running"}),
+                            ("get_images", {"resolver": "whalebone/resolver:1"}),
+                            ("probe_resolving", {"status": "ok"}),
+                            ("get_kresman_metrics", {"kresman": {"count": 1}, "kresman_internal": {}})):
+            setattr(self.sysinfo, name, waiting(value))
+
+    def test_collectors_run_in_parallel(self):
+        start = time.monotonic()
+        info = asyncio.run(self.sysinfo.get_info_static({}))
+        # thirteen collectors of 0.2s take about as long as the slowest one
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertEqual(info["platform"], "Ubuntu")
+        self.assertEqual(info["docker"], {"Version": "24.0.7"})
+        self.assertEqual(info["check"], {"resolve": "ok", "port": "ok"})
+        self.assertEqual(info["kresman"], {"count": 1})
+
+    def test_failing_collector_falls_back(self):
+        self.sysinfo.get_platform = failing
+        self.sysinfo.get_hdd_info = failing
+        self.sysinfo.get_interfaces = failing
+        self.sysinfo.check_port = unavailable
+        self.connector.docker_version = unavailable
+        info = asyncio.run(self.sysinfo.get_info_static({}))
+        self.assertEqual((info["platform"], info["hdd"], info["interfaces"], info["docker"]), ("Unknown", {}, [], {}))
+        self.assertEqual(info["check"]["port"], "fail")
+        self.assertEqual(info["memory"], {"usage": 10})
+        self.assertEqual(info["containers"], {"resolver": "running"})
+        self.assertEqual(info["network_info"], {"bytes_sent": 1})
+
+    def test_executor_shared_across_connections(self):
+        threads = set()
+        for _ in range(3):
+            sysinfo = SystemInfo(self.connector, logging.getLogger("sysinfo-test"))
+            sysinfo.get_platform = blocking("Ubuntu")
+            asyncio.run(sysinfo.get_info_static({}))
+            self.assertIs(sysinfo.executor, self.sysinfo.executor)
+            threads.update(thread.name for thread in threading.enumerate() if thread.name.startswith("sysinfo"))
+        # reconnects reuse the pool instead of leaving idle threads of every previous client behind
+        self.assertLessEqual(len(threads), int(os.environ.get("SYSINFO_WORKERS", 8)))
+
+
+if __name__ == '__main__':
+    unittest.main()
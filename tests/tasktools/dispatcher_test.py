@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import unittest
+
+from tasktools.dispatcher import RequestDispatcher
+
+
+class RequestDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+
+    async def handler(self, name: str, duration: float):
+        self.events.append(("start", name))
+        await asyncio.sleep(duration)
+        self.events.append(("end", name))
+
+    def create_dispatcher(self, max_in_flight: int = 10) -> RequestDispatcher:
+        return RequestDispatcher(self.handler, ("upgrade", "create"), max_in_flight, logging.getLogger("dispatch-test"))
+
+    def test_read_only_actions_run_concurrently(self):
+        async def run():
+            dispatcher = self.create_dispatcher()
+            dispatcher.dispatch("upgrade", "upgrade", 0.2)
+            dispatcher.dispatch("sysinfo", "sysinfo", 0.01)
+            await asyncio.sleep(0.1)
+            self.assertIn(("end", "sysinfo"), self.events)
+            self.assertNotIn(("end", "upgrade"), self.events)
+            await asyncio.gather(*dispatcher.in_flight)
+        asyncio.run(run())
+
+    def test_exclusive_actions_are_serialized(self):
+        async def run():
+            dispatcher = self.create_dispatcher()
+            dispatcher.dispatch("upgrade", "upgrade", 0.1)
+            dispatcher.dispatch("create", "create", 0.01)
+            await asyncio.gather(*dispatcher.in_flight)
+            self.assertEqual(self.events, [("start", "upgrade"), ("end", "upgrade"),
+                                           ("start", "create"), ("end", "create")])
+            self.assertGreaterEqual(dispatcher.stats()["actions"]["create"]["last_wait"], 0.1)
+        asyncio.run(run())
+
+    def test_lock_shared_across_connections(self):
+        async def run():
+            lock = asyncio.Lock()
+            old = RequestDispatcher(self.handler, ("upgrade",), 10, logging.getLogger("dispatch-test"), lock)
+            new = RequestDispatcher(self.handler, ("upgrade",), 10, logging.getLogger("dispatch-test"), lock)
+            old.dispatch("upgrade", "old", 0.1)
+            await asyncio.sleep(0)
+            new.dispatch("upgrade", "new", 0.01)
+            await asyncio.gather(*old.in_flight, *new.in_flight)
+            self.assertEqual(self.events, [("start", "old"), ("end", "old"), ("start", "new"), ("end", "new")])
+        asyncio.run(run())
+
+    def test_busy_rejection(self):
+        async def run():
+            dispatcher = self.create_dispatcher(1)
+            self.assertTrue(dispatcher.dispatch("trace", "trace", 0.05))
+            self.assertFalse(dispatcher.dispatch("sysinfo", "sysinfo", 0.01))
+            await asyncio.gather(*dispatcher.in_flight)
+            self.assertEqual(dispatcher.stats()["actions"]["sysinfo"]["rejected"], 1)
+            self.assertTrue(dispatcher.dispatch("sysinfo", "sysinfo", 0.01))
+            await asyncio.gather(*dispatcher.in_flight)
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import unittest
+
+from tasktools.scheduler import Scheduler, PeriodicJob
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler(logging.getLogger("scheduler-test"))
+
+    def run_scheduler(self, duration: float):
+        async def run():
+            self.scheduler.start()
+            await asyncio.sleep(duration)
+            await self.scheduler.stop()
+        asyncio.run(run())
+
+    def test_unknown_overlap_policy(self):
+        with self.assertRaises(ValueError):
+            PeriodicJob("job", None, 1, overlap="wait")
+
+    def test_jobs_run_concurrently(self):
+        started = []
+
+        async def slow():
+            started.append("slow")
+            await asyncio.sleep(1)
+
+        async def fast():
+            started.append("fast")
+
+        self.scheduler.add_job("slow", slow, 10)
+        self.scheduler.add_job("fast", fast, 0.05)
+        self.run_scheduler(0.3)
+        self.assertEqual(started.count("slow"), 1)
+        self.assertGreater(started.count("fast"), 2)
+
+    def test_deadline(self):
+        async def hanging():
+            await asyncio.sleep(10)
+
+        self.scheduler.add_job("hanging", hanging, 10, deadline=0.05)
+        self.run_scheduler(0.2)
+        stats = self.scheduler.stats()["hanging"]
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["failures"], 1)
+        self.assertGreaterEqual(stats["last_latency"], 0.05)
+
+    def test_skip_overlap(self):
+        async def slow():
+            await asyncio.sleep(0.25)
+
+        self.scheduler.add_job("slow", slow, 0.1, overlap="skip")
+        self.run_scheduler(0.35)
+        stats = self.scheduler.stats()["slow"]
+        self.assertEqual(stats["runs"], 1)
+        self.assertGreaterEqual(stats["skipped"], 1)
+        self.assertEqual(stats["overruns"], stats["skipped"])
+
+    def test_queue_overlap(self):
+        async def slow():
+            await asyncio.sleep(0.15)
+
+        self.scheduler.add_job("slow", slow, 0.1, overlap="queue")
+        self.run_scheduler(0.4)
+        stats = self.scheduler.stats()["slow"]
+        self.assertEqual(stats["runs"], 2)
+        self.assertGreaterEqual(stats["overruns"], 1)
+
+    def test_cancel_overlap(self):
+        async def hanging():
+            await asyncio.sleep(10)
+
+        self.scheduler.add_job("hanging", hanging, 0.1, overlap="cancel")
+        self.run_scheduler(0.25)
+        stats = self.scheduler.stats()["hanging"]
+        self.assertGreaterEqual(stats["cancelled"], 1)
+        self.assertEqual(stats["failures"], 0)
+
+    def test_failure_recorded(self):
+        async def failing():
+            raise ValueError("broken")
+
+        self.scheduler.add_job("failing", failing, 10)
+        self.run_scheduler(0.05)
+        self.assertEqual(self.scheduler.stats()["failing"]["failures"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import unittest
+
+from exception.exc import TaskFailedException
+from tasktools.scheduler import Scheduler
+from tasktools.supervisor import Supervisor
+
+
+class SupervisorTest(unittest.TestCase):
+    def setUp(self):
+        self.supervisor = Supervisor(logging.getLogger("supervisor-test"), check_interval=0.01)
+
+    def test_unknown_strategy(self):
+        async def run():
+            with self.assertRaises(ValueError):
+                self.supervisor.start("task", asyncio.sleep, "always")
+        asyncio.run(run())
+
+    def test_permanent_task_restarted(self):
+        async def failing():
+            raise ValueError("broken")
+
+        async def run():
+            self.supervisor.start("failing", failing, "permanent", restart_delay=0.01)
+            await asyncio.sleep(0.1)
+            stats = self.supervisor.stats()["failing"]
+            self.assertGreater(stats["restarts"], 2)
+            self.assertEqual(stats["last_error"], "broken")
+            await self.supervisor.stop("failing")
+        asyncio.run(run())
+
+    def test_transient_task_not_restarted_after_success(self):
+        async def finishing():
+            return "done"
+
+        async def run():
+            self.supervisor.start("finishing", finishing, "transient", restart_delay=0.01)
+            await asyncio.sleep(0.05)
+            self.assertEqual(self.supervisor.stats()["finishing"]["restarts"], 0)
+            self.assertFalse(self.supervisor.is_alive("finishing"))
+        asyncio.run(run())
+
+    def test_temporary_task_join_propagates_error(self):
+        async def failing():
+            raise ValueError("broken")
+
+        async def run():
+            self.supervisor.start("failing", failing, "temporary")
+            with self.assertRaises(ValueError):
+                await self.supervisor.join("failing")
+            self.assertEqual(self.supervisor.stats()["failing"]["restarts"], 0)
+        asyncio.run(run())
+
+    def test_missed_heartbeat(self):
+        async def hanging():
+            await asyncio.sleep(10)
+
+        async def run():
+            watcher = asyncio.create_task(self.supervisor.watch())
+            self.supervisor.start("hanging", hanging, "temporary", heartbeat_timeout=0.05)
+            self.assertTrue(self.supervisor.is_alive("hanging"))
+            with self.assertRaises(TaskFailedException):
+                await self.supervisor.join("hanging")
+            self.assertEqual(self.supervisor.stats()["hanging"]["last_error"], "heartbeat lost")
+            watcher.cancel()
+        asyncio.run(run())
+
+    def test_heartbeat_keeps_task_alive(self):
+        async def beating():
+            while True:
+                self.supervisor.heartbeat("beating")
+                await asyncio.sleep(0.01)
+
+        async def run():
+            watcher = asyncio.create_task(self.supervisor.watch())
+            self.supervisor.start("beating", beating, "temporary", heartbeat_timeout=0.05)
+            await asyncio.sleep(0.15)
+            self.assertEqual(self.supervisor.running_tasks(), ["beating"])
+            self.assertLess(self.supervisor.stats()["beating"]["heartbeat_age"], 0.05)
+            await self.supervisor.stop("beating")
+            self.assertFalse(self.supervisor.is_alive("beating"))
+            watcher.cancel()
+        asyncio.run(run())
+
+    def test_supervised_scheduler(self):
+        async def job():
+            pass
+
+        async def run():
+            scheduler = Scheduler(logging.getLogger("supervisor-test"), self.supervisor)
+            scheduler.add_job("job", job, 0.05)
+            scheduler.start()
+            await asyncio.sleep(0.12)
+            self.assertEqual(self.supervisor.running_tasks(), ["periodic_job"])
+            await scheduler.stop()
+            self.assertEqual(self.supervisor.running_tasks(), [])
+            self.assertGreaterEqual(scheduler.stats()["job"]["runs"], 2)
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import json
+import os
+import unittest
+from unittest import mock
+
+from transporttools.codec import Base64JsonCodec, ZlibJsonCodec, CborCodec, MsgpackCodec, JsonData, CODECS, \
+    select_codec, transport_headers, TRANSPORT_HEADER
+
+
+class CodecTest(unittest.TestCase):
+    def setUp(self):
+        self.message = {"requestId": "1", "action": "sysinfo", "data": {"cpu": {"usage": 12.5}}}
+
+    def test_legacy_round_trip(self):
+        codec = Base64JsonCodec()
+        frame = codec.encode(self.message)
+        self.assertIsInstance(frame, str)
+        self.assertIsInstance(json.loads(frame)["data"], str)
+        self.assertEqual(codec.decode(frame), self.message)
+        self.assertIsInstance(self.message["data"], dict)
+
+    def test_zlib_round_trip(self):
+        codec = ZlibJsonCodec()
+        frame = codec.encode(self.message)
+        self.assertIsInstance(frame, bytes)
+        self.assertEqual(codec.decode(frame), self.message)
+
+    def test_zlib_decodes_legacy_frame(self):
+        frame = Base64JsonCodec().encode(self.message)
+        self.assertEqual(ZlibJsonCodec().decode(frame), self.message)
+
+    def test_serialized_data(self):
+        payload = JsonData(self.message["data"])
+        message = dict(self.message, data=payload)
+        for codec in (Base64JsonCodec(), ZlibJsonCodec()):
+            self.assertEqual(codec.decode(codec.encode(message)), self.message)
+        self.assertIs(message["data"], payload)
+
+    @unittest.skipUnless("msgpack" in CODECS, "msgpack is not installed")
+    def test_msgpack_round_trip(self):
+        codec = MsgpackCodec()
+        self.assertEqual(codec.decode(codec.encode(dict(self.message, data=JsonData(self.message["data"])))),
+                         self.message)
+        self.assertEqual(codec.decode(Base64JsonCodec().encode(self.message)), self.message)
+
+    @unittest.skipUnless("cbor" in CODECS, "cbor2 is not installed")
+    def test_cbor_round_trip(self):
+        codec = CborCodec()
+        self.assertEqual(codec.decode(codec.encode(self.message)), self.message)
+
+    def test_invalid_data(self):
+        with self.assertRaises(ValueError):
+            Base64JsonCodec().decode(json.dumps({"action": "sysinfo", "data": "bm90IGpzb24="}))
+
+    def test_select_codec(self):
+        with mock.patch.dict(os.environ, {"WEBSOCKET_COMPRESSION": "none"}):
+            self.assertIn("zlib", transport_headers()[TRANSPORT_HEADER])
+            self.assertEqual(select_codec({TRANSPORT_HEADER: "zlib"}).name, "zlib")
+        self.assertEqual(select_codec({TRANSPORT_HEADER: "brotli"}).name, "base64")
+        self.assertEqual(select_codec({}).name, "base64")
+        self.assertEqual(select_codec(None).name, "base64")
+
+    def test_zlib_not_offered_with_deflate(self):
+        with mock.patch.dict(os.environ, {"TRANSPORT_CODECS": "zlib,base64"}):
+            os.environ.pop("WEBSOCKET_COMPRESSION", None)
+            self.assertEqual(transport_headers(), {TRANSPORT_HEADER: "base64"})
+            self.assertEqual(select_codec({TRANSPORT_HEADER: "zlib"}).name, "base64")
+
+
+if __name__ == '__main__':
+    unittest.main()
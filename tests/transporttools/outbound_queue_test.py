@@ -0,0 +1,56 @@
+import asyncio
+import unittest
+
+from transporttools.outbound_queue import OutboundQueue
+
+
+class OutboundQueueTest(unittest.TestCase):
+    def test_priority_order(self):
+        async def run():
+            queue = OutboundQueue()
+            queue.put({"action": "sysinfo"}, "telemetry", "sysinfo")
+            queue.put({"action": "upgrade"}, "acknowledgement")
+            queue.put({"action": "trace"}, "response")
+            queue.put({"action": "test"}, "response")
+            return [(await queue.get()).message["action"] for _ in range(4)]
+        self.assertEqual(asyncio.run(run()), ["trace", "test", "upgrade", "sysinfo"])
+
+    def test_telemetry_superseded(self):
+        async def run():
+            queue = OutboundQueue()
+            old = queue.put({"action": "sysinfo", "data": 1}, "telemetry", "sysinfo")
+            new = queue.put({"action": "sysinfo", "data": 2}, "telemetry", "sysinfo")
+            self.assertFalse(await old)
+            self.assertEqual(queue.stats()["depth"]["telemetry"], 1)
+            entry = await queue.get()
+            self.assertEqual(entry.message["data"], 2)
+            queue.done(entry)
+            self.assertTrue(await new)
+            stats = queue.stats()
+            self.assertEqual((stats["sent"], stats["superseded"]), (1, 1))
+            self.assertEqual(stats["depth"]["telemetry"], 0)
+        asyncio.run(run())
+
+    def test_get_waits_for_message(self):
+        async def run():
+            queue = OutboundQueue()
+            getter = asyncio.create_task(queue.get())
+            await asyncio.sleep(0.01)
+            self.assertFalse(getter.done())
+            queue.put({"action": "test"})
+            return (await getter).message
+        self.assertEqual(asyncio.run(run()), {"action": "test"})
+
+    def test_failed_send(self):
+        async def run():
+            queue = OutboundQueue()
+            sent = queue.put({"action": "test"})
+            queue.done(await queue.get(), ConnectionError("closed"))
+            with self.assertRaises(ConnectionError):
+                await sent
+            self.assertEqual(queue.stats()["failed"], 1)
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import logging
+import os
+import random
+import ssl
+import tempfile
+import unittest
+from unittest import mock
+
+from exception.exc import InitException
+from transporttools.reconnect import ReconnectManager, ResumableSSLContext
+
+
+class FakeLoop:
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self) -> float:
+        return self.now
+
+
+class UpperBound:
+    # jitter disabled, the longest delay is returned
+    def uniform(self, low: float, high: float) -> float:
+        return high
+
+
+def complete(coroutine):
+    # connect does not suspend with the mocked websockets, it runs without an event loop
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise AssertionError("Coroutine was suspended.")
+
+
+def fake_connection(session_reused: bool = False, session=None):
+    ssl_object = mock.Mock(session_reused=session_reused, session=session)
+    connection = mock.Mock(response_headers={}, extensions=[])
+    connection.transport.get_extra_info.return_value = ssl_object
+    return connection
+
+
+class ReconnectManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.environment = mock.patch.dict(os.environ, {"RECONNECT_DELAY": "10", "RECONNECT_MAX_DELAY": "300",
+                                                        "RECONNECT_STABLE": "60"})
+        self.environment.start()
+        self.loop = FakeLoop()
+        self.patches = [mock.patch("transporttools.reconnect.asyncio.get_running_loop", return_value=self.loop),
+                        mock.patch("transporttools.reconnect.ResumableSSLContext",
+                                   side_effect=lambda protocol: mock.Mock(tls_session=None))]
+        for patch in self.patches:
+            patch.start()
+        self.directory = tempfile.TemporaryDirectory()
+        self.cert = os.path.join(self.directory.name, "client.crt")
+        with open(self.cert, "w") as file:
+            file.write("cert")
+        self.manager = ReconnectManager(logging.getLogger("reconnect-test"))
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.environment.stop()
+        self.directory.cleanup()
+
+    def connect(self, connection):
+        with mock.patch("transporttools.reconnect.websockets.connect", new=mock.AsyncMock(return_value=connection)):
+            return complete(self.manager.connect(self.cert, "wss://proxy"))
+
+    def test_backoff_growth_and_cap(self):
+        self.manager.random = UpperBound()
+        delays = []
+        for failures in range(8):
+            self.manager.failures = failures
+            delays.append(self.manager.next_delay())
+        self.assertEqual(delays, [10, 10, 20, 40, 80, 160, 300, 300])
+
+    def test_failed_connect_backs_off(self):
+        self.manager.random = UpperBound()
+        failing = mock.AsyncMock(side_effect=OSError("refused"))
+        with mock.patch("transporttools.reconnect.websockets.connect", new=failing):
+            for _ in range(3):
+                with self.assertRaises(InitException):
+                    complete(self.manager.connect(self.cert, "wss://proxy"))
+        self.assertEqual(self.manager.failures, 3)
+        self.assertEqual(self.manager.next_delay(), 40)
+
+    def test_jitter_bounds(self):
+        self.manager.random = random.Random(7)
+        for failures in range(10):
+            self.manager.failures = failures
+            delay = min(300, 10 * 2 ** max(failures - 1, 0))
+            draws = [self.manager.next_delay() for _ in range(200)]
+            self.assertTrue(all(1 <= draw <= delay for draw in draws))
+            # delays are spread over the range so that agents do not reconnect at once
+            self.assertLess(min(draws), delay / 2)
+            self.assertGreater(max(draws), delay / 2)
+        # base delay under a second is not randomized below itself
+        self.manager.base_delay = 0.5
+        self.manager.failures = 1
+        self.assertEqual(self.manager.next_delay(), 0.5)
+
+    def test_reset_after_stable_connection(self):
+        self.manager.failures = 4
+        self.loop.now = 100
+        self.connect(fake_connection())
+        self.loop.now = 130
+        self.manager.disconnected()
+        # dropped before RECONNECT_STABLE, the proxy is flapping
+        self.assertEqual(self.manager.failures, 5)
+        self.loop.now = 140
+        self.connect(fake_connection())
+        self.assertEqual(self.manager.stats()["last_reconnect_latency"], 10)
+        self.loop.now = 200
+        self.manager.disconnected()
+        self.assertEqual(self.manager.failures, 0)
+
+    def test_ssl_context_reloaded_on_cert_change(self):
+        context = self.manager.get_ssl_context(self.cert)
+        self.assertIs(self.manager.get_ssl_context(self.cert), context)
+        context.load_cert_chain.assert_called_once_with(self.cert)
+        stat = os.stat(self.cert)
+        os.utime(self.cert, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNot(self.manager.get_ssl_context(self.cert), context)
+        self.assertEqual(self.manager.cert_reloads, 1)
+        self.assertIs(self.manager.get_ssl_context(self.cert), self.manager.ssl_context)
+
+    def test_session_reuse(self):
+        session = object()
+        first = self.connect(fake_connection(session=session))
+        self.loop.now = 100
+        self.manager.disconnected(first)
+        self.assertIs(self.manager.ssl_context.tls_session, session)
+        self.connect(fake_connection(session_reused=True))
+        self.assertEqual(self.manager.stats()["resumed_sessions"], 1)
+        self.assertEqual(self.manager.stats()["connections"], 2)
+
+
+class ResumableSSLContextTest(unittest.TestCase):
+    def test_stored_session_offered(self):
+        context = ResumableSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.tls_session = session = object()
+        with mock.patch.object(ssl.SSLContext, "wrap_bio") as wrap_bio:
+            context.wrap_bio(None, None, server_hostname="proxy")
+        self.assertIs(wrap_bio.call_args[0][4], session)
+
+    def test_unusable_session_dropped(self):
+        context = ResumableSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.tls_session = object()
+        with mock.patch.object(ssl.SSLContext, "wrap_bio", side_effect=[ValueError("other context"), "bio"]) \
+                as wrap_bio:
+            self.assertEqual(context.wrap_bio(None, None, server_hostname="proxy"), "bio")
+        self.assertIsNone(wrap_bio.call_args[0][4])
+        self.assertIsNone(context.tls_session)
+
+
+if __name__ == '__main__':
+    unittest.main()
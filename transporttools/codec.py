@@ -0,0 +1,147 @@
+import base64
+import json
+import os
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+TRANSPORT_HEADER = "X-Agent-Transport"
+
+
+class JsonData:
+    # data serialized to JSON once, the text is shared by metrics log and JSON based codecs
+    __slots__ = ("value", "text")
+
+    def __init__(self, value: dict):
+        self.value = value
+        self.text = json.dumps(value)
+
+
+class Base64JsonCodec:
+    # legacy envelope, JSON message with base64 encoded JSON in the data key
+    name = "base64"
+
+    def encode(self, message: dict) -> str:
+        return json.dumps(encode_data(dict(message)))
+
+    def decode(self, frame) -> dict:
+        return decode_data(json.loads(frame))
+
+
+class ZlibJsonCodec:
+    # whole JSON message compressed by zlib and sent in a binary frame, data key is not base64 wrapped
+    name = "zlib"
+
+    def __init__(self):
+        self.level = int(os.environ.get("TRANSPORT_COMPRESSION_LEVEL", 6))
+
+    def encode(self, message: dict) -> bytes:
+        return zlib.compress(dump_message(message).encode("utf-8"), self.level)
+
+    def decode(self, frame) -> dict:
+        if isinstance(frame, bytes):
+            return json.loads(zlib.decompress(frame).decode("utf-8"))
+        return Base64JsonCodec().decode(frame)
+
+
+class MsgpackCodec:
+    # binary frames with MessagePack encoded message, available with msgpack package installed
+    name = "msgpack"
+
+    def encode(self, message: dict) -> bytes:
+        return msgpack.packb(plain_message(message), use_bin_type=True)
+
+    def decode(self, frame) -> dict:
+        if isinstance(frame, bytes):
+            return msgpack.unpackb(frame, raw=False)
+        return Base64JsonCodec().decode(frame)
+
+
+class CborCodec:
+    # binary frames with CBOR encoded message, available with cbor2 package installed
+    name = "cbor"
+
+    def encode(self, message: dict) -> bytes:
+        return cbor2.dumps(plain_message(message))
+
+    def decode(self, frame) -> dict:
+        if isinstance(frame, bytes):
+            return cbor2.loads(frame)
+        return Base64JsonCodec().decode(frame)
+
+
+CODECS = {codec.name: codec for codec in (ZlibJsonCodec, Base64JsonCodec)}
+if msgpack is not None:
+    CODECS[MsgpackCodec.name] = MsgpackCodec
+if cbor2 is not None:
+    CODECS[CborCodec.name] = CborCodec
+
+
+def plain_message(message: dict) -> dict:
+    if isinstance(message.get("data"), JsonData):
+        message = dict(message, data=message["data"].value)
+    return message
+
+
+def dump_message(message: dict) -> str:
+    data = message.get("data")
+    if not isinstance(data, JsonData):
+        return json.dumps(message)
+    envelope = json.dumps({key: value for key, value in message.items() if key != "data"})
+    return "{}{}\"data\": {}}}".format(envelope[:-1], ", " if len(envelope) > 2 else "", data.text)
+
+
+def encode_data(message: dict) -> dict:
+    if "data" in message:
+        data = message["data"]
+        text = data.text if isinstance(data, JsonData) else json.dumps(data)
+        message["data"] = base64.b64encode(text.encode("utf-8")).decode("utf-8")
+    return message
+
+
+def decode_data(message: dict) -> dict:
+    # data arriving as dict comes from local services and is not encoded in base64
+    if "data" in message and not isinstance(message["data"], dict):
+        if not message["data"]:
+            message["data"] = {}
+        else:
+            decoded_string = base64.b64decode(message["data"].encode("utf-8")).decode("utf-8")
+            try:
+                message["data"] = json.loads(decoded_string)
+            except json.JSONDecodeError as je:
+                raise ValueError("Failed to json parse data {} due to {}.".format(decoded_string, je))
+    return message
+
+
+def websocket_compression():
+    return None if os.environ.get("WEBSOCKET_COMPRESSION", "deflate") == "none" else "deflate"
+
+
+def offered_codecs() -> list:
+    offered = [name.strip() for name in os.environ.get("TRANSPORT_CODECS", "zlib,base64").split(",")]
+    if websocket_compression():
+        # zlib frames do not shrink any further under permessage-deflate, they would only be compressed twice
+        offered = [name for name in offered if name != ZlibJsonCodec.name]
+    return [name for name in offered if name in CODECS]
+
+
+def transport_headers() -> dict:
+    return {TRANSPORT_HEADER: ", ".join(offered_codecs())}
+
+
+def select_codec(response_headers):
+    # proxy not aware of transport negotiation does not answer the header, legacy codec is used then
+    try:
+        selected = response_headers.get(TRANSPORT_HEADER, "").strip()
+    except AttributeError:
+        selected = ""
+    if selected in offered_codecs():
+        return CODECS[selected]()
+    return Base64JsonCodec()
@@ -0,0 +1,89 @@
+import asyncio
+import heapq
+import itertools
+
+PRIORITIES = {"response": 0, "acknowledgement": 1, "telemetry": 2}
+PRIORITY_NAMES = {value: name for name, value in PRIORITIES.items()}
+
+
+class OutboundMessage:
+    __slots__ = ("priority", "sequence", "message", "supersede_key", "sent", "enqueued", "superseded")
+
+    def __init__(self, priority: int, sequence: int, message: dict, supersede_key: str, enqueued: float):
+        self.priority = priority
+        self.sequence = sequence
+        self.message = message
+        self.supersede_key = supersede_key
+        self.sent = asyncio.get_running_loop().create_future()
+        self.enqueued = enqueued
+        self.superseded = False
+
+    def __lt__(self, other) -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class OutboundQueue:
+    def __init__(self):
+        self.heap = []
+        self.sequence = itertools.count()
+        self.pending = {}
+        self.available = asyncio.Event()
+        self.depth = {priority: 0 for priority in PRIORITIES}
+        self.sent = 0
+        self.superseded = 0
+        self.failed = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def put(self, message: dict, priority: str = "response", supersede_key: str = None) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        entry = OutboundMessage(PRIORITIES[priority], next(self.sequence), message, supersede_key, loop.time())
+        if supersede_key is not None:
+            previous = self.pending.get(supersede_key)
+            if previous is not None:
+                # the newer snapshot replaces the waiting one, the old entry is dropped when popped
+                previous.superseded = True
+                previous.sent.set_result(False)
+                self.depth[PRIORITY_NAMES[previous.priority]] -= 1
+                self.superseded += 1
+            self.pending[supersede_key] = entry
+        heapq.heappush(self.heap, entry)
+        self.depth[priority] += 1
+        self.available.set()
+        return entry.sent
+
+    async def get(self) -> OutboundMessage:
+        while True:
+            while not self.heap:
+                self.available.clear()
+                await self.available.wait()
+            entry = heapq.heappop(self.heap)
+            if entry.superseded:
+                continue
+            if entry.supersede_key is not None and self.pending.get(entry.supersede_key) is entry:
+                del self.pending[entry.supersede_key]
+            self.depth[PRIORITY_NAMES[entry.priority]] -= 1
+            return entry
+
+    def done(self, entry: OutboundMessage, error: Exception = None):
+        if error is not None:
+            self.failed += 1
+            if not entry.sent.done():
+                entry.sent.set_exception(error)
+                # nobody has to await the result of a failed send, avoid "exception never retrieved" warnings
+                entry.sent.exception()
+            return
+        latency = asyncio.get_running_loop().time() - entry.enqueued
+        self.sent += 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+        if not entry.sent.done():
+            entry.sent.set_result(True)
+
+    def stats(self) -> dict:
+        return {"depth": dict(self.depth), "sent": self.sent, "superseded": self.superseded, "failed": self.failed,
+                "last_latency": round(self.last_latency, 3) if self.last_latency is not None else None,
+                "max_latency": round(self.max_latency, 3),
+                "avg_latency": round(self.total_latency / self.sent, 3) if self.sent else None}
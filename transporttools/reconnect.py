@@ -0,0 +1,111 @@
+import asyncio
+import os
+import random
+import ssl
+import websockets
+
+from exception.exc import InitException
+from transporttools.codec import select_codec, transport_headers, websocket_compression
+
+
+class ResumableSSLContext(ssl.SSLContext):
+    tls_session = None
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        if session is None and not server_side and self.tls_session is not None:
+            try:
+                return super().wrap_bio(incoming, outgoing, server_side, server_hostname, self.tls_session)
+            except ValueError:
+                # session belongs to a different context or is unusable, fall back to a full handshake
+                self.tls_session = None
+        return super().wrap_bio(incoming, outgoing, server_side, server_hostname, session)
+
+
+class ReconnectManager:
+    def __init__(self, logger):
+        self.logger = logger
+        self.alive = int(os.environ.get('KEEP_ALIVE', 10))
+        self.base_delay = float(os.environ.get("RECONNECT_DELAY", 10))
+        self.max_delay = float(os.environ.get("RECONNECT_MAX_DELAY", 300))
+        self.stable_after = float(os.environ.get("RECONNECT_STABLE", 60))
+        self.compression = websocket_compression()
+        self.codec = None
+        self.extensions = []
+        self.random = random.Random()
+        self.ssl_context = None
+        self.cert_signature = None
+        self.failures = 0
+        self.attempts = 0
+        self.connections = 0
+        self.resumed_sessions = 0
+        self.cert_reloads = 0
+        self.connected_at = None
+        self.disconnected_at = None
+        self.last_reconnect_latency = None
+
+    def get_ssl_context(self, client_cert: str) -> ResumableSSLContext:
+        stat = os.stat(client_cert)
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if self.ssl_context is None or signature != self.cert_signature:
+            ssl_context = ResumableSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+            ssl_context.load_cert_chain(client_cert)
+            if self.ssl_context is not None:
+                self.cert_reloads += 1
+                self.logger.info("Client certificate {} changed, SSL context reloaded.".format(client_cert))
+            self.ssl_context, self.cert_signature = ssl_context, signature
+        return self.ssl_context
+
+    async def connect(self, client_cert: str, proxy_address: str):
+        loop = asyncio.get_running_loop()
+        self.attempts += 1
+        try:
+            connection = await websockets.connect(proxy_address, ssl=self.get_ssl_context(client_cert),
+                                                  ping_interval=self.alive, ping_timeout=self.alive,
+                                                  compression=self.compression, extra_headers=transport_headers())
+        except Exception as ce:
+            self.failures += 1
+            raise InitException("Failed to connect to {} due to {}.".format(proxy_address, ce))
+        self.connections += 1
+        self.connected_at = loop.time()
+        if self.disconnected_at is not None:
+            self.last_reconnect_latency = self.connected_at - self.disconnected_at
+        ssl_object = connection.transport.get_extra_info("ssl_object")
+        if ssl_object is not None and ssl_object.session_reused:
+            self.resumed_sessions += 1
+        self.codec = select_codec(connection.response_headers)
+        self.extensions = [extension.name for extension in connection.extensions]
+        self.logger.info("Connected to {} (attempt {}, tls session reused: {}, codec: {}, extensions: {})".format(
+            proxy_address, self.attempts, getattr(ssl_object, "session_reused", False), self.codec.name,
+            self.extensions))
+        return connection
+
+    def disconnected(self, connection=None):
+        loop = asyncio.get_running_loop()
+        if connection is not None:
+            try:
+                ssl_object = connection.transport.get_extra_info("ssl_object")
+                if ssl_object is not None and ssl_object.session is not None:
+                    self.ssl_context.tls_session = ssl_object.session
+            except Exception as e:
+                self.logger.info("Failed to store tls session for resumption, {}".format(e))
+        if self.connected_at is not None:
+            # a connection dropped shortly after being established counts as a failure, so a flapping proxy backs off
+            if loop.time() - self.connected_at >= self.stable_after:
+                self.failures = 0
+            else:
+                self.failures += 1
+            self.connected_at = None
+            self.disconnected_at = loop.time()
+
+    def next_delay(self) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** max(self.failures - 1, 0))
+        return self.random.uniform(min(1.0, delay), delay)
+
+    def stats(self) -> dict:
+        return {"attempts": self.attempts, "connections": self.connections, "consecutive_failures": self.failures,
+                "resumed_sessions": self.resumed_sessions, "cert_reloads": self.cert_reloads,
+                "codec": self.codec.name if self.codec else None, "extensions": self.extensions,
+                "last_reconnect_latency": round(self.last_reconnect_latency, 3)
+                if self.last_reconnect_latency is not None else None}